@@ -0,0 +1,350 @@
+"""API JSON pour les clients légers (application mobile): quiz générés et corrigés sans Streamlit
+
+Application ASGI sans dépendance, à lancer avec n'importe quel serveur ASGI:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+L'API lit le même répertoire de données (REVIZIA_DATA_DIR) que l'application
+Streamlit: profils, cours, résultats et cache des quiz sont communs aux deux.
+Les quotas Gemini, eux, sont suivis en mémoire par chaque processus: l'API a
+ses propres clés serveur (REVIZIA_API_GEMINI_API_KEYS), distinctes de celles
+de l'application (REVIZIA_GEMINI_API_KEYS), sans quoi chaque clé recevrait
+jusqu'au double de son quota. Pour la même raison, l'API se lance avec un
+seul worker, ou un jeu de clés par instance.
+
+Routes:
+    GET  /v1/health
+    POST /v1/users                      {"name", "level", "school", "region"}
+    GET  /v1/users/<user_id>
+    POST /v1/quizzes                    {"user_id", "course_id" | "text", "title", "num_questions", "level"}
+    POST /v1/quizzes/<quiz_id>/answers  {"answer": index de l'option choisie}
+    POST /v1/quizzes/<quiz_id>/finish
+
+Une clé Gemini personnelle peut être fournie dans l'en-tête X-Gemini-Api-Key.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from batch_generation import RateLimiter
+from gemini_client import get_client
+from key_pool import KeyPool
+from leaderboard import Leaderboard
+from quiz_cache import QuizCache
+from quiz_service import QuizService, advance_quiz, answer_question, new_quiz
+from storage import Storage
+
+DATA_DIR = os.environ.get("REVIZIA_DATA_DIR", ".revizia")
+# Clés serveur réservées à l'API (séparées par des virgules) et quotas par clé
+SERVER_API_KEYS = os.environ.get("REVIZIA_API_GEMINI_API_KEYS", "")
+GEMINI_RPM = int(os.environ.get("REVIZIA_GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.environ.get("REVIZIA_GEMINI_TPM", "1000000"))
+BATCH_CONCURRENCY = int(os.environ.get("REVIZIA_BATCH_CONCURRENCY", "4"))
+
+# Quiz en cours gardés en mémoire, et durée de vie d'un quiz sans activité (secondes)
+MAX_ACTIVE_QUIZZES = int(os.environ.get("REVIZIA_API_MAX_QUIZZES", "10000"))
+QUIZ_TTL = 2 * 3600
+# Taille maximale d'un corps de requête (texte de cours compris)
+MAX_BODY_BYTES = 1 << 20
+
+NUM_QUESTIONS_CHOICES = (3, 5, 8, 10)
+# Longueur maximale des champs texte courts (profil, niveau, titre)
+MAX_FIELD_LENGTH = 200
+USER_PUBLIC_FIELDS = (
+    'id', 'name', 'level', 'school', 'region', 'points', 'rank',
+    'quizzes_completed', 'correct_answers', 'study_streak', 'last_study_date'
+)
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def create_service():
+    """Service de quiz sur les données partagées avec l'application Streamlit"""
+    storage = Storage(os.path.join(DATA_DIR, "revizia.sqlite3"))
+    leaderboard = Leaderboard()
+    leaderboard.load(storage.iter_leaderboard_entries())
+    # Les réponses des quiz terminés ici sont intégrées au modèle IRT par le calibrateur
+    # de l'application Streamlit (un seul par base: il reprend le journal là où il s'est arrêté)
+    return QuizService(
+        storage,
+        QuizCache(os.path.join(DATA_DIR, "quiz_cache.sqlite3")),
+        get_client(),
+        key_pool=KeyPool(SERVER_API_KEYS.split(","), rpm_limit=GEMINI_RPM, tpm_limit=GEMINI_TPM),
+        rate_limiter=RateLimiter(requests_per_minute=GEMINI_RPM),
+        leaderboard=leaderboard,
+        batch_concurrency=BATCH_CONCURRENCY
+    )
+
+
+class ActiveQuizzes:
+    """Quiz en cours, du moins récemment utilisé au plus récent (LRU avec expiration)"""
+
+    def __init__(self, max_size=MAX_ACTIVE_QUIZZES, ttl=QUIZ_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._quizzes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, user_id, quiz):
+        quiz_id = uuid.uuid4().hex
+        with self._lock:
+            self._quizzes[quiz_id] = (time.monotonic(), user_id, quiz)
+            while len(self._quizzes) > self.max_size:
+                self._quizzes.popitem(last=False)
+        return quiz_id
+
+    def get(self, quiz_id):
+        """(user_id, quiz), ou APIError 404 si le quiz est inconnu ou expiré"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._quizzes.get(quiz_id)
+            if entry is None or now - entry[0] > self.ttl:
+                self._quizzes.pop(quiz_id, None)
+                raise APIError(404, "Quiz inconnu ou expiré")
+            self._quizzes[quiz_id] = (now, entry[1], entry[2])
+            self._quizzes.move_to_end(quiz_id)
+            return entry[1], entry[2]
+
+    def remove(self, quiz_id):
+        with self._lock:
+            self._quizzes.pop(quiz_id, None)
+
+
+def optional_string(body, field):
+    """Champ texte facultatif du corps de requête, ou APIError 400 s'il n'est pas une chaîne courte"""
+    value = body.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str) or len(value) > MAX_FIELD_LENGTH:
+        raise APIError(400, f"{field} doit être une chaîne de {MAX_FIELD_LENGTH} caractères au plus")
+    return value.strip() or None
+
+
+def public_user(user):
+    profile = {field: user[field] for field in USER_PUBLIC_FIELDS}
+    if profile['last_study_date'] is not None:
+        profile['last_study_date'] = profile['last_study_date'].isoformat()
+    return profile
+
+
+def public_question(index, question):
+    """Question sans sa réponse: la correction n'est envoyée qu'après la réponse"""
+    return {'index': index, 'question': question['question'], 'options': question['options']}
+
+
+class QuizAPI:
+    """Application ASGI: les appels au service (bloquants) passent par des threads"""
+
+    ROUTES = (
+        ('GET', re.compile(r'^/v1/health$'), 'health'),
+        ('POST', re.compile(r'^/v1/users$'), 'create_user'),
+        ('GET', re.compile(r'^/v1/users/(?P<user_id>[0-9a-f]+)$'), 'get_user'),
+        ('POST', re.compile(r'^/v1/quizzes$'), 'create_quiz'),
+        ('POST', re.compile(r'^/v1/quizzes/(?P<quiz_id>[0-9a-f]+)/answers$'), 'answer'),
+        ('POST', re.compile(r'^/v1/quizzes/(?P<quiz_id>[0-9a-f]+)/finish$'), 'finish'),
+    )
+
+    def __init__(self, service_factory=create_service):
+        self.service_factory = service_factory
+        self.service = None
+        self.quizzes = ActiveQuizzes()
+        self._service_lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        try:
+            handler, params = self._route(scope['method'], scope['path'])
+            body = await self._read_body(receive)
+            status, payload = 200, await handler(scope, body, **params)
+        except APIError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': f"Erreur interne: {e}"}
+        await self._send_json(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self._get_service()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _get_service(self):
+        if self.service is None:
+            async with self._service_lock:
+                if self.service is None:
+                    self.service = await asyncio.to_thread(self.service_factory)
+        return self.service
+
+    def _route(self, method, path):
+        allowed = False
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                if route_method == method:
+                    return getattr(self, name), match.groupdict()
+                allowed = True
+        if allowed:
+            raise APIError(405, "Méthode non autorisée")
+        raise APIError(404, "Route inconnue")
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise APIError(413, "Requête trop volumineuse")
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+        if not size:
+            return {}
+        try:
+            body = json.loads(b''.join(chunks))
+        except ValueError:
+            raise APIError(400, "JSON invalide")
+        if not isinstance(body, dict):
+            raise APIError(400, "Un objet JSON est attendu")
+        return body
+
+    async def _send_json(self, send, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json; charset=utf-8'),
+                (b'content-length', str(len(data)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def _user(self, user_id):
+        user = await asyncio.to_thread((await self._get_service()).storage.get_user, user_id)
+        if user is None:
+            raise APIError(404, "Utilisateur inconnu")
+        return user
+
+    async def health(self, scope, body):
+        return {'status': 'ok'}
+
+    async def create_user(self, scope, body):
+        service = await self._get_service()
+        fields = {field: optional_string(body, field) for field in ('name', 'level', 'school', 'region')}
+        fields = {field: value for field, value in fields.items() if value is not None}
+
+        def create():
+            # Classement rechargé si l'application Streamlit a écrit dans la base entre-temps
+            service.reload_if_changed()
+            user_id = service.storage.create_user()
+            if fields:
+                service.storage.update_user(user_id, **fields)
+            service.sync_leaderboard(user_id)
+            return service.storage.get_user(user_id)
+
+        return public_user(await asyncio.to_thread(create))
+
+    async def get_user(self, scope, body, user_id):
+        return public_user(await self._user(user_id))
+
+    async def create_quiz(self, scope, body):
+        service = await self._get_service()
+        user_id = optional_string(body, 'user_id')
+        user = await self._user(user_id) if user_id else None
+        num_questions = body.get('num_questions', 5)
+        # 5.0 == 5 et True == 1: seul un entier JSON est accepté
+        if (not isinstance(num_questions, int) or isinstance(num_questions, bool)
+                or num_questions not in NUM_QUESTIONS_CHOICES):
+            raise APIError(400, f"num_questions doit valoir {', '.join(map(str, NUM_QUESTIONS_CHOICES))}")
+        level = optional_string(body, 'level') or (user and user['level']) or 'Terminale'
+        title = optional_string(body, 'title')
+
+        if body.get('course_id') is not None:
+            if user is None:
+                raise APIError(400, "user_id est requis pour un course_id")
+            if not isinstance(body['course_id'], int) or isinstance(body['course_id'], bool):
+                raise APIError(400, "course_id doit être un entier")
+            course = await asyncio.to_thread(service.storage.get_course, body['course_id'])
+            if course is None or course['user_id'] != user_id:
+                raise APIError(404, "Cours inconnu")
+            course_id, course_title, text = course['id'], course['title'], course['content']
+        elif isinstance(body.get('text'), str) and body['text'].strip():
+            course_id, course_title, text = None, title or "Cours", body['text']
+        else:
+            raise APIError(400, "course_id ou text est requis")
+
+        headers = dict(scope.get('headers', []))
+        api_key = headers.get(b'x-gemini-api-key', b'').decode() or None
+        use_api = api_key is not None or len(service.key_pool) > 0
+        questions, error = await asyncio.to_thread(
+            service.generate_quiz, text, num_questions, level, api_key, use_api, user_id=user_id
+        )
+        quiz_id = self.quizzes.add(user_id, new_quiz(course_id, course_title, questions))
+        response = {
+            'quiz_id': quiz_id,
+            'course_title': course_title,
+            'questions': [public_question(i, q) for i, q in enumerate(questions)],
+        }
+        if error is not None:
+            response['warning'] = f"Génération interrompue ({error}): questions de secours"
+        return response
+
+    async def answer(self, scope, body, quiz_id):
+        _, quiz = self.quizzes.get(quiz_id)
+        if quiz['state'] != 'question':
+            raise APIError(409, "Toutes les questions ont reçu une réponse")
+        question = quiz['questions'][quiz['current_question']]
+        answer = body.get('answer')
+        if not isinstance(answer, int) or isinstance(answer, bool) or not 0 <= answer < len(question['options']):
+            raise APIError(400, "answer doit être l'index d'une option")
+
+        index = quiz['current_question']
+        correct = answer_question(quiz, answer)
+        if index + 1 < len(quiz['questions']):
+            advance_quiz(quiz)
+        return {
+            'index': index,
+            'correct': correct,
+            'correct_answer': question['correct'],
+            'explanation': question.get('explanation', ''),
+            'score': quiz['score'],
+            'next_question': index + 1 if index + 1 < len(quiz['questions']) else None,
+        }
+
+    async def finish(self, scope, body, quiz_id):
+        user_id, quiz = self.quizzes.get(quiz_id)
+        total = len(quiz['questions'])
+        if len(quiz['answers']) < total:
+            raise APIError(409, f"{total - len(quiz['answers'])} question(s) sans réponse")
+        self.quizzes.remove(quiz_id)
+        response = {'score': quiz['score'], 'total': total}
+        if user_id:
+            service = await self._get_service()
+
+            def finish():
+                service.reload_if_changed()
+                return service.finish_quiz(user_id, quiz)
+
+            response['user'] = public_user(await asyncio.to_thread(finish))
+        return response
+
+
+app = QuizAPI()
@@ -1,14 +1,31 @@
 import streamlit as st
-import json
-import time
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
 import base64
 import io
-from PIL import Image
 import pandas as pd
-import requests
 import os
+from quiz_cache import QuizCache
+from gemini_client import GeminiAPIError, get_client
+from batch_generation import RateLimiter, run_concurrently
+from storage import Storage
+from leaderboard import Leaderboard
+from key_pool import KeyPool
+from key_validation import KEY_INVALID, KEY_VALID, KeyValidator
+from singleflight import SingleFlight
+from question_bank import BankFiller, QuestionBank, content_hash
+from question_index import (
+    QuestionIndex, minhash_from_bytes, question_fingerprint, question_text, select_questions
+)
+from spaced_repetition import ReviewQueue, reminder_due
+from stats_engine import StatsEngine
+from irt import DIFFICULTY_PRIORS, IRTCalibrator, difficulty_for_ability
+from ocr import OCRService, ocr_available, thumbnail as ocr_thumbnail
+from transcription import TranscriptionService, hash_and_save, transcription_available
+from knowledge_base import KnowledgeBase
+from tracing import NOOP_SPAN, Tracer, start_metrics_server
+from quiz_service import (
+    QuizGenerationError, QuizService, advance_quiz, answer_question, check_answer, new_quiz
+)
 
 # Configuration de la page
 st.set_page_config(
@@ -18,93 +35,214 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS personnalisé pour un design moderne
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        text-align: center;
-        margin-bottom: 2rem;
-        color: white;
-    }
-    
-    .feature-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 10px;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        margin-bottom: 1rem;
-        border-left: 4px solid #667eea;
-    }
-    
-    .stat-card {
-        background: linear-gradient(45deg, #f093fb 0%, #f5576c 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        text-align: center;
-        color: white;
-        margin-bottom: 1rem;
-    }
-    
-    .quiz-question {
-        background: #f8f9ff;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 1px solid #e0e6ff;
-        margin-bottom: 1rem;
-    }
-    
-    .correct-answer {
-        background-color: #d4edda;
-        border: 1px solid #c3e6cb;
-        color: #155724;
-        padding: 0.5rem;
-        border-radius: 5px;
-    }
-    
-    .incorrect-answer {
-        background-color: #f8d7da;
-        border: 1px solid #f5c6cb;
-        color: #721c24;
-        padding: 0.5rem;
-        border-radius: 5px;
-    }
-    
-    .ministry-badge {
-        background: #28a745;
-        color: white;
-        padding: 0.3rem 0.8rem;
-        border-radius: 20px;
-        font-size: 0.8rem;
-        font-weight: bold;
-    }
-</style>
-""", unsafe_allow_html=True)
+# CSS personnalisé pour un design moderne (static/revizia.css), lu une fois par processus.
+# Il est injecté en ligne: le serveur statique de Streamlit (tornado) sert les .css
+# en text/plain avec nosniff, et les navigateurs refusent alors la feuille de style.
+@st.cache_resource
+def load_stylesheet():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "revizia.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_stylesheet(), unsafe_allow_html=True)
+
+# Répertoire des données persistantes (base de données, cache, etc.)
+DATA_DIR = os.environ.get("REVIZIA_DATA_DIR", ".revizia")
+
+# Mesure des temps d'exécution: proportion des reruns mesurés (0 = désactivé),
+# port de l'export Prometheus (/metrics, 0 = désactivé) et jeton d'administration
+# (?admin=<jeton> dans l'URL: panneau des performances, détail de la classe par élève)
+TRACE_SAMPLE_RATE = float(os.environ.get("REVIZIA_TRACE_SAMPLE_RATE", "0"))
+METRICS_PORT = int(os.environ.get("REVIZIA_METRICS_PORT", "0"))
+ADMIN_TOKEN = os.environ.get("REVIZIA_ADMIN_TOKEN", "")
+
+def is_admin():
+    return bool(ADMIN_TOKEN) and st.query_params.get('admin') == ADMIN_TOKEN
+
+@st.cache_resource
+def get_tracer():
+    """Mesures partagées entre les sessions, exportées sur METRICS_PORT si configuré"""
+    tracer = Tracer(sample_rate=TRACE_SAMPLE_RATE)
+    if METRICS_PORT:
+        try:
+            start_metrics_server(tracer, METRICS_PORT)
+        except OSError as e:
+            tracer.metrics_error = str(e)
+    return tracer
+
+tracer = get_tracer()
+rerun_trace = tracer.begin_rerun()
+# Span de l'onglet affiché, ouvert après la navigation
+tab_span = NOOP_SPAN
+
+def rerun():
+    """st.rerun() qui enregistre d'abord le rerun interrompu
+
+    Sans cela, un rerun relancé avant la fin du script ne serait jamais
+    mesuré, et sa trace resterait active pour les fragments suivants.
+    """
+    tab_span.end()
+    rerun_trace.end()
+    st.rerun()
+
+# Nombre de cours affichés par page dans "Mes Cours"
+COURSES_PAGE_SIZE = 10
+
+# Nombre de résultats de quiz chargés pour les statistiques
+RESULTS_HISTORY_SIZE = 100
+
+DEFAULT_USER_DATA = {
+    'name': '',
+    'level': '',
+    'school': '',
+    'region': '',
+    'points': 0,
+    'rank': 'Débutant',
+    'courses_uploaded': 0,
+    'quizzes_completed': 0,
+    'correct_answers': 0,
+    'study_streak': 0,
+    'last_study_date': None
+}
+
+@st.cache_resource
+def get_storage():
+    """Base de données partagée entre toutes les sessions du processus"""
+    return Storage(os.path.join(DATA_DIR, "revizia.sqlite3"))
+
+# Nombre d'élèves affichés dans le classement
+LEADERBOARD_SIZE = 10
+
+REGIONS = [
+    "Dakar", "Diourbel", "Fatick", "Kaffrine", "Kaolack", "Kédougou", "Kolda",
+    "Louga", "Matam", "Saint-Louis", "Sédhiou", "Tambacounda", "Thiès", "Ziguinchor"
+]
+
+@st.cache_resource
+def get_leaderboard():
+    """Classement partagé, chargé une fois depuis la base puis mis à jour au fil des quiz"""
+    leaderboard = Leaderboard()
+    leaderboard.load(get_storage().iter_leaderboard_entries())
+    return leaderboard
+
+def sync_leaderboard(user_id):
+    """Répercute le profil d'un utilisateur dans le classement"""
+    get_quiz_service().sync_leaderboard(user_id)
+
+@st.cache_resource
+def get_stats_engine():
+    """Statistiques de quiz des élèves, partagées entre les sessions"""
+    return StatsEngine()
+
+def load_stats(user_id):
+    """Moteur de statistiques, avec l'historique de l'élève chargé"""
+    engine = get_stats_engine()
+    if not engine.is_loaded(user_id):
+        engine.load(user_id, get_storage().iter_quiz_results(user_id))
+    return engine
+
+def get_user_id(create=False):
+    """Identifiant de l'utilisateur courant
+    
+    L'identifiant est conservé dans l'URL (?uid=...) pour retrouver le profil
+    après un rafraîchissement du navigateur ou un redémarrage du serveur.
+    Avec create=True, un profil vide est créé s'il n'existe pas encore.
+    """
+    if st.session_state.get('user_id') is None:
+        uid = st.query_params.get('uid')
+        if uid and get_storage().get_user(uid) is not None:
+            st.session_state.user_id = uid
+        elif create:
+            st.session_state.user_id = get_storage().create_user()
+            st.query_params['uid'] = st.session_state.user_id
+    return st.session_state.get('user_id')
+
+def load_user_data():
+    """Profil de l'utilisateur courant, lu depuis la base"""
+    user_id = get_user_id()
+    user = get_storage().get_user(user_id) if user_id else None
+    return user or dict(DEFAULT_USER_DATA)
 
 # Initialisation des données de session
-if 'user_data' not in st.session_state:
-    st.session_state.user_data = {
-        'name': '',
-        'level': '',
-        'points': 0,
-        'rank': 'Débutant',
-        'courses_uploaded': 0,
-        'quizzes_completed': 0,
-        'correct_answers': 0,
-        'study_streak': 0,
-        'last_study_date': None
-    }
-
-if 'courses' not in st.session_state:
-    st.session_state.courses = []
+st.session_state.user_data = load_user_data()
 
 if 'current_quiz' not in st.session_state:
     st.session_state.current_quiz = None
 
-if 'quiz_results' not in st.session_state:
-    st.session_state.quiz_results = []
+@st.cache_resource
+def get_quiz_cache():
+    """Cache des quiz partagé entre toutes les sessions du processus"""
+    return QuizCache(os.path.join(DATA_DIR, "quiz_cache.sqlite3"))
+
+@st.cache_resource
+def get_generation_flight():
+    """Générations en cours, partagées entre les sessions qui demandent le même prompt"""
+    return SingleFlight()
+
+# Banque de questions: questions fraîches visées par cours et par niveau,
+# taille des séries générées en arrière-plan et nombre de threads
+BANK_TARGET = int(os.environ.get("REVIZIA_BANK_TARGET", "20"))
+BANK_BATCH_SIZE = 10
+BANK_WORKERS = int(os.environ.get("REVIZIA_BANK_WORKERS", "2"))
+# Candidats lus dans la banque par question demandée, pour écarter les questions déjà vues
+BANK_CANDIDATES_FACTOR = 3
+# Questions déjà vues prises en compte pour chaque élève
+SEEN_HISTORY_SIZE = 5000
+
+@st.cache_resource
+def get_question_bank():
+    """Questions pré-générées, partagées entre toutes les sessions"""
+    return QuestionBank(os.path.join(DATA_DIR, "question_bank.sqlite3"))
+
+@st.cache_resource
+def get_bank_filler():
+    """Pré-génération en arrière-plan des questions de la banque"""
+    return BankFiller(
+        get_question_bank(),
+        get_quiz_service().generate_validated_questions,
+        workers=BANK_WORKERS,
+        batch_size=BANK_BATCH_SIZE,
+        target=BANK_TARGET
+    )
+
+# Génération par lot: nombre d'appels simultanés et débit autorisé par clé
+BATCH_CONCURRENCY = int(os.environ.get("REVIZIA_BATCH_CONCURRENCY", "4"))
+GEMINI_RPM = int(os.environ.get("REVIZIA_GEMINI_RPM", "15"))
+
+@st.cache_resource
+def get_rate_limiter():
+    """Limiteur de débit par clé API partagé entre les sessions"""
+    return RateLimiter(requests_per_minute=GEMINI_RPM)
+
+# Clés API gérées par le serveur (séparées par des virgules) et quotas par clé
+SERVER_API_KEYS = os.environ.get("REVIZIA_GEMINI_API_KEYS", "")
+GEMINI_TPM = int(os.environ.get("REVIZIA_GEMINI_TPM", "1000000"))
+
+@st.cache_resource
+def get_key_pool():
+    """Pool des clés serveur partagé entre les sessions (vide si non configuré)"""
+    return KeyPool(SERVER_API_KEYS.split(","), rpm_limit=GEMINI_RPM, tpm_limit=GEMINI_TPM)
+
+def current_api_key():
+    """Clé personnelle de l'élève, ou None pour utiliser le pool du serveur"""
+    return st.session_state.get('gemini_api_key') or None
+
+@st.cache_resource
+def get_quiz_service():
+    """Génération et correction des quiz (quiz_service.py), partagées entre les sessions"""
+    return QuizService(
+        get_storage(),
+        get_quiz_cache(),
+        get_client(),
+        key_pool=get_key_pool(),
+        rate_limiter=get_rate_limiter(),
+        flight=get_generation_flight(),
+        leaderboard=get_leaderboard(),
+        stats_engine=get_stats_engine(),
+        batch_concurrency=BATCH_CONCURRENCY,
+        tracer=tracer,
+        review_queue=get_review_queue(),
+        irt_calibrator=get_irt_calibrator()
+    )
 
 # Configuration de l'API Google Gemini via REST
 def configure_gemini():
@@ -117,9 +255,11 @@ def configure_gemini():
         if 'gemini_api_key' not in st.session_state:
             st.session_state.gemini_api_key = ""
         
+        server_keys = len(get_key_pool()) > 0
+        
         # Interface pour la clé API
         api_key_input = st.text_input(
-            "Clé API Google Gemini:", 
+            "Clé API Google Gemini (optionnelle):" if server_keys else "Clé API Google Gemini:", 
             value=st.session_state.gemini_api_key,
             type="password",
             help="Obtenez votre clé API sur https://aistudio.google.com/app/apikey"
@@ -129,270 +269,522 @@ def configure_gemini():
             st.session_state.gemini_api_key = api_key_input
             if api_key_input:
                 # Test de la clé API
-                if test_gemini_api(api_key_input):
+                key_status = test_gemini_api(api_key_input)
+                if key_status == KEY_VALID:
                     st.success("✅ API configurée!")
-                    st.session_state.gemini_configured = True
-                else:
+                elif key_status == KEY_INVALID:
                     st.error("❌ Clé API invalide")
-                    st.session_state.gemini_configured = False
+                else:
+                    # Panne ou quota: la clé est utilisée, les erreurs éventuelles s'afficheront à la génération
+                    st.warning("⚠️ Vérification impossible pour le moment (réseau ou quota): la clé sera utilisée telle quelle")
+                st.session_state.gemini_configured = key_status != KEY_INVALID
             else:
                 st.session_state.gemini_configured = False
         
+        # Sans clé personnelle, les clés du serveur sont utilisées
+        if server_keys and not st.session_state.gemini_api_key:
+            st.session_state.gemini_configured = True
+        
         # Status de l'API
         if st.session_state.get('gemini_configured', False):
             st.success("🤖 Gemini AI: Connecté")
         else:
             st.warning("🤖 Gemini AI: Non configuré")
             st.info("💡 Entrez votre clé API Google Gemini pour utiliser l'IA")
-
-def test_gemini_api(api_key):
-    """Test la validité de la clé API"""
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
         
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        
-        data = {
-            "contents": [{
-                "parts": [{
-                    "text": "Hello"
-                }]
-            }]
-        }
-        
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        return response.status_code == 200
+        # Statistiques du cache de quiz
+        cache_stats = get_quiz_cache().stats()
+        st.caption(
+            f"🗄️ Cache quiz: {cache_stats['size']} entrées · "
+            f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+        )
+        generation_flight = get_generation_flight()
+        if generation_flight.coalesced:
+            st.caption(f"🔗 {generation_flight.coalesced} générations partagées entre sessions")
         
-    except Exception as e:
-        return False
-
-def call_gemini_api(prompt, api_key):
-    """Appelle l'API Gemini via REST"""
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+        # File de pré-génération de la banque de questions
+        bank_metrics = get_bank_filler().metrics()
+        if bank_metrics['depth'] or bank_metrics['active'] or bank_metrics['completed']:
+            st.caption(
+                f"📦 Banque: {get_question_bank().stats()['questions']} questions · "
+                f"file {bank_metrics['depth']} (+{bank_metrics['active']} en cours) · "
+                f"retard {bank_metrics['lag_s']:.0f}s (moy. {bank_metrics['avg_lag_s']:.0f}s)"
+            )
         
-        headers = {
-            'Content-Type': 'application/json',
-        }
+        # Calibration IRT des questions
+        irt_metrics = get_irt_calibrator().metrics()
+        if irt_metrics['processed']:
+            st.caption(
+                f"📐 IRT: {irt_metrics['questions']} questions · {irt_metrics['students']} élèves calibrés · "
+                f"dernier lot {1000 * irt_metrics['last_batch_s']:.0f} ms"
+            )
         
-        data = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 2048,
-            }
-        }
+        # Vérifications des clés personnelles
+        validator_metrics = get_key_validator().metrics()
+        if validator_metrics['checks']:
+            st.caption(
+                f"🔐 Clés vérifiées: {validator_metrics['checks']} requêtes · "
+                f"{validator_metrics['hits']} réponses en cache · "
+                f"{validator_metrics['coalesced']} vérifications partagées"
+            )
         
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        # Métriques du client HTTP Gemini
+        client_metrics = get_client().metrics()
+        if client_metrics['calls']:
+            st.caption(
+                f"🌐 Gemini: {client_metrics['calls']} appels · "
+                f"latence moy. {client_metrics['avg_latency_s']:.2f}s · "
+                f"{client_metrics['retries']} retries · "
+                f"{client_metrics['reused_connections']} connexions réutilisées"
+            )
         
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                return content
-            else:
-                return None
-        else:
-            st.error(f"Erreur API: {response.status_code} - {response.text}")
-            return None
-            
-    except Exception as e:
-        st.error(f"Erreur lors de l'appel API: {str(e)}")
-        return None
+        # Utilisation du pool de clés serveur
+        if server_keys:
+            pool_metrics = get_key_pool().metrics()
+            rpm_utilization = sum(k['rpm_utilization'] for k in pool_metrics) / len(pool_metrics)
+            paused = sum(1 for k in pool_metrics if k['cooldown_s'] > 0)
+            st.caption(
+                f"🔑 Pool serveur: {len(pool_metrics)} clés · "
+                f"utilisation {rpm_utilization:.0%} · {paused} en pause"
+            )
 
-def generate_quiz_with_gemini(text, num_questions=5, level="Terminale"):
-    """Génère un quiz en utilisant l'API REST Google Gemini"""
-    if not st.session_state.get('gemini_configured', False):
-        # Fallback vers des questions simulées si l'API n'est pas configurée
-        return generate_quiz_simulation(text, num_questions)
-    
-    try:
-        # Prompt optimisé pour générer des quiz
-        prompt = f"""
-Tu es un expert pédagogique sénégalais spécialisé dans la création de quiz pour lycéens.
-
-CONSIGNE: À partir du contenu de cours suivant, génère exactement {num_questions} questions de type QCM adaptées au niveau {level}.
-
-CONTENU DU COURS:
-{text[:2500]}
-
-FORMAT DE RÉPONSE REQUIS (JSON strict):
-{{
-    "questions": [
-        {{
-            "question": "Question claire et précise basée sur le contenu",
-            "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correct": 0,
-            "explanation": "Explication détaillée de pourquoi cette réponse est correcte"
-        }}
-    ]
-}}
-
-CRITÈRES IMPORTANTS:
-- Questions adaptées au programme sénégalais niveau {level}
-- 4 options par question (A, B, C, D)
-- Une seule bonne réponse par question (index 0-3)
-- Explications pédagogiques claires
-- Vocabulaire approprié au niveau scolaire
-- Questions basées UNIQUEMENT sur le contenu fourni
-- Éviter les questions trop évidentes ou trop difficiles
-
-Réponds UNIQUEMENT avec le JSON valide, sans texte supplémentaire, sans balises markdown.
-        """
-        
-        # Appel à l'API
-        response_text = call_gemini_api(prompt, st.session_state.gemini_api_key)
-        
-        if response_text is None:
-            return generate_quiz_simulation(text, num_questions)
-        
-        # Parsing de la réponse
-        try:
-            # Nettoyage de la réponse pour extraire le JSON
-            response_text = response_text.strip()
-            
-            # Suppression des balises markdown si présentes
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            # Tentative de parsing JSON
-            quiz_data = json.loads(response_text)
-            
-            if 'questions' in quiz_data and len(quiz_data['questions']) > 0:
-                # Validation des questions
-                valid_questions = []
-                for q in quiz_data['questions'][:num_questions]:
-                    if (isinstance(q.get('question'), str) and 
-                        isinstance(q.get('options'), list) and 
-                        len(q.get('options', [])) == 4 and
-                        isinstance(q.get('correct'), int) and
-                        0 <= q.get('correct', -1) < 4 and
-                        isinstance(q.get('explanation'), str)):
-                        valid_questions.append(q)
-                
-                if valid_questions:
-                    return valid_questions
-                else:
-                    st.warning("⚠️ Questions générées invalides, utilisation du mode simulation")
-                    return generate_quiz_simulation(text, num_questions)
-            else:
-                st.warning("⚠️ Format de réponse invalide, utilisation du mode simulation")
-                return generate_quiz_simulation(text, num_questions)
-                
-        except json.JSONDecodeError as e:
-            st.warning(f"⚠️ Erreur de parsing JSON, utilisation du mode simulation")
-            return generate_quiz_simulation(text, num_questions)
-            
-    except Exception as e:
-        st.error(f"❌ Erreur API Gemini: {str(e)}")
-        return generate_quiz_simulation(text, num_questions)
-
-def generate_quiz_simulation(text, num_questions=5):
-    """Fonction de fallback avec questions simulées"""
-    sample_questions = [
-        {
-            "question": "Quelle est l'idée principale développée dans ce cours ?",
-            "options": [
-                "Concept fondamental A", 
-                "Théorie principale B", 
-                "Principe central C", 
-                "Notion essentielle D"
-            ],
-            "correct": 0,
-            "explanation": "Cette réponse correspond au thème central développé dans le contenu du cours."
-        },
-        {
-            "question": "Comment peut-on appliquer cette connaissance en pratique ?",
-            "options": [
-                "Application dans le domaine X", 
-                "Utilisation en contexte Y", 
-                "Mise en œuvre selon Z", 
-                "Implementation via W"
-            ],
-            "correct": 1,
-            "explanation": "Cette application pratique découle directement des principes théoriques énoncés."
-        },
-        {
-            "question": "Quels sont les éléments clés à retenir de cette leçon ?",
-            "options": [
-                "Points secondaires", 
-                "Éléments principaux", 
-                "Détails complémentaires", 
-                "Aspects périphériques"
-            ],
-            "correct": 1,
-            "explanation": "Les éléments principaux constituent le cœur de la compréhension du sujet."
-        },
-        {
-            "question": "Dans quel contexte cette notion est-elle particulièrement importante ?",
-            "options": [
-                "Contexte général", 
-                "Situation spécifique", 
-                "Cadre d'application précis", 
-                "Environnement particulier"
-            ],
-            "correct": 2,
-            "explanation": "Le cadre d'application précis permet une meilleure compréhension et utilisation."
-        },
-        {
-            "question": "Quelle conclusion peut-on tirer de cette étude ?",
-            "options": [
-                "Conclusion partielle", 
-                "Synthèse globale", 
-                "Résumé incomplet", 
-                "Vue d'ensemble limitée"
-            ],
-            "correct": 1,
-            "explanation": "La synthèse globale offre la perspective la plus complète du sujet traité."
-        }
-    ]
-    
-    return random.sample(sample_questions, min(num_questions, len(sample_questions)))
+def check_gemini_key(api_key):
+    """Vérifie une clé via les métadonnées du modèle (aucun token consommé)"""
+    response = get_client().get_model(api_key, timeout=10)
+    if response.status_code == 200:
+        return True
+    if response.status_code in (400, 401, 403, 404):
+        return False
+    # Quota ou panne côté serveur: la clé n'est pas en cause
+    raise GeminiAPIError(response.status_code, response.text)
+
+@st.cache_resource
+def get_key_validator():
+    return KeyValidator(check_gemini_key)
+
+def test_gemini_api(api_key):
+    """Test la validité de la clé API (KEY_VALID, KEY_INVALID ou KEY_UNKNOWN)"""
+    return get_key_validator().status(api_key)
+
+def generate_quiz_with_gemini(text, num_questions=5, level="Terminale", on_question=None):
+    """Génère un quiz en utilisant l'API REST Google Gemini
+    
+    Si on_question est fourni, la réponse est reçue en streaming et
+    on_question(index, question) est appelé pour chaque question validée.
+    Sans API configurée, ou en cas d'erreur, des questions à trous générées
+    localement à partir du cours prennent le relais.
+    """
+    questions, error = get_quiz_service().generate_quiz(
+        text, num_questions, level, current_api_key(),
+        use_api=st.session_state.get('gemini_configured', False),
+        on_question=on_question,
+        user_id=get_user_id()
+    )
+    if isinstance(error, GeminiAPIError):
+        st.error(f"Erreur API: {error}")
+    elif isinstance(error, QuizGenerationError):
+        st.warning(f"⚠️ {error}, questions générées localement à partir du cours")
+    elif error is not None:
+        st.error(f"❌ Erreur API Gemini: {str(error)}")
+    return questions
 
 # Fonctions utilitaires
-def generate_quiz_from_text(text, num_questions=5):
+def generate_quiz_from_text(text, num_questions=5, on_question=None):
     """Génère un quiz à partir du texte en utilisant Gemini AI"""
     level = st.session_state.user_data.get('level', 'Terminale')
-    return generate_quiz_with_gemini(text, num_questions, level)
+    return generate_quiz_with_gemini(text, num_questions, level, on_question)
+
+def prefill_question_bank(text):
+    """Met le cours en file de pré-génération si sa banque de questions est presque vide"""
+    if not st.session_state.get('gemini_configured', False):
+        return
+    level = st.session_state.user_data.get('level', 'Terminale')
+    filler = get_bank_filler()
+    if filler.needs_refill(content_hash(text), level):
+        filler.submit(text, level, current_api_key())
+
+def take_from_question_bank(text, num_questions):
+    """Quiz tiré de la banque du cours, ou liste vide si elle n'a pas assez de questions
+    
+    Les questions que l'élève n'a pas encore vues sont choisies en priorité,
+    puis celles qui mesurent le mieux son niveau (information de Fisher IRT).
+    La banque est réapprovisionnée en arrière-plan à mesure qu'elle s'épuise.
+    """
+    level = st.session_state.user_data.get('level', 'Terminale')
+    bank = get_question_bank()
+    hash_ = content_hash(text)
+    candidates = bank.candidates(hash_, level, num_questions * BANK_CANDIDATES_FACTOR)
+    # Questions les plus informatives au niveau estimé de l'élève
+    ability, _, _ = student_ability()
+    informations = get_irt_calibrator().model.information(
+        [question_fingerprint(question_text(q)) for q in candidates], ability
+    )
+    questions = select_questions(candidates, num_questions, get_seen_index(), informations)
+    if len(questions) < num_questions:
+        questions = []
+    else:
+        bank.mark_served(hash_, level, questions)
+    prefill_question_bank(text)
+    return questions
+
+def get_seen_index():
+    """Index des questions déjà vues par l'élève (chargé une fois par session)"""
+    user_id = get_user_id()
+    loaded = st.session_state.get('seen_index')
+    if loaded is None or loaded[0] != user_id:
+        index = QuestionIndex()
+        if user_id:
+            # Signatures MinHash enregistrées avec les questions: rien à recalculer au chargement
+            index.load(
+                (fingerprint, text, minhash_from_bytes(signature) if signature else None)
+                for fingerprint, text, signature in get_storage().list_seen_questions(user_id, SEEN_HISTORY_SIZE)
+            )
+        st.session_state.seen_index = (user_id, index)
+    return st.session_state.seen_index[1]
+
+# Processus dédiés à l'OCR (par défaut: nombre de cœurs - 1, au plus 4)
+OCR_WORKERS = int(os.environ.get("REVIZIA_OCR_WORKERS", "0")) or None
+
+@st.cache_resource
+def get_ocr_service():
+    """Pool de processus OCR et cache des textes reconnus, partagés entre les sessions"""
+    return OCRService(os.path.join(DATA_DIR, "ocr_cache.sqlite3"), workers=OCR_WORKERS)
+
+# Miniatures des images importées, mises en cache selon leur contenu:
+# une image n'est décodée qu'une fois, pas à chaque rerun
+@st.cache_data(max_entries=64, show_spinner=False)
+def image_preview(data):
+    buffer = io.BytesIO()
+    ocr_thumbnail(data).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+# Modèle faster-whisper et nombre de transcriptions simultanées
+WHISPER_MODEL = os.environ.get("REVIZIA_WHISPER_MODEL", "small")
+TRANSCRIPTION_WORKERS = int(os.environ.get("REVIZIA_TRANSCRIPTION_WORKERS", "1"))
+
+@st.cache_resource
+def get_transcription_service():
+    """Transcriptions en arrière-plan et cache des textes, partagés entre les sessions"""
+    return TranscriptionService(
+        os.path.join(DATA_DIR, "transcripts.sqlite3"),
+        model_size=WHISPER_MODEL,
+        workers=TRANSCRIPTION_WORKERS
+    )
+
+@st.fragment(run_every=2)
+def render_transcription_progress():
+    """Progression de la transcription en cours, rafraîchie toutes les 2 secondes"""
+    job = get_transcription_service().get(st.session_state.audio_job)
+    if job is None:
+        del st.session_state.audio_job
+        return
+    if job.status == 'failed':
+        st.error(f"❌ Transcription impossible: {job.error}")
+        del st.session_state.audio_job
+        return
+    if job.status != 'done':
+        st.progress(job.progress, text=f"Transcription en cours... {job.progress:.0%}")
+        st.caption(job.text[-600:] or "En attente du premier passage parlé...")
+        return
+    # Terminée: le texte passe dans le formulaire d'import
+    st.session_state.audio_content = job.text
+    del st.session_state.audio_job
+    rerun()
+
+# Répertoire de la base de connaissance commune (documents .txt et .md)
+KB_DIR = os.environ.get("REVIZIA_KB_DIR", os.path.join(DATA_DIR, "knowledge_base"))
+
+@st.cache_resource
+def get_knowledge_base():
+    """Index de la base de connaissance commune, partagé entre les sessions"""
+    return KnowledgeBase(KB_DIR, os.path.join(DATA_DIR, "knowledge_base.sqlite3"))
+
+# Questions proposées par la révision du jour
+REVIEW_QUIZ_SIZE = 10
+
+@st.cache_resource
+def get_review_queue():
+    """Échéances de révision des élèves, partagées entre les sessions"""
+    return ReviewQueue()
+
+def load_review_queue(user_id):
+    queue = get_review_queue()
+    if not queue.is_loaded(user_id):
+        queue.load(user_id, get_storage().list_review_schedule(user_id))
+    return queue
+
+# Calibration IRT: réponses intégrées par lot, et délai maximal entre deux lots (secondes)
+IRT_BATCH_SIZE = 5000
+IRT_INTERVAL = float(os.environ.get("REVIZIA_IRT_INTERVAL", "60"))
+
+@st.cache_resource
+def get_irt_calibrator():
+    """Calibration des questions et niveaux des élèves (irt.py), en arrière-plan"""
+    calibrator = IRTCalibrator(get_storage(), batch_size=IRT_BATCH_SIZE, interval=IRT_INTERVAL)
+    calibrator.start()
+    return calibrator
+
+def student_ability():
+    """(niveau θ, écart type, réponses) de l'élève; sa difficulté par défaut sert de loi a priori"""
+    prior = DIFFICULTY_PRIORS[get_user_settings()['difficulty']]
+    return get_irt_calibrator().model.ability(get_user_id(), prior)
+
+def due_review_count():
+    user_id = get_user_id()
+    if not user_id:
+        return 0
+    return load_review_queue(user_id).count_due(user_id, datetime.now())
+
+def start_review_quiz():
+    """Démarre un quiz avec les questions dont la révision est échue"""
+    user_id = get_user_id()
+    fingerprints = load_review_queue(user_id).due(user_id, REVIEW_QUIZ_SIZE, datetime.now())
+    questions = get_storage().get_review_questions(user_id, fingerprints)
+    if questions:
+        start_quiz('review', "🔁 Révision du jour", questions)
+
+def start_quiz(course_id, course_title, questions):
+    """Démarre un quiz
+    
+    Le quiz est une machine à états (voir quiz_service.new_quiz) stockée dans la session.
+    Les quasi-doublons sont retirés et les questions déjà vues passent en dernier.
+    """
+    questions = select_questions(questions, len(questions), get_seen_index())
+    st.session_state.current_quiz = new_quiz(course_id, course_title, questions)
+
+def render_streamed_question(container):
+    """Callback qui affiche chaque question dans container dès sa réception"""
+    def render(index, question):
+        container.write(f"**Question {index + 1}:** {question['question']}")
+    return render
 
 def update_user_stats(correct_answers, total_questions):
     """Met à jour les statistiques de l'utilisateur"""
-    st.session_state.user_data['quizzes_completed'] += 1
-    st.session_state.user_data['correct_answers'] += correct_answers
-    st.session_state.user_data['points'] += correct_answers * 10
-    
-    # Mise à jour du rang
-    points = st.session_state.user_data['points']
-    if points >= 1000:
-        st.session_state.user_data['rank'] = '🏆 Expert'
-    elif points >= 500:
-        st.session_state.user_data['rank'] = '⭐ Avancé'
-    elif points >= 200:
-        st.session_state.user_data['rank'] = '📚 Intermédiaire'
+    user_id = get_user_id(create=True)
+    st.session_state.user_data = get_quiz_service().update_user_stats(user_id, correct_answers, total_questions)
+
+@st.fragment
+def render_course_card(course):
+    """Carte d'un cours
+    
+    Fragment Streamlit: les boutons de la carte ne relancent que cette carte,
+    pas toute la page.
+    """
+    with st.expander(f"{course['title']} - {course['date']}"):
+        st.write(f"**Type:** {course['type'].capitalize()}")
+        st.write(f"**Contenu:** {course['preview']}...")
+
+        col_a, col_b, col_c , col_d, col_e, col_f, col_g, col_h = st.columns(8)
+        with col_a:
+            num_questions = st.selectbox(
+                "Nombre de questions", 
+                [3, 5, 8, 10], 
+                index=1, 
+                key=f"num_q_{course['id']}"
+            )
+
+        with col_b:
+            if st.button(f"🎯 Générer Quiz", key=f"gen_{course['id']}"):
+                course_content = get_storage().get_course(course['id'])['content']
+                quiz_questions = take_from_question_bank(course_content, num_questions)
+                if quiz_questions:
+                    st.caption("⚡ Questions tirées de la banque du cours")
+                elif st.session_state.get('gemini_configured', False):
+                    st.caption(f"🤖 Gemini AI génère {num_questions} questions...")
+                    quiz_questions = generate_quiz_from_text(
+                        course_content,
+                        num_questions,
+                        on_question=render_streamed_question(st.container())
+                    )
+                else:
+                    st.warning("⚠️ API Gemini non configurée - Questions générées localement à partir du cours")
+                    quiz_questions = generate_quiz_from_text(course_content, num_questions)
+
+                get_storage().set_course_quiz(course['id'])
+                start_quiz(course['id'], course['title'], quiz_questions)
+                st.success(f"✅ Quiz de {len(quiz_questions)} questions généré!")
+                st.info("➡️ Allez dans l'onglet 'Quiz' pour commencer.")
+
+        with col_c:
+            if st.button(f"🗑️ Supprimer", key=f"del_{course['id']}"):
+                get_storage().delete_course(course['id'])
+                rerun()
+        with col_d :
+            if st.button("Génèrer une synthèse", key=f"col_d_{course['id']}"):
+                st.success("Génèration une synthèse simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+        # Simulation
+        with col_e :
+            if st.button("Génèrer un podcast (Spech generation)",key=f"col_e_{course['id']}"):
+                st.success("Génèration podcast simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+        with col_f :
+            if st.button("Story telling",key=f"col_f_{course['id']}"):
+                st.success("Génèration story telling simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+        with col_g :
+            if st.button("Chatter par texte",key=f"col_g_{course['id']}"):
+                st.success("Chat simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+        with col_h :
+            if st.button("Chatte par voice 2 voice", key=f"col_h_{course['id']}"):
+                st.success("Chat simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+
+        # Quiz préparé par la génération par lot
+        if course['has_quiz']:
+            if st.button("▶️ Commencer le quiz préparé", key=f"start_{course['id']}"):
+                start_quiz(
+                    course['id'],
+                    course['title'],
+                    get_storage().get_course(course['id'])['quiz_questions']
+                )
+                st.info("➡️ Allez dans l'onglet 'Quiz' pour commencer.")
+
+def submit_answer():
+    """Enregistre la réponse choisie et passe à l'état 'feedback'"""
+    quiz = st.session_state.current_quiz
+    answer_question(quiz, st.session_state[f"q_{quiz['current_question']}"])
+
+def next_question():
+    """Passe de la correction à la question suivante"""
+    advance_quiz(st.session_state.current_quiz)
+
+def close_quiz():
+    st.session_state.current_quiz = None
+
+@st.fragment
+def render_quiz():
+    """Quiz en cours
+    
+    Fragment Streamlit: répondre à une question ne relance que le quiz;
+    la page entière n'est relancée qu'à la fin (points et statistiques).
+    Les transitions se font dans les callbacks des boutons, sans attente
+    côté serveur.
+    """
+    if st.session_state.current_quiz is None:
+        due_count = due_review_count()
+        if due_count:
+            st.info(f"🔁 {due_count} question(s) à revoir aujourd'hui")
+            st.button("Commencer la révision du jour", on_click=start_review_quiz)
+        else:
+            st.info("📚 Importez d'abord un cours et générez un quiz dans l'onglet 'Mes Cours'")
+        return
+    
+    quiz = st.session_state.current_quiz
+    current_q = quiz['current_question']
+    total_questions = len(quiz['questions'])
+    
+    if quiz['state'] == 'finished':
+        st.success(f"🎉 Quiz terminé! Score: {quiz['score']}/{total_questions}")
+        st.progress(1.0)
+        st.button("Terminer le quiz", on_click=close_quiz)
+        return
+    
+    question = quiz['questions'][current_q]
+    
+    st.markdown(f"""
+    <div class="quiz-question">
+        <h4>Question {current_q + 1}/{total_questions}</h4>
+        <h3>{question['question']}</h3>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Barre de progression
+    progress = (current_q) / total_questions
+    st.progress(progress)
+    
+    # Options de réponse (figées pendant l'affichage de la correction)
+    st.radio(
+        "Choisissez votre réponse:",
+        range(len(question['options'])),
+        format_func=lambda x: question['options'][x],
+        key=f"q_{current_q}",
+        disabled=quiz['state'] == 'feedback'
+    )
+    
+    if quiz['state'] == 'question':
+        st.button("Valider la réponse", on_click=submit_answer)
+        return
+    
+    # Correction visible jusqu'à ce que l'élève passe à la suite
+    if check_answer(question, quiz['answers'][-1]):
+        st.markdown('<div class="correct-answer">✅ Bonne réponse!</div>', unsafe_allow_html=True)
     else:
-        st.session_state.user_data['rank'] = '🌱 Débutant'
+        st.markdown(f'<div class="incorrect-answer">❌ Incorrect. La bonne réponse était: {question["options"][question["correct"]]}</div>', unsafe_allow_html=True)
     
-    # Mise à jour de la série d'études
-    today = datetime.now().date()
-    if st.session_state.user_data['last_study_date'] == today - timedelta(days=1):
-        st.session_state.user_data['study_streak'] += 1
-    elif st.session_state.user_data['last_study_date'] != today:
-        st.session_state.user_data['study_streak'] = 1
+    if question.get('explanation'):
+        st.info(f"💡 **Explication:** {question['explanation']}")
     
-    st.session_state.user_data['last_study_date'] = today
+    if current_q + 1 < total_questions:
+        st.button("Question suivante ➡️", on_click=next_question)
+    elif st.button("Voir le résultat 🏁"):
+        # Fin du quiz: points, rang, résultat et réponses enregistrés
+        st.session_state.user_data = get_quiz_service().finish_quiz(
+            get_user_id(create=True), quiz, seen_index=get_seen_index()
+        )
+        # Points et statistiques modifiés: toute la page est relancée
+        rerun()
+
+# Choix proposés dans l'onglet Paramètres
+REMINDER_FREQUENCIES = ["Quotidien", "3 fois par semaine", "Hebdomadaire"]
+THEMES = ["Clair", "Sombre"]
+DIFFICULTIES = ["Facile", "Moyen", "Difficile"]
+LANGUAGES = ["Français", "Wolof", "English"]
+
+def render_performance_panel():
+    """Panneau d'administration: temps mesurés et reruns les plus lents"""
+    with st.expander("🛠️ Performances (administration)"):
+        if not tracer.enabled:
+            st.info("Mesure désactivée: définissez REVIZIA_TRACE_SAMPLE_RATE (par exemple 0.1)")
+            return
+        st.caption(
+            f"{TRACE_SAMPLE_RATE:.0%} des reruns mesurés · export Prometheus: "
+            + (f"port {METRICS_PORT} (/metrics)" if METRICS_PORT else "désactivé")
+        )
+        if tracer.metrics_error:
+            st.warning(f"⚠️ Export Prometheus indisponible: {tracer.metrics_error}")
+        
+        summary = tracer.span_summary()
+        if summary:
+            st.dataframe(pd.DataFrame(
+                [(name, values['count'], 1000 * values['avg_s']) for name, values in summary.items()],
+                columns=['section', 'mesures', 'moyenne (ms)']
+            ).sort_values('moyenne (ms)', ascending=False), hide_index=True)
+        
+        slowest = tracer.slowest_reruns()
+        if not slowest:
+            st.info("Aucun rerun mesuré pour le moment")
+            return
+        st.markdown("**Reruns les plus lents**")
+        st.dataframe(pd.DataFrame([
+            {
+                'onglet': rerun['rerun'],
+                'date': rerun['date'],
+                'durée (ms)': 1000 * rerun['durée (s)'],
+                'sections les plus longues': ' · '.join(
+                    f"{name} {1000 * duration:.0f} ms" for name, _, duration in rerun['spans'][:3]
+                ),
+            }
+            for rerun in slowest
+        ]), hide_index=True)
+
+def get_user_settings():
+    """Paramètres de l'élève courant (valeurs par défaut s'il n'a pas encore de profil)"""
+    return get_storage().get_settings(get_user_id() or '')
+
+def show_review_reminder():
+    """Rappel de révision, une fois par jour, selon les paramètres de l'élève"""
+    if not get_user_id():
+        return
+    now = datetime.now()
+    if not reminder_due(get_user_settings(), now, st.session_state.get('last_review_reminder')):
+        return
+    st.session_state.last_review_reminder = now
+    due_count = due_review_count()
+    if due_count:
+        st.toast(f"🔔 {due_count} question(s) à revoir aujourd'hui: onglet 🎯 Quiz")
 
 # Configuration de l'API Gemini au démarrage
 configure_gemini()
+# Classement, statistiques et révisions rechargés si l'API (un autre processus) a écrit dans la base
+get_quiz_service().reload_if_changed()
+show_review_reminder()
 
 # En-tête principal
 st.markdown("""
@@ -412,33 +804,48 @@ with st.sidebar:
         with st.form("user_setup"):
             name = st.text_input("Nom complet")
             level = st.selectbox("Classe", ["Seconde", "Première", "Terminale"])
+            school = st.text_input("Établissement")
+            region = st.selectbox("Région", REGIONS)
             submitted = st.form_submit_button("Créer mon profil")
             
             if submitted and name:
-                st.session_state.user_data['name'] = name
-                st.session_state.user_data['level'] = level
+                user_id = get_user_id(create=True)
+                get_storage().update_user(
+                    user_id, name=name, level=level, school=school.strip(), region=region
+                )
+                sync_leaderboard(user_id)
                 st.success("Profil créé avec succès!")
-                st.rerun()
+                rerun()
     else:
         st.write(f"**{st.session_state.user_data['name']}**")
         st.write(f"📚 Classe: {st.session_state.user_data['level']}")
+        if st.session_state.user_data['school']:
+            st.write(f"🏫 Établissement: {st.session_state.user_data['school']}")
         st.write(f"🏅 Rang: {st.session_state.user_data['rank']}")
         st.write(f"⭐ Points: {st.session_state.user_data['points']}")
         st.write(f"🔥 Série: {st.session_state.user_data['study_streak']} jours")
         
         if st.button("🔄 Réinitialiser profil"):
-            for key in st.session_state.user_data:
-                if key == 'name' or key == 'level':
-                    st.session_state.user_data[key] = ''
-                else:
-                    st.session_state.user_data[key] = 0
-            st.rerun()
+            get_storage().reset_user(get_user_id())
+            sync_leaderboard(get_user_id())
+            rerun()
 
 # Navigation principale
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["📚 Mes Cours", "🎯 Quiz", "📊 Statistiques", "🎮 Jeu", "⚙️ Paramètres"])
+# Seule la section active est exécutée et envoyée au navigateur à chaque rerun
+# (avec st.tabs, le contenu des cinq onglets serait recalculé à chaque fois)
+TABS = ["📚 Mes Cours", "🎯 Quiz", "📊 Statistiques", "🎮 Jeu", "⚙️ Paramètres"]
+active_tab = st.radio(
+    "Navigation",
+    TABS,
+    horizontal=True,
+    key="active_tab",
+    label_visibility="collapsed"
+)
+tracer.label_rerun(active_tab)
+tab_span = tracer.span(f"onglet {active_tab}")
 
 # Onglet 1: Gestion des cours
-with tab1:
+if active_tab == TABS[0]:
     st.header("📚 Gestion de vos Cours")
     
     col1, col2 = st.columns([2, 1])
@@ -457,16 +864,8 @@ with tab1:
             course_content = st.text_area("Contenu du cours ou de la note", height=200)
             
             if st.button("Importer le cours ou la prise de note") and course_title and course_content:
-                new_course = {
-                    'id': len(st.session_state.courses),
-                    'title': course_title,
-                    'content': course_content,
-                    'type': 'text',
-                    'date': datetime.now().strftime("%d/%m/%Y %H:%M"),
-                    'quiz_generated': False
-                }
-                st.session_state.courses.append(new_course)
-                st.session_state.user_data['courses_uploaded'] += 1
+                get_storage().add_course(get_user_id(create=True), course_title, course_content, 'text')
+                prefill_question_bank(course_content)
                 st.success("✅ Cours importé avec succès!")
                 
                 # Génération automatique d'un aperçu de quiz
@@ -481,58 +880,109 @@ with tab1:
                                     marker = "✅" if j == q['correct'] else "◯"
                                     st.write(f"  {marker} {option}")
                 
-                st.rerun()
+                rerun()
         
         elif import_method == "🎤 Audio":
-            st.info("🎤 Fonctionnalité de reconnaissance vocale")
-            st.write("Cliquez sur 'Enregistrer' pour démarrer l'enregistrement audio")
+            st.info("🎤 Transcription locale d'un enregistrement de cours")
+            uploaded_audio = st.file_uploader(
+                "Choisir un enregistrement",
+                type=['mp3', 'wav', 'm4a', 'ogg', 'webm', 'aac', 'flac']
+            )
+            
+            if uploaded_audio is not None:
+                st.audio(uploaded_audio)
+                if not transcription_available():
+                    st.warning(
+                        "⚠️ La transcription n'est pas installée sur le serveur "
+                        "(pip install faster-whisper et ffmpeg)"
+                    )
+                elif st.button("📝 Transcrire l'enregistrement"):
+                    audio_hash, path = hash_and_save(uploaded_audio, os.path.join(DATA_DIR, "uploads"))
+                    get_transcription_service().submit(audio_hash, path)
+                    st.session_state.audio_job = audio_hash
+            
+            if st.session_state.get('audio_job'):
+                render_transcription_progress()
             
-            if st.button("🎙️ Enregistrer audio"):
-                st.success("Enregistrement simulé - Dans la vraie app, ceci utiliserait l'API de reconnaissance vocale")
-                # Simulation
+            # Transcription terminée: relue et corrigée par l'élève avant l'import
+            if st.session_state.get('audio_content'):
                 course_title = st.text_input("Titre du cours audio", key="audio_title")
-                if course_title:
-                    new_course = {
-                        'id': len(st.session_state.courses),
-                        'title': course_title,
-                        'content': "Contenu transcrit de l'audio (simulation)",
-                        'type': 'audio',
-                        'date': datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        'quiz_generated': False
-                    }
-                    st.session_state.courses.append(new_course)
-                    st.session_state.user_data['courses_uploaded'] += 1
+                course_content = st.text_area("Transcription (modifiable)", key="audio_content", height=200)
+                if st.button("Importer la transcription") and course_title and course_content:
+                    get_storage().add_course(get_user_id(create=True), course_title, course_content, 'audio')
+                    prefill_question_bank(course_content)
+                    del st.session_state.audio_content
+                    st.success("✅ Cours importé avec succès!")
+                    rerun()
         
         elif import_method == "📷 Image (OCR)":
-            st.info("📷 Reconnaissance OCR avec l'IA")
-            uploaded_file = st.file_uploader("Choisir une image", type=['png', 'jpg', 'jpeg'])
+            st.info("📷 Reconnaissance de texte (OCR) locale")
+            uploaded_files = st.file_uploader(
+                "Choisir une ou plusieurs images (une par page)",
+                type=['png', 'jpg', 'jpeg'],
+                accept_multiple_files=True
+            )
             
-            if uploaded_file is not None:
-                image = Image.open(uploaded_file)
-                st.image(image, caption="Image uploadée", use_column_width=True)
+            if uploaded_files:
+                st.image(
+                    [image_preview(f.getvalue()) for f in uploaded_files],
+                    caption=[f.name for f in uploaded_files],
+                    width=150
+                )
                 
-                if st.button("🔍 Extraire le texte (OCR)"):
-                    st.success("OCR simulé - Dans la vraie app, ceci utiliserait l'API OCR de Google")
-                    course_title = st.text_input("Titre du cours OCR", key="ocr_title")
-                    if course_title:
-                        new_course = {
-                            'id': len(st.session_state.courses),
-                            'title': course_title,
-                            'content': "Texte extrait de l'image via OCR (simulation)",
-                            'type': 'image',
-                            'date': datetime.now().strftime("%d/%m/%Y %H:%M"),
-                            'quiz_generated': False
-                        }
-                        st.session_state.courses.append(new_course)
-                        st.session_state.user_data['courses_uploaded'] += 1
+                if not ocr_available():
+                    st.warning(
+                        "⚠️ Tesseract n'est pas installé sur le serveur "
+                        "(pip install pytesseract et apt install tesseract-ocr tesseract-ocr-fra)"
+                    )
+                elif st.button("🔍 Extraire le texte (OCR)"):
+                    progress = st.progress(0.0, text="Reconnaissance du texte...")
+                    pages = [None] * len(uploaded_files)
+                    images = [f.getvalue() for f in uploaded_files]
+                    for done, (index, text) in enumerate(get_ocr_service().recognize_many(images), start=1):
+                        pages[index] = text
+                        progress.progress(done / len(pages), text=f"Page {done}/{len(pages)} reconnue")
+                    st.session_state.ocr_content = "\n\n".join(page for page in pages if page)
+                    if not st.session_state.ocr_content:
+                        st.warning("Aucun texte reconnu sur ces images")
+            
+            # Texte reconnu: relu et corrigé par l'élève avant l'import
+            if st.session_state.get('ocr_content'):
+                course_title = st.text_input("Titre du cours OCR", key="ocr_title")
+                course_content = st.text_area("Texte extrait (modifiable)", key="ocr_content", height=200)
+                if st.button("Importer le texte extrait") and course_title and course_content:
+                    get_storage().add_course(get_user_id(create=True), course_title, course_content, 'image')
+                    prefill_question_bank(course_content)
+                    del st.session_state.ocr_content
+                    st.success("✅ Cours importé avec succès!")
+                    rerun()
         elif import_method == "📝 Base de connaissance commune google drive":
-            st.info("🎤 Utilise la base de connaisasance commune de la classe, ou celle reconnu centrale reconnue par le minstère de l'éducation nationale")
-            st.write("Cliquez sur 'Connecter' pour démarrer la connexion à la base de données centralisée")
+            st.info("📚 Base de connaissance commune de la classe, ou celle reconnue par le ministère de l'Éducation nationale")
             
-            if st.button("📝 Connexion à la base Google drive"):
-                st.success("Connexion simulé - Dans la vraie app, ceci utiliserait l'API de google drive")
-                # Simulation
+            if not os.path.isdir(KB_DIR):
+                st.warning(f"Aucune base de connaissance commune n'est configurée sur ce serveur ({KB_DIR})")
+            else:
+                knowledge_base = get_knowledge_base()
+                knowledge_base.sync_if_stale()
+                kb_stats = knowledge_base.stats()
+                st.caption(f"🗂️ {kb_stats['documents']} documents · {kb_stats['chapters']} chapitres")
                 
+                query = st.text_input("🔍 Rechercher un chapitre", key="kb_query")
+                if query:
+                    results = knowledge_base.search(query)
+                    if not results:
+                        st.info("Aucun chapitre trouvé")
+                    for result in results:
+                        st.markdown(f"**{result['title']}** · _{result['path']}_")
+                        st.caption(result['snippet'])
+                        if st.button("➕ Ajouter à mes cours", key=f"kb_{result['id']}"):
+                            chapter = knowledge_base.get_chapter(result['id'])
+                            get_storage().add_course(
+                                get_user_id(create=True), chapter['title'], chapter['content'], 'base commune'
+                            )
+                            # Contenu identique pour tous les élèves: quiz et banque de questions partagés
+                            prefill_question_bank(chapter['content'])
+                            st.success(f"✅ « {chapter['title']} » ajouté à vos cours")
     
     with col2:
         st.markdown("""
@@ -555,130 +1005,77 @@ with tab1:
         """, unsafe_allow_html=True)
     
     # Liste des cours
-    if st.session_state.courses:
+    storage = get_storage()
+    user_id = get_user_id()
+    course_count = storage.count_courses(user_id) if user_id else 0
+    if course_count:
         st.subheader("📖 Vos cours importés")
         
-        for course in st.session_state.courses:
-            with st.expander(f"{course['title']} - {course['date']}"):
-                st.write(f"**Type:** {course['type'].capitalize()}")
-                st.write(f"**Contenu:** {course['content'][:200]}...")
+        # Génération des quiz de tous les cours en parallèle
+        if st.session_state.get('gemini_configured', False) and course_count > 1:
+            col_batch_a, col_batch_b = st.columns([1, 3])
+            with col_batch_a:
+                batch_num_questions = st.selectbox(
+                    "Questions par cours",
+                    [3, 5, 8, 10],
+                    index=1,
+                    key="batch_num_q"
+                )
+            with col_batch_b:
+                st.write("")
+                batch_clicked = st.button("⚡ Générer un quiz pour tous les cours")
+            
+            if batch_clicked:
+                courses = storage.list_courses(user_id, limit=course_count, with_content=True)
+                level = st.session_state.user_data.get('level') or 'Terminale'
+                api_key = current_api_key()
+                progress_bar = st.progress(0.0)
+                status = st.empty()
                 
-                col_a, col_b, col_c , col_d, col_e, col_f, col_g, col_h = st.columns(8)
-                with col_a:
-                    num_questions = st.selectbox(
-                        "Nombre de questions", 
-                        [3, 5, 8, 10], 
-                        index=1, 
-                        key=f"num_q_{course['id']}"
-                    )
+                service = get_quiz_service()
                 
-                with col_b:
-                    if st.button(f"🎯 Générer Quiz", key=f"gen_{course['id']}"):
-                        if st.session_state.get('gemini_configured', False):
-                            with st.spinner(f"🤖 Gemini AI génère {num_questions} questions..."):
-                                quiz_questions = generate_quiz_from_text(course['content'], num_questions)
-                        else:
-                            st.warning("⚠️ API Gemini non configurée - Utilisation du mode simulation")
-                            quiz_questions = generate_quiz_from_text(course['content'], num_questions)
-                        
-                        st.session_state.current_quiz = {
-                            'course_id': course['id'],
-                            'course_title': course['title'],
-                            'questions': quiz_questions,
-                            'current_question': 0,
-                            'answers': [],
-                            'score': 0
-                        }
-                        st.success(f"✅ Quiz de {len(quiz_questions)} questions généré!")
-                        st.info("➡️ Allez dans l'onglet 'Quiz' pour commencer.")
+                def generate_for_course(course):
+                    return service.generate_validated_questions(
+                        course['content'], batch_num_questions, level, api_key
+                    )
                 
-                with col_c:
-                    if st.button(f"🗑️ Supprimer", key=f"del_{course['id']}"):
-                        st.session_state.courses = [c for c in st.session_state.courses if c['id'] != course['id']]
-                        st.rerun()
-                with col_d :
-                    if st.button("Génèrer une synthèse", key=f"col_d_{course['id']}"):
-                        st.success("Génèration une synthèse simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
-                # Simulation
-                with col_e :
-                    if st.button("Génèrer un podcast (Spech generation)",key=f"col_e_{course['id']}"):
-                        st.success("Génèration podcast simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
-                with col_f :
-                    if st.button("Story telling",key=f"col_f_{course['id']}"):
-                        st.success("Génèration story telling simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
-                with col_g :
-                    if st.button("Chatter par texte",key=f"col_g_{course['id']}"):
-                        st.success("Chat simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
-                with col_h :
-                    if st.button("Chatte par voice 2 voice", key=f"col_h_{course['id']}"):
-                        st.success("Chat simulé - Dans la vraie app, ceci utiliserait l'API de de Google")
+                results = run_concurrently(
+                    courses,
+                    generate_for_course,
+                    max_concurrency=BATCH_CONCURRENCY,
+                    rate_limiter=get_rate_limiter() if api_key else None,
+                    rate_key=api_key
+                )
+                # Affichage au fil de l'eau, dans l'ordre de terminaison
+                for done, (course, quiz_questions, error) in enumerate(results, start=1):
+                    if error is None:
+                        storage.set_course_quiz(course['id'], quiz_questions)
+                        st.write(f"✅ {course['title']}: {len(quiz_questions)} questions")
+                    else:
+                        st.write(f"❌ {course['title']}: {error}")
+                    progress_bar.progress(done / len(courses))
+                    status.caption(f"{done}/{len(courses)} cours traités")
+        
+        # Chargement paginé: seul un aperçu des cours de la page est lu
+        page_count = -(-course_count // COURSES_PAGE_SIZE)
+        page = 1
+        if page_count > 1:
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+        courses_page = storage.list_courses(
+            user_id, limit=COURSES_PAGE_SIZE, offset=(page - 1) * COURSES_PAGE_SIZE
+        )
+        
+        for course in courses_page:
+            render_course_card(course)
+
 # Onglet 2: Quiz
-with tab2:
+if active_tab == TABS[1]:
     st.header("🎯 Quiz Interactif")
     
-    if st.session_state.current_quiz is None:
-        st.info("📚 Importez d'abord un cours et générez un quiz dans l'onglet 'Mes Cours'")
-    else:
-        quiz = st.session_state.current_quiz
-        current_q = quiz['current_question']
-        
-        if current_q < len(quiz['questions']):
-            question = quiz['questions'][current_q]
-            
-            st.markdown(f"""
-            <div class="quiz-question">
-                <h4>Question {current_q + 1}/{len(quiz['questions'])}</h4>
-                <h3>{question['question']}</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Barre de progression
-            progress = (current_q) / len(quiz['questions'])
-            st.progress(progress)
-            
-            # Options de réponse
-            selected_answer = st.radio(
-                "Choisissez votre réponse:",
-                range(len(question['options'])),
-                format_func=lambda x: question['options'][x],
-                key=f"q_{current_q}"
-            )
-            
-            if st.button("Valider la réponse"):
-                quiz['answers'].append(selected_answer)
-                
-                # Vérification de la réponse
-                if selected_answer == question['correct']:
-                    st.markdown('<div class="correct-answer">✅ Bonne réponse!</div>', unsafe_allow_html=True)
-                    quiz['score'] += 1
-                else:
-                    st.markdown(f'<div class="incorrect-answer">❌ Incorrect. La bonne réponse était: {question["options"][question["correct"]]}</div>', unsafe_allow_html=True)
-                
-                st.info(f"💡 **Explication:** {question['explanation']}")
-                
-                quiz['current_question'] += 1
-                
-                if quiz['current_question'] >= len(quiz['questions']):
-                    # Fin du quiz
-                    update_user_stats(quiz['score'], len(quiz['questions']))
-                    st.success(f"🎉 Quiz terminé! Score: {quiz['score']}/{len(quiz['questions'])}")
-                    
-                    # Sauvegarde des résultats
-                    st.session_state.quiz_results.append({
-                        'course_title': quiz['course_title'],
-                        'score': quiz['score'],
-                        'total': len(quiz['questions']),
-                        'percentage': (quiz['score'] / len(quiz['questions'])) * 100,
-                        'date': datetime.now().strftime("%d/%m/%Y %H:%M")
-                    })
-                    
-                    st.session_state.current_quiz = None
-                
-                time.sleep(2)  # Pause pour lire la réponse
-                st.rerun()
+    render_quiz()
 
 # Onglet 3: Statistiques
-with tab3:
+if active_tab == TABS[2]:
     st.header("📊 Vos Statistiques")
     
     # Cartes de statistiques
@@ -716,20 +1113,54 @@ with tab3:
         </div>
         """, unsafe_allow_html=True)
     
-    # Graphiques
-    if st.session_state.quiz_results:
+    # Graphiques et tableaux calculés à partir des agrégats du moteur de statistiques
+    user_id = get_user_id()
+    stats = load_stats(user_id) if user_id else None
+    summary = stats.summary(user_id, datetime.now().date()) if stats else None
+    if summary:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Taux de réussite", f"{summary['success_rate']:.0f}%")
+        col2.metric(
+            "Moyenne mobile", f"{summary['moving_average']:.0f}%",
+            delta=f"{summary['recent_average'] - summary['success_rate']:+.0f} pts (5 derniers quiz)"
+        )
+        col3.metric("Meilleure série", f"{summary['best_streak']} jours")
+        
         st.subheader("📈 Évolution de vos performances")
+        history = stats.history(user_id, RESULTS_HISTORY_SIZE)
+        st.line_chart(history.set_index('date')[['pourcentage', 'moyenne mobile']])
         
-        df = pd.DataFrame(st.session_state.quiz_results)
-        st.line_chart(df.set_index('date')['percentage'])
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("🎯 Maîtrise par cours")
+            st.dataframe(stats.mastery(user_id), hide_index=True)
+        with col2:
+            st.subheader("🕒 Réussite selon le moment")
+            st.bar_chart(stats.time_of_day(user_id)['réussite (%)'])
         
         st.subheader("📋 Historique des quiz")
-        st.dataframe(df)
+        st.dataframe(history, hide_index=True)
     else:
         st.info("Aucun quiz complété pour le moment. Commencez par importer un cours!")
+    
+    # Vue de la classe (même établissement et même niveau): les élèves ne voient que
+    # les agrégats, le détail nominatif est réservé à l'administration
+    school = st.session_state.user_data.get('school')
+    level = st.session_state.user_data.get('level')
+    if user_id and school and level:
+        with st.expander(f"👩‍🏫 Vue de la classe: {level} - {school}"):
+            members = get_storage().list_class_members(school, level)
+            for member_id, _ in members:
+                load_stats(member_id)
+            class_view = get_stats_engine().class_view(members, datetime.now().date())
+            st.write(f"**{len(members)} élèves**")
+            if is_admin():
+                st.dataframe(class_view['students'], hide_index=True)
+            st.subheader("Maîtrise des cours dans la classe")
+            st.dataframe(class_view['courses'], hide_index=True)
 
 # Onglet 4: Jeu
-with tab4:
+if active_tab == TABS[3]:
     st.header("🎮 Mode Jeu - Quiz Challenge")
     
     st.info("🏆 Défiez-vous avec des questions rapides!")
@@ -754,51 +1185,93 @@ with tab4:
             }
         ]
         
-        st.session_state.current_quiz = {
-            'course_id': 'challenge',
-            'course_title': 'Quiz Challenge',
-            'questions': challenge_questions,
-            'current_question': 0,
-            'answers': [],
-            'score': 0
-        }
+        start_quiz('challenge', 'Quiz Challenge', challenge_questions)
         st.success("Challenge démarré! Allez dans l'onglet Quiz.")
     
-    # Classement fictif
+    # Classement des élèves (national, classe, établissement, région)
     st.subheader("🏆 Classement des joueurs")
-    leaderboard = [
-        {"Nom": "Aminata D.", "Points": 1250, "Rang": "🏆 Expert"},
-        {"Nom": "Mamadou S.", "Points": 980, "Rang": "⭐ Avancé"},
-        {"Nom": st.session_state.user_data['name'] or "Vous", "Points": st.session_state.user_data['points'], "Rang": st.session_state.user_data['rank']},
-        {"Nom": "Fatou M.", "Points": 750, "Rang": "📚 Intermédiaire"},
-        {"Nom": "Ousmane T.", "Points": 420, "Rang": "🌱 Débutant"}
-    ]
+    leaderboard = get_leaderboard()
+    user_data = st.session_state.user_data
+    
+    scope_options = {"🌍 National": ('all', '')}
+    if user_data['level']:
+        scope_options[f"📚 {user_data['level']}"] = ('level', user_data['level'])
+    if user_data.get('school'):
+        scope_options[f"🏫 {user_data['school']}"] = ('school', user_data['school'])
+    if user_data.get('region'):
+        scope_options[f"📍 {user_data['region']}"] = ('region', user_data['region'])
+    scope = scope_options[st.radio("Classement", list(scope_options), horizontal=True)]
     
-    df_leaderboard = pd.DataFrame(leaderboard).sort_values('Points', ascending=False)
-    st.dataframe(df_leaderboard, use_container_width=True)
+    top_players = leaderboard.top(LEADERBOARD_SIZE, scope)
+    if top_players:
+        df_leaderboard = pd.DataFrame([
+            {
+                "Rang": player['rank'],
+                "Nom": player['name'],
+                "Points": player['points'],
+                "Classe": player['level'],
+                "Établissement": player['school'],
+                "Région": player['region'],
+            }
+            for player in top_players
+        ])
+        st.dataframe(df_leaderboard, use_container_width=True, hide_index=True)
+        
+        user_id = get_user_id()
+        my_rank = leaderboard.rank(user_id, scope) if user_id else None
+        if my_rank is not None:
+            st.info(f"📍 Votre position: {my_rank} / {leaderboard.size(scope)}")
+    else:
+        st.info("Aucun joueur classé pour le moment. Créez votre profil et terminez un quiz!")
 
 # Onglet 5: Paramètres
-with tab5:
+if active_tab == TABS[4]:
     st.header("⚙️ Paramètres")
     
     st.subheader("🔔 Rappels automatiques")
     
+    settings = get_user_settings()
     col1, col2 = st.columns(2)
     
     with col1:
-        reminder_enabled = st.checkbox("Activer les rappels")
-        reminder_time = st.time_input("Heure du rappel quotidien")
-        reminder_frequency = st.selectbox("Fréquence", ["Quotidien", "3 fois par semaine", "Hebdomadaire"])
+        reminder_enabled = st.checkbox("Activer les rappels", value=settings['reminder_enabled'])
+        reminder_time = st.time_input("Heure du rappel quotidien", value=settings['reminder_time'])
+        reminder_frequency = st.selectbox(
+            "Fréquence", REMINDER_FREQUENCIES,
+            index=REMINDER_FREQUENCIES.index(settings['reminder_frequency'])
+        )
     
     with col2:
         st.subheader("🎨 Préférences")
-        theme = st.selectbox("Thème", ["Clair", "Sombre"])
-        difficulty = st.selectbox("Niveau de difficulté par défaut", ["Facile", "Moyen", "Difficile"])
-        language = st.selectbox("Langue", ["Français", "Wolof", "English"])
+        theme = st.selectbox("Thème", THEMES, index=THEMES.index(settings['theme']))
+        difficulty = st.selectbox(
+            "Niveau de difficulté par défaut", DIFFICULTIES,
+            index=DIFFICULTIES.index(settings['difficulty'])
+        )
+        ability, error, answers = student_ability()
+        if answers:
+            st.caption(
+                f"🎯 Niveau estimé d'après vos {answers} réponses: {difficulty_for_ability(ability)} "
+                f"(θ = {ability:+.2f} ± {error:.2f}). Le niveau par défaut ne compte que tant que "
+                f"vos réponses sont peu nombreuses."
+            )
+        language = st.selectbox("Langue", LANGUAGES, index=LANGUAGES.index(settings['language']))
     
     if st.button("💾 Sauvegarder les paramètres"):
+        get_storage().save_settings(
+            get_user_id(create=True),
+            reminder_enabled=reminder_enabled,
+            reminder_time=reminder_time,
+            reminder_frequency=reminder_frequency,
+            theme=theme,
+            difficulty=difficulty,
+            language=language
+        )
         st.success("✅ Paramètres sauvegardés!")
     
+    if is_admin():
+        render_performance_panel()
+    
     st.subheader("ℹ️ À propos de RéviZIA")
     st.markdown("""
     **RéviZIA** est une plateforme éducative intelligente développée pour les lycéens africains, 
@@ -823,6 +1296,8 @@ with tab5:
     **Pas de conflit de dépendances!** 🎉
     """)
 
+tab_span.end()
+
 # Footer
 st.markdown("""
 ---
@@ -830,4 +1305,6 @@ st.markdown("""
     <p>🎓 RéviZIA - Plateforme Éducative Intelligente | Reconnu par le Ministère de l'Éducation Nationale du Sénégal</p>
     <p>Propulsé par l'IA Gemini de Google 🤖</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+rerun_trace.end()
@@ -0,0 +1,53 @@
+"""Exécution concurrente et limitée des générations de quiz"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class RateLimiter:
+    """Limiteur de débit (token bucket) indépendant pour chaque clé API"""
+
+    def __init__(self, requests_per_minute=15, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, requests_per_minute // 4)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, key):
+        """Réserve un jeton et retourne le temps d'attente nécessaire"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            tokens -= 1
+            self._buckets[key] = (tokens, now)
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate
+
+    def acquire(self, key):
+        """Bloque jusqu'à ce qu'une requête soit autorisée pour cette clé"""
+        wait = self._reserve(key)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def run_concurrently(jobs, worker, max_concurrency=4, rate_limiter=None, rate_key=None):
+    """Exécute worker(job) en parallèle et produit (job, résultat, erreur) au fil de l'eau
+
+    Les résultats sont produits dans l'ordre de terminaison: l'appelant peut
+    les afficher dès qu'ils arrivent.
+    """
+    def run(job):
+        if rate_limiter is not None:
+            rate_limiter.acquire(rate_key)
+        return worker(job)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="revizia-batch") as executor:
+        futures = {executor.submit(run, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield job, future.result(), None
+            except Exception as e:
+                yield job, None, e
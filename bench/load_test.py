@@ -0,0 +1,379 @@
+"""Test de charge: N élèves simultanés sur une même instance de app.py
+
+Le script lance le serveur Gemini simulé (bench/mock_gemini.py) et un
+serveur `streamlit run app.py` sans navigateur, puis ouvre N sessions
+websocket comme autant d'onglets. Chaque session importe un cours, génère
+un quiz, y répond puis ouvre ses statistiques. Les pages reçues sont lues
+avec l'arbre d'éléments de streamlit.testing (comme AppTest), et chaque
+exécution du script est chronométrée de la demande à la fin de l'exécution.
+Client websocket: paquet `websockets` (installé avec les versions récentes
+de Streamlit).
+
+Usage:
+    python bench/load_test.py --sessions 20 --latency 0.8
+    python bench/load_test.py --sessions 20 --json bench/resultats.json
+    python bench/load_test.py --sessions 20 --baseline bench/resultats.json --tolerance 0.2
+
+Avec --baseline, le script échoue (code 1) si un p95, le débit ou la mémoire
+par session se dégrade de plus de la tolérance par rapport au rapport de
+référence.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gemini import start_server  # noqa: E402
+
+STEPS = ('chargement', 'import', 'generation', 'reponse', 'statistiques')
+# Boutons qui font avancer un quiz en cours, par ordre de priorité
+QUIZ_BUTTONS = ('Valider la réponse', 'Question suivante ➡️', 'Voir le résultat 🏁', 'Terminer le quiz')
+
+
+def process_rss_mb(pid):
+    """Mémoire résidente d'un processus (Linux), ou None si /proc est absent"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port, env, log_path):
+    """Lance `streamlit run app.py` sans navigateur et attend qu'il réponde"""
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"),
+             "--server.headless", "true", "--server.port", str(port),
+             "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"le serveur Streamlit s'est arrêté (journal: {log_path})")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"le serveur Streamlit ne répond pas (journal: {log_path})")
+
+
+class HeadlessSession:
+    """Un onglet de navigateur simulé: envoie les widgets, reçoit la page"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.tree = None
+        self.query_string = ""
+        # Valeurs des widgets modifiés, renvoyées à chaque exécution comme le fait le navigateur
+        self.widgets = {}
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, trigger=None):
+        """Relance le script et attend la fin de l'exécution; retourne la durée"""
+        message = BackMsg()
+        message.rerun_script.query_string = self.query_string
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.widget_states.widgets.extend(self.widgets.values())
+        if trigger is not None:
+            message.rerun_script.widget_states.widgets.append(trigger)
+        start = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        messages = await asyncio.wait_for(self._receive_run(), self.timeout)
+        elapsed = time.perf_counter() - start
+        self.tree = parse_tree_from_messages(messages)
+        if self.tree.exception:
+            raise RuntimeError(self.tree.exception[0].message)
+        return elapsed
+
+    async def _receive_run(self):
+        messages = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                # Nouvelle exécution (st.rerun compris): la page repart de zéro
+                messages = []
+            elif kind == 'page_info_changed':
+                self.query_string = forward.page_info_changed.query_string
+            elif kind == 'script_finished':
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return messages
+            messages.append(forward)
+
+    def set(self, widget, value):
+        """Saisit un texte, ou choisit une option par son libellé affiché"""
+        if hasattr(widget, 'options'):
+            if str(value) not in widget.options:
+                raise RuntimeError(f"option absente: {value}")
+            state = WidgetState(id=widget.id, string_value=str(value))
+        else:
+            state = widget.set_value(value)._widget_state
+        self.widgets[widget.id] = state
+
+    def click(self, button):
+        return button.click()._widget_state
+
+
+class SessionRun:
+    """Parcours d'un élève: durée de chaque exécution du script, par étape"""
+
+    def __init__(self, index, url, num_questions, timeout):
+        self.index = index
+        self.num_questions = num_questions
+        self.session = HeadlessSession(url, timeout)
+        self.timings = {step: [] for step in STEPS}
+        self.error = None
+        self.duration = 0.0
+
+    async def _run(self, step, trigger=None):
+        try:
+            self.timings[step].append(await self.session.rerun(trigger))
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"{step}: délai dépassé")
+        except RuntimeError as e:
+            raise RuntimeError(f"{step}: {e}")
+
+    async def _nav(self, tab, step):
+        radio = self.session.tree.radio(key='active_tab')
+        self.session.set(radio, radio.options[tab])
+        await self._run(step)
+
+    async def flow(self):
+        session = self.session
+        started = time.perf_counter()
+        try:
+            await session.connect()
+            await self._run('chargement')
+
+            # Contenu propre à la session: pas de cache partagé entre élèves
+            tree = session.tree
+            session.set([w for w in tree.text_input if 'Titre du cours' in w.label][0], f"Cours {self.index}")
+            session.set([w for w in tree.text_area if 'Contenu' in w.label][0], (
+                f"Chapitre {self.index}. La photosynthèse convertit la lumière en énergie chimique. "
+                f"La chlorophylle absorbe la lumière rouge et bleue (élève {self.index}). "
+                "Le dioxyde de carbone et l'eau produisent du glucose et de l'oxygène."
+            ))
+            await self._run('import', session.click(
+                [b for b in tree.button if 'Importer le cours' in b.label][0]
+            ))
+
+            tree = session.tree
+            session.set(
+                [w for w in tree.selectbox if w.key and w.key.startswith('num_q_')][0], self.num_questions
+            )
+            await self._run('import')
+            await self._run('generation', session.click(
+                [b for b in session.tree.button if b.label.startswith('🎯')][0]
+            ))
+
+            await self._nav(1, 'reponse')
+            # Un quiz peut compter moins de questions que demandé (réponse tronquée)
+            finished = False
+            for _ in range(2 * self.num_questions + 2):
+                labels = {b.label: b for b in session.tree.button}
+                label = next((label for label in QUIZ_BUTTONS if label in labels), None)
+                if label is None:
+                    break
+                await self._run('reponse', session.click(labels[label]))
+                finished = finished or label == 'Terminer le quiz'
+            if not finished:
+                raise RuntimeError("reponse: le quiz n'a pas pu être terminé")
+
+            await self._nav(2, 'statistiques')
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        self.duration = time.perf_counter() - started
+
+
+def percentiles(values):
+    if not values:
+        return {'n': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'n': len(values), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(max(values))}
+
+
+async def run_load_test(url, server_pid, sessions, num_questions=5, timeout=120, ramp_up=0.0):
+    """Lance les sessions en parallèle et retourne le rapport"""
+    # Session d'échauffement: l'import des modules et les ressources partagées
+    # ne sont pas comptés dans la mémoire par session
+    warmup = SessionRun(-1, url, num_questions, timeout)
+    await warmup.flow()
+    await warmup.session.close()
+    if warmup.error:
+        raise RuntimeError(f"session d'échauffement: {warmup.error}")
+
+    runs = [SessionRun(i, url, num_questions, timeout) for i in range(sessions)]
+    rss_before = process_rss_mb(server_pid)
+    started = time.perf_counter()
+    tasks = []
+    for run in runs:
+        tasks.append(asyncio.create_task(run.flow()))
+        if ramp_up:
+            await asyncio.sleep(ramp_up / sessions)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    # Mesure avant la fermeture des onglets: les sessions sont encore en mémoire
+    rss_after = process_rss_mb(server_pid)
+    for run in runs:
+        await run.session.close()
+
+    succeeded = [run for run in runs if run.error is None]
+    reruns = sum(len(values) for run in runs for values in run.timings.values())
+    return {
+        'sessions': sessions,
+        'num_questions': num_questions,
+        'succeeded': len(succeeded),
+        'errors': [f"session {run.index}: {run.error}" for run in runs if run.error],
+        'elapsed_s': elapsed,
+        'throughput': {
+            'flows_per_s': len(succeeded) / elapsed,
+            'reruns_per_s': reruns / elapsed,
+        },
+        'latency_s': {
+            step: percentiles([value for run in runs for value in run.timings[step]]) for step in STEPS
+        },
+        'flow_s': percentiles([run.duration for run in succeeded]),
+        'memory_mb': {
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'per_session': (rss_after - rss_before) / sessions if rss_before is not None else None,
+        },
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Régressions par rapport au rapport de référence (liste de messages)"""
+    regressions = []
+    for step, stats in report['latency_s'].items():
+        reference = baseline.get('latency_s', {}).get(step, {}).get('p95')
+        if reference and stats['p95'] is not None and stats['p95'] > reference * (1 + tolerance):
+            regressions.append(f"p95 {step}: {stats['p95']:.3f}s (référence {reference:.3f}s)")
+    reference = baseline.get('throughput', {}).get('flows_per_s')
+    if reference and report['throughput']['flows_per_s'] < reference * (1 - tolerance):
+        regressions.append(
+            f"débit: {report['throughput']['flows_per_s']:.2f} parcours/s (référence {reference:.2f})"
+        )
+    reference = baseline.get('memory_mb', {}).get('per_session')
+    current = report['memory_mb']['per_session']
+    # Marge d'1 Mo: la mémoire résidente varie d'une exécution à l'autre
+    if reference and current is not None and current > max(reference * (1 + tolerance), reference + 1):
+        regressions.append(f"mémoire: {current:.1f} Mo/session (référence {reference:.1f})")
+    return regressions
+
+
+def print_report(report):
+    print(f"{report['succeeded']}/{report['sessions']} sessions réussies en {report['elapsed_s']:.1f}s")
+    for error in report['errors'][:10]:
+        print(f"  ❌ {error}")
+    print(f"{'étape':<14}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for step, stats in list(report['latency_s'].items()) + [('parcours', report['flow_s'])]:
+        if stats['n']:
+            print(f"{step:<14}{stats['n']:>6}" + ''.join(
+                f"{stats[key]:>8.3f}s" for key in ('p50', 'p95', 'p99', 'max')
+            ))
+    print(f"débit: {report['throughput']['flows_per_s']:.2f} parcours/s · "
+          f"{report['throughput']['reruns_per_s']:.1f} exécutions/s")
+    memory = report['memory_mb']
+    if memory['per_session'] is not None:
+        print(f"mémoire: {memory['per_session']:.1f} Mo/session "
+              f"(RSS serveur {memory['rss_before']:.0f} → {memory['rss_after']:.0f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="nombre d'élèves simultanés")
+    parser.add_argument("--questions", type=int, default=5, choices=[3, 5, 8, 10])
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="durée d'arrivée des sessions (s)")
+    parser.add_argument("--timeout", type=float, default=120, help="délai max d'une exécution du script (s)")
+    parser.add_argument("--latency", type=float, default=0.5, help="latence Gemini simulée (s)")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="dégradation tolérée (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    mock, base_url = start_server(
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, malformed_rate=args.malformed_rate
+    )
+    data_dir = os.environ.get("REVIZIA_DATA_DIR") or tempfile.mkdtemp(prefix="revizia-bench-")
+    env = dict(
+        os.environ,
+        REVIZIA_GEMINI_BASE_URL=base_url,
+        REVIZIA_GEMINI_API_KEYS=os.environ.get("REVIZIA_GEMINI_API_KEYS", "bench-key"),
+        REVIZIA_GEMINI_RPM=os.environ.get("REVIZIA_GEMINI_RPM", "100000"),
+        REVIZIA_DATA_DIR=data_dir,
+    )
+    port = free_port()
+    app = start_app(port, env, os.path.join(data_dir, "streamlit.log"))
+    try:
+        report = asyncio.run(run_load_test(
+            f"ws://127.0.0.1:{port}/_stcore/stream", app.pid,
+            args.sessions, args.questions, args.timeout, args.ramp_up
+        ))
+    finally:
+        app.terminate()
+        app.wait()
+        mock.shutdown()
+
+    config = mock.RequestHandlerClass.config
+    report['mock'] = {
+        'latency_s': args.latency, 'error_rate': args.error_rate, 'malformed_rate': args.malformed_rate,
+        'requests': config.requests, 'errors': config.errors, 'malformed': config.malformed,
+    }
+    print_report(report)
+    print(f"Gemini simulé: {config.requests} requêtes ({config.errors} erreurs, {config.malformed} malformées)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failed = bool(report['errors'])
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"⚠️ Régression {regression}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
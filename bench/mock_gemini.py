@@ -0,0 +1,178 @@
+"""Serveur local imitant l'API REST Gemini, pour les tests de charge
+
+Usage:
+    python bench/mock_gemini.py --port 8765 --latency 0.8 --error-rate 0.05 --malformed-rate 0.05
+    REVIZIA_GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta streamlit run app.py
+
+Endpoints: GET models/<modèle>, POST models/<modèle>:generateContent et
+models/<modèle>:streamGenerateContent?alt=sse. Les réponses contiennent un
+quiz au format attendu par l'application, avec le nombre de questions demandé
+dans le prompt.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_NUM_QUESTIONS = re.compile(r'génère exactement (\d+) questions')
+# Vocabulaire des questions simulées: tirées au hasard pour qu'elles ne soient
+# pas écartées comme quasi-doublons par l'application
+_WORDS = (
+    "cellule énergie lumière glucose oxygène molécule réaction chlorophylle équation fonction "
+    "révolution empire traité frontière économie population climat relief volcan séisme "
+    "vecteur dérivée intégrale probabilité théorème atome électron onde force vitesse"
+).split()
+
+
+class MockConfig:
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, malformed_rate=0.0, stream_chunks=8):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunks = stream_chunks
+        self.requests = 0
+        self.errors = 0
+        self.malformed = 0
+        self.lock = threading.Lock()
+
+
+def build_quiz(prompt):
+    match = _NUM_QUESTIONS.search(prompt)
+    count = int(match.group(1)) if match else 5
+    return {"questions": [
+        {
+            "question": f"Quel est le lien entre {' et '.join(random.sample(_WORDS, 3))} ?",
+            "options": [' '.join(random.sample(_WORDS, 3)) for _ in range(4)],
+            "correct": random.randrange(4),
+            "explanation": "Explication générée par le serveur de test."
+        }
+        for i in range(count)
+    ]}
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _delay(self):
+        time.sleep(max(0.0, random.gauss(self.config.latency, self.config.jitter)))
+
+    def _count(self):
+        """Compte la requête et tire au sort une erreur ou une réponse malformée"""
+        with self.config.lock:
+            self.config.requests += 1
+            if random.random() < self.config.error_rate:
+                self.config.errors += 1
+                return 'error'
+            if random.random() < self.config.malformed_rate:
+                self.config.malformed += 1
+                return 'malformed'
+        return 'ok'
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if '/models/' in path:
+            self._send(200, json.dumps({"name": path.split('/v1beta/')[-1]}))
+        else:
+            self._send(404, json.dumps({"error": {"code": 404, "message": "Not found"}}))
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(
+            part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])
+        )
+        outcome = self._count()
+        self._delay()
+        if outcome == 'error':
+            self._send(503, json.dumps({"error": {"code": 503, "message": "Service surchargé (simulé)"}}))
+            return
+
+        text = json.dumps(build_quiz(prompt), ensure_ascii=False)
+        if outcome == 'malformed':
+            # Réponse tronquée au milieu d'une question, comme une limite de tokens atteinte
+            text = text[:int(len(text) * 0.6)]
+
+        if path.endswith(':streamGenerateContent'):
+            self._stream(text)
+        elif path.endswith(':generateContent'):
+            self._send(200, json.dumps({
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}],
+                "usageMetadata": {
+                    "promptTokenCount": len(prompt) // 4,
+                    "candidatesTokenCount": len(text) // 4,
+                    "totalTokenCount": (len(prompt) + len(text)) // 4
+                }
+            }))
+        else:
+            self._send(404, json.dumps({"error": {"code": 404, "message": "Not found"}}))
+
+    def _stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        size = max(1, len(text) // self.config.stream_chunks + 1)
+        for start in range(0, len(text), size):
+            event = {"candidates": [{"content": {"parts": [{"text": text[start:start + size]}]}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.config.latency / self.config.stream_chunks / 4)
+        self.close_connection = True
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Client parti en cours de réponse (délai dépassé, flux abandonné): rien à signaler
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(port=0, **config):
+    """Démarre le serveur dans un thread et retourne (serveur, URL de base)"""
+    handler = type('ConfiguredHandler', (MockGeminiHandler,), {'config': MockConfig(**config)})
+    server = MockGeminiServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="latence moyenne en secondes")
+    parser.add_argument("--jitter", type=float, default=0.2, help="écart type de la latence")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses 503")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="proportion de JSON tronqués")
+    args = parser.parse_args()
+    server, base_url = start_server(
+        args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, malformed_rate=args.malformed_rate
+    )
+    print(f"Serveur Gemini simulé: REVIZIA_GEMINI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Découpage des cours longs et sélection équilibrée des questions (map-reduce)"""
+import re
+import unicodedata
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+')
+
+
+def _split_units(text, max_chars):
+    """Découpe en paragraphes, puis en phrases pour les paragraphes trop longs"""
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            # Phrase démesurée (texte OCR sans ponctuation...): coupe sur les espaces
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                units.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if sentence:
+                units.append(sentence)
+    return units
+
+
+def split_into_chunks(text, max_chars=2500, overlap=200):
+    """Découpe un texte en morceaux d'au plus max_chars caractères
+
+    Les coupures se font aux limites de paragraphes puis de phrases; chaque
+    morceau reprend les dernières phrases du précédent (jusqu'à overlap
+    caractères) pour conserver le contexte.
+    """
+    chunks = []
+    current = []
+    current_len = 0
+    for unit in _split_units(text, max_chars):
+        if current and current_len + len(unit) + 1 > max_chars:
+            chunks.append('\n'.join(current))
+            # Recouvrement: on reprend la fin du morceau précédent
+            tail = []
+            tail_len = 0
+            for previous in reversed(current):
+                if tail_len + len(previous) > overlap or tail_len + len(previous) + len(unit) + 1 > max_chars:
+                    break
+                tail.insert(0, previous)
+                tail_len += len(previous) + 1
+            current = tail
+            current_len = tail_len
+        current.append(unit)
+        current_len += len(unit) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def normalize_question(text):
+    """Forme normalisée d'une question (casse, accents, ponctuation) pour la déduplication"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def select_balanced(candidates_per_chunk, num_questions):
+    """Choisit num_questions questions sans doublon, réparties entre les morceaux
+
+    Les morceaux sont parcourus à tour de rôle afin que chaque partie du cours
+    soit représentée dans le quiz final.
+    """
+    seen = set()
+    queues = [list(candidates) for candidates in candidates_per_chunk]
+    selected = []
+    while len(selected) < num_questions and any(queues):
+        for queue in queues:
+            while queue:
+                question = queue.pop(0)
+                key = normalize_question(question['question'])
+                if key not in seen:
+                    seen.add(key)
+                    selected.append(question)
+                    break
+            if len(selected) >= num_questions:
+                break
+    return selected
@@ -0,0 +1,241 @@
+"""Génération locale de QCM à partir du texte du cours (TF-IDF + TextRank), sans appel réseau
+
+Les phrases les plus centrales du cours (TextRank sur la similarité TF-IDF
+des phrases) deviennent des questions à trous: le terme le plus
+caractéristique de la phrase est masqué, et les mauvaises réponses sont
+d'autres termes importants du même cours (ou d'autres cours déjà vus).
+Quelques millisecondes suffisent pour un cours de plusieurs pages.
+"""
+import random
+import re
+from collections import Counter
+
+import numpy as np
+
+from chunking import normalize_question
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?…;])\s+|\n+')
+_TOKEN_RE = re.compile(r"[^\W\d_]+(?:-[^\W\d_]+)*|\d+(?:[.,]\d+)?")
+
+# Phrases retenues comme questions (en caractères et en mots)
+MIN_SENTENCE_CHARS = 40
+MAX_SENTENCE_CHARS = 300
+MIN_SENTENCE_WORDS = 6
+# Au-delà, seules MAX_SENTENCES phrases réparties dans le cours sont analysées
+MAX_SENTENCES = 400
+# Mots de moins de MIN_TERM_LENGTH lettres jamais utilisés comme réponse
+MIN_TERM_LENGTH = 4
+# Mauvaises réponses tirées au hasard parmi les DISTRACTOR_POOL plus proches
+DISTRACTOR_POOL = 8
+BLANK = "_____"
+
+STOPWORDS = frozenset("""
+a à afin ai aie aient aies ainsi ait alors après as au aucun aucune aujourd auprès aussi autre autres
+aux avaient avais avait avant avec avez aviez avoir avons ayant bien c ça car ce ceci cela celle celles
+celui cependant certains certaines ces cet cette ceux chaque chez ci comme comment d dans de déjà
+depuis des dès deux donc dont du durant elle elles en encore entre es est et étaient était étant
+été être eu eux fait faire fois font grâce ici il ils j je jusqu l la là le les leur leurs lors
+lorsque lui m ma mais me même mêmes mes moi moins mon n ne ni non nos notre nous on ont or ou où par
+parce parmi pas pendant peu peut peuvent plus plusieurs pour pourquoi puis qu quand que quel quelle
+quelles quels qui quoi s sa sans se selon ses si sien soit sont sous souvent sur t ta tandis te tel
+telle telles tels tes toi ton tous tout toute toutes très tu un une vers via voici voilà vos votre
+vous y dit dite dits dites ensuite enfin toujours également autour beaucoup chez contre chacun
+chacune cas exemple partie celui-ci celle-ci ceux-ci celles-ci peut-être
+""".split())
+
+
+def split_sentences(text):
+    """Phrases du texte, dans l'ordre, sans les lignes vides"""
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+def _is_number(key):
+    return key[0].isdigit()
+
+
+def _stem(key):
+    """Racine grossière (pluriels) pour ne pas proposer « plante » et « plantes » ensemble"""
+    key = normalize_question(key)
+    return key[:-1] if len(key) > 4 and key[-1] in 'sx' else key
+
+
+def _eligible(key):
+    """Terme pouvant servir de réponse: mot porteur de sens ou nombre entier"""
+    if _is_number(key):
+        return key.isdigit() and len(key) >= 2
+    return len(key) >= MIN_TERM_LENGTH and key not in STOPWORDS
+
+
+class _CourseAnalysis:
+    """Matrice TF-IDF phrases × termes et formes affichées des termes"""
+
+    def __init__(self, text):
+        sentences = split_sentences(text)
+        if len(sentences) > MAX_SENTENCES:
+            keep = np.linspace(0, len(sentences) - 1, MAX_SENTENCES).astype(int)
+            sentences = [sentences[i] for i in keep]
+        self.sentences = sentences
+
+        vocabulary = {}
+        surfaces = {}
+        rows, cols, counts = [], [], []
+        self.sentence_terms = []
+        for row, sentence in enumerate(sentences):
+            terms = Counter()
+            for position, match in enumerate(_TOKEN_RE.finditer(sentence)):
+                surface = match.group()
+                key = surface.lower()
+                if not _eligible(key):
+                    continue
+                terms[key] += 1
+                # Forme affichée: la plus fréquente hors début de phrase (majuscule de position),
+                # sinon telle qu'écrite en début de phrase
+                forms = surfaces.setdefault(key, Counter())
+                forms[surface] += 1000 if position else 1
+            for key, count in terms.items():
+                col = vocabulary.setdefault(key, len(vocabulary))
+                rows.append(row)
+                cols.append(col)
+                counts.append(count)
+            self.sentence_terms.append(list(terms))
+
+        self.vocabulary = vocabulary
+        self.terms = list(vocabulary)
+        self.surfaces = {
+            key: forms.most_common(1)[0][0]
+            for key, forms in surfaces.items()
+        }
+        tf = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+        tf[rows, cols] = counts
+        df = (tf > 0).sum(axis=0)
+        idf = np.log((1 + len(sentences)) / (1 + df)) + 1
+        self.tfidf = tf * idf
+        # Poids global d'un terme: sa fréquence dans le cours pondérée par sa spécificité
+        self.term_weights = tf.sum(axis=0) * idf
+
+    def textrank(self, damping=0.85, iterations=30):
+        """Score de centralité de chaque phrase (PageRank sur la similarité cosinus)"""
+        n = len(self.sentences)
+        if n == 0:
+            return np.zeros(0)
+        norms = np.linalg.norm(self.tfidf, axis=1)
+        vectors = self.tfidf / np.where(norms > 0, norms, 1)[:, None]
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0)
+        out = similarity.sum(axis=1)
+        # Phrase isolée (aucun terme commun): ses votes sont répartis uniformément
+        transition = np.where(out[:, None] > 0, similarity / np.where(out > 0, out, 1)[:, None], 1.0 / n)
+        scores = np.full(n, 1.0 / n)
+        for _ in range(iterations):
+            scores = (1 - damping) / n + damping * (transition.T @ scores)
+        return scores
+
+    def display(self, key):
+        return self.surfaces.get(key, key)
+
+
+def _key_terms(analysis, limit=30):
+    """Termes les plus caractéristiques d'un cours (formes affichées), du plus au moins important"""
+    order = np.argsort(-analysis.term_weights)[:limit]
+    return [analysis.display(analysis.terms[i]) for i in order if not _is_number(analysis.terms[i])]
+
+
+def _numeric_distractors(value, numbers, rng):
+    """Nombres proches pour une réponse numérique: d'abord ceux du cours, puis des valeurs voisines"""
+    candidates = [n for n in numbers if n != value and len(n) == len(value)]
+    rng.shuffle(candidates)
+    chosen = candidates[:3]
+    number = int(value)
+    spread = max(5, number // 10) if len(value) != 4 else 30
+    while len(chosen) < 3:
+        candidate = str(number + rng.choice([-1, 1]) * rng.randint(1, spread))
+        if candidate not in chosen and candidate != value and int(candidate) > 0:
+            chosen.append(candidate)
+    return chosen
+
+
+def _word_distractors(analysis, answer, excluded, corpus_terms, rng):
+    """Trois autres termes du cours (ou du corpus) ressemblant à la réponse, ou None"""
+    answer_display = analysis.display(answer)
+    proper_noun = answer_display[:1].isupper()
+    max_weight = float(analysis.term_weights.max()) or 1.0
+
+    candidates = {}
+    for index, key in enumerate(analysis.terms):
+        if not _is_number(key) and key not in excluded:
+            candidates.setdefault(_stem(key), (analysis.display(key), analysis.term_weights[index] / max_weight))
+    for term in corpus_terms:
+        if term.lower() not in excluded:
+            candidates.setdefault(_stem(term.lower()), (term, 0.0))
+    candidates.pop(_stem(answer), None)
+
+    def similarity(candidate):
+        display, weight = candidate
+        score = weight
+        score += 0.5 if display[:1].isupper() == proper_noun else 0
+        score += 0.3 if display[-3:].lower() == answer_display[-3:].lower() else 0
+        return score - 0.05 * abs(len(display) - len(answer_display))
+
+    ranked = sorted(candidates.values(), key=similarity, reverse=True)[:DISTRACTOR_POOL]
+    if len(ranked) < 3:
+        return None
+    return [display for display, _ in rng.sample(ranked, 3)]
+
+
+def generate_extractive_quiz(text, num_questions=5, corpus_terms=(), rng=None):
+    """QCM à trous tirés des phrases centrales du cours, et termes clés du cours
+
+    Retourne (questions, termes): les termes clés peuvent servir de
+    corpus_terms pour les cours suivants, sans analyser le cours à nouveau.
+    corpus_terms: termes d'autres cours, utilisés comme mauvaises réponses
+    quand le cours seul n'en fournit pas assez. Peut retourner moins de
+    num_questions questions (cours très court), voire aucune.
+    """
+    rng = rng or random
+    analysis = _CourseAnalysis(text)
+    if not analysis.sentences or not analysis.terms:
+        return [], []
+
+    scores = analysis.textrank()
+    numbers = [key for key in analysis.terms if _is_number(key)]
+    used_answers = set()
+    picked = []
+    for row in np.argsort(-scores):
+        if len(picked) >= num_questions:
+            break
+        sentence = analysis.sentences[row]
+        if not MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS:
+            continue
+        if len(_TOKEN_RE.findall(sentence)) < MIN_SENTENCE_WORDS:
+            continue
+
+        # Réponse: le terme de la phrase le plus important dans le cours
+        terms = sorted(
+            (key for key in analysis.sentence_terms[row] if _stem(key) not in used_answers),
+            key=lambda key: -analysis.term_weights[analysis.vocabulary[key]]
+        )
+        for answer in terms:
+            if _is_number(answer):
+                distractors = _numeric_distractors(answer, numbers, rng)
+            else:
+                distractors = _word_distractors(
+                    analysis, answer, set(analysis.sentence_terms[row]), corpus_terms, rng
+                )
+            if distractors:
+                break
+        else:
+            continue
+
+        used_answers.add(_stem(answer))
+        pattern = re.compile(r'(?<!\w)' + re.escape(answer) + r'(?!\w)', re.IGNORECASE)
+        options = [analysis.display(answer)] + distractors
+        rng.shuffle(options)
+        picked.append((row, {
+            "question": f"Complétez: « {pattern.sub(BLANK, sentence)} »",
+            "options": options,
+            "correct": options.index(analysis.display(answer)),
+            "explanation": f"D'après le cours: « {sentence} »"
+        }))
+
+    # Questions dans l'ordre du cours
+    return [question for _, question in sorted(picked, key=lambda item: item[0])], _key_terms(analysis)
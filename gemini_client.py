@@ -0,0 +1,246 @@
+"""Client HTTP partagé pour l'API REST Google Gemini"""
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from key_pool import KeyPoolExhausted
+
+# REVIZIA_GEMINI_BASE_URL permet de viser un serveur de test (bench/mock_gemini.py)
+GEMINI_BASE_URL = os.environ.get(
+    "REVIZIA_GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"
+).rstrip('/')
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiAPIError(Exception):
+    """Réponse HTTP en erreur de l'API Gemini"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code} - {message}")
+        self.status_code = status_code
+
+
+def estimate_tokens(data):
+    """Estimation grossière des tokens d'une requête (≈ 4 caractères par token)"""
+    prompt_chars = sum(
+        len(part.get('text', ''))
+        for content in data.get('contents', [])
+        for part in content.get('parts', [])
+    )
+    max_output = data.get('generationConfig', {}).get('maxOutputTokens', 0)
+    return prompt_chars // 4 + max_output
+
+
+def used_tokens(response, estimated_tokens, stream=False):
+    """Tokens réellement consommés d'après usageMetadata, sinon l'estimation"""
+    if stream or response.status_code != 200:
+        return estimated_tokens
+    try:
+        return response.json()['usageMetadata']['totalTokenCount']
+    except (ValueError, KeyError, TypeError):
+        return estimated_tokens
+
+
+class GeminiClient:
+    """Session HTTP keep-alive avec pool de connexions et retry exponentiel"""
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._session = requests.Session()
+        self._session.headers.update({'Content-Type': 'application/json'})
+        # Les retries sont gérés ici pour pouvoir les compter
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=0,
+            pool_block=False
+        )
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._total_latency = 0.0
+        self._last_latency = 0.0
+        self._max_latency = 0.0
+
+    def _model_url(self, method):
+        return f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:{method}"
+
+    def _backoff_delay(self, attempt, response=None):
+        """Délai avant la tentative suivante (backoff exponentiel avec jitter)"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return random.uniform(0, delay)
+
+    def request(self, method, url, timeout=30, retry_statuses=RETRY_STATUS_CODES, **kwargs):
+        """Envoie une requête en réessayant sur 429/5xx et erreurs réseau"""
+        start = time.perf_counter()
+        response = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                with self._lock:
+                    self._requests += 1
+                try:
+                    response = self._session.request(method, url, timeout=timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.max_retries:
+                        with self._lock:
+                            self._errors += 1
+                        raise
+                    response = None
+                else:
+                    if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                        if response.status_code >= 400:
+                            with self._lock:
+                                self._errors += 1
+                        return response
+
+                with self._lock:
+                    self._retries += 1
+                delay = self._backoff_delay(attempt, response)
+                if response is not None:
+                    # Réponse abandonnée: sa connexion retourne au pool (indispensable avec stream=True)
+                    response.close()
+                time.sleep(delay)
+            return response
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self._calls += 1
+                self._total_latency += latency
+                self._last_latency = latency
+                self._max_latency = max(self._max_latency, latency)
+
+    def _post_model(self, method, api_key, data, timeout, key_pool=None, params=None, stream=False):
+        """POST sur une méthode du modèle, avec la clé donnée ou une clé du pool
+
+        Avec un pool (et sans clé explicite), un 429 met la clé en pause et
+        la requête repart immédiatement sur une autre clé.
+        """
+        url = self._model_url(method)
+        params = dict(params or {})
+        if api_key or key_pool is None:
+            params['key'] = api_key
+            return self.request("POST", url, timeout=timeout, params=params, json=data, stream=stream)
+
+        estimated_tokens = estimate_tokens(data)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                reservation = key_pool.acquire(estimated_tokens, timeout=timeout)
+            except KeyPoolExhausted as e:
+                raise GeminiAPIError(429, str(e))
+            params['key'] = reservation.key
+            try:
+                response = self.request(
+                    "POST", url, timeout=timeout, params=params, json=data, stream=stream,
+                    retry_statuses=RETRY_STATUS_CODES - {429}
+                )
+            except Exception:
+                # Requête non aboutie (erreur réseau): la réservation est rendue
+                key_pool.release(reservation, 0, succeeded=False)
+                raise
+            if response.status_code != 429:
+                key_pool.release(reservation, used_tokens(response, estimated_tokens, stream))
+                return response
+            key_pool.release(reservation, 0, succeeded=False)
+            key_pool.report_rate_limited(reservation.key)
+            if attempt < self.max_retries:
+                response.close()
+            with self._lock:
+                self._retries += 1
+        return response
+
+    def generate_content(self, api_key, data, timeout=30, key_pool=None):
+        """Appelle la méthode generateContent du modèle"""
+        return self._post_model("generateContent", api_key, data, timeout, key_pool)
+
+    def get_model(self, api_key, timeout=10):
+        """Métadonnées du modèle: requête légère, sans consommation de tokens"""
+        url = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}"
+        return self.request("GET", url, timeout=timeout, params={'key': api_key})
+
+    def stream_generate_content(self, api_key, data, timeout=30, key_pool=None):
+        """Appelle streamGenerateContent (SSE) et produit le texte au fil de l'eau"""
+        response = self._post_model(
+            "streamGenerateContent", api_key, data, timeout, key_pool,
+            params={'alt': 'sse'}, stream=True
+        )
+        with response:
+            if response.status_code != 200:
+                raise GeminiAPIError(response.status_code, response.text)
+
+            # text/event-stream sans charset: requests supposerait du latin-1
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = json.loads(line[5:])
+                candidates = payload.get('candidates') or []
+                if not candidates:
+                    continue
+                for part in candidates[0].get('content', {}).get('parts', []):
+                    if 'text' in part:
+                        yield part['text']
+
+    def _new_connections(self):
+        """Nombre de connexions TCP/TLS ouvertes depuis la création du client"""
+        pools = self._adapter.poolmanager.pools
+        total = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+        return total
+
+    def metrics(self):
+        """Latence, retries et réutilisation des connexions"""
+        new_connections = self._new_connections()
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'requests': self._requests,
+                'retries': self._retries,
+                'errors': self._errors,
+                'new_connections': new_connections,
+                'reused_connections': max(self._requests - new_connections, 0),
+                'last_latency_s': self._last_latency,
+                'avg_latency_s': (self._total_latency / self._calls) if self._calls else 0.0,
+                'max_latency_s': self._max_latency,
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Retourne le client Gemini unique du processus"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient(
+                    pool_size=int(os.environ.get("REVIZIA_GEMINI_POOL_SIZE", "10")),
+                    max_retries=int(os.environ.get("REVIZIA_GEMINI_MAX_RETRIES", "3"))
+                )
+    return _client
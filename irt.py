@@ -0,0 +1,292 @@
+"""Théorie de réponse à l'item (modèle 2PL): calibration des questions et niveau des élèves
+
+P(bonne réponse) = σ(a·(θ − b)), avec θ le niveau de l'élève, b la difficulté
+et a la discrimination de la question. Chaque paramètre est suivi par une
+moyenne et une précision (approximation gaussienne de sa loi a posteriori):
+un nouveau lot de réponses déplace les paramètres qu'il concerne par
+quelques pas de Newton vectorisés, la précision accumulée servant de loi
+a priori. Les réponses déjà traitées ne sont jamais relues.
+"""
+import threading
+import time
+
+import numpy as np
+
+# Niveau a priori d'un élève selon son « Niveau de difficulté par défaut »
+DIFFICULTY_PRIORS = {'Facile': -1.0, 'Moyen': 0.0, 'Difficile': 1.0}
+# Lois a priori: (moyenne, précision = 1 / variance)
+ABILITY_PRIOR_PRECISION = 1.0
+DIFFICULTY_PRIOR = (0.0, 0.5)
+DISCRIMINATION_PRIOR = (1.0, 4.0)
+DISCRIMINATION_RANGE = (0.25, 4.0)
+# Précision maximale du niveau d'un élève: l'estimation continue de suivre ses progrès
+MAX_ABILITY_PRECISION = 25.0
+# Pas de Newton par lot de réponses
+NEWTON_STEPS = 3
+
+
+def difficulty_for_ability(theta):
+    """Niveau de difficulté (Facile, Moyen, Difficile) le plus proche d'un niveau θ"""
+    return min(DIFFICULTY_PRIORS, key=lambda name: abs(DIFFICULTY_PRIORS[name] - theta))
+
+
+def _probability(a, theta, b):
+    return 1.0 / (1.0 + np.exp(-a * (theta - b)))
+
+
+class _Columns:
+    """Paramètres indexés par clé (question ou élève), en colonnes numpy extensibles"""
+
+    def __init__(self, names, capacity=256):
+        self.index = {}
+        self.keys = []
+        self.names = names
+        for name in names:
+            setattr(self, name, np.empty(capacity))
+        self.answers = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, values):
+        row = len(self.keys)
+        if row == len(self.answers):
+            for name in self.names:
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.empty_like(column)]))
+            self.answers = np.concatenate([self.answers, np.zeros_like(self.answers)])
+        for name, value in zip(self.names, values):
+            getattr(self, name)[row] = value
+        self.answers[row] = 0
+        self.index[key] = row
+        self.keys.append(key)
+        return row
+
+
+class IRTModel:
+    """Paramètres 2PL de toutes les questions et de tous les élèves, en mémoire"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = _Columns(('difficulty', 'difficulty_precision', 'discrimination', 'discrimination_precision'))
+        # prior_mean: niveau a priori avec lequel le niveau de l'élève a été estimé
+        self._students = _Columns(('ability', 'precision', 'prior_mean'))
+
+    def load(self, items, abilities):
+        """Reprend des paramètres enregistrés
+
+        items: (empreinte, difficulté, précision, discrimination, précision, réponses);
+        abilities: (élève, niveau, précision, niveau a priori ou None si inconnu, réponses).
+        """
+        with self._lock:
+            for fingerprint, *values, answers in items:
+                self._items.answers[self._items.add(fingerprint, values)] = answers
+            for user_id, ability, precision, prior_mean, answers in abilities:
+                values = (ability, precision, np.nan if prior_mean is None else prior_mean)
+                self._students.answers[self._students.add(user_id, values)] = answers
+
+    def _item_row(self, fingerprint):
+        row = self._items.index.get(fingerprint)
+        if row is None:
+            row = self._items.add(fingerprint, DIFFICULTY_PRIOR + DISCRIMINATION_PRIOR)
+        return row
+
+    def _prior_shift(self, row, prior_mean):
+        """Déplacement du niveau d'un élève si sa loi a priori était centrée sur prior_mean
+
+        Avec l'approximation gaussienne, la moyenne a posteriori pondère la
+        moyenne a priori par sa part de la précision totale: l'effet d'un
+        changement de niveau par défaut s'efface à mesure que les réponses
+        s'accumulent.
+        """
+        previous = self._students.prior_mean[row]
+        if np.isnan(previous):
+            return 0.0
+        return (prior_mean - previous) * ABILITY_PRIOR_PRECISION / self._students.precision[row]
+
+    def _student_row(self, user_id, prior_mean):
+        row = self._students.index.get(user_id)
+        if row is None:
+            return self._students.add(user_id, (prior_mean, ABILITY_PRIOR_PRECISION, prior_mean))
+        # Niveau par défaut modifié depuis le lot précédent: le niveau est recentré
+        self._students.ability[row] += self._prior_shift(row, prior_mean)
+        self._students.prior_mean[row] = prior_mean
+        return row
+
+    def update(self, user_ids, fingerprints, correct, prior_means):
+        """Intègre un lot de réponses; retourne les lignes modifiées à enregistrer
+
+        prior_means: niveau a priori de l'élève de chaque réponse (point de
+        départ d'un élève encore inconnu, recentrage s'il a changé).
+        """
+        with self._lock:
+            students = np.fromiter(
+                (self._student_row(u, m) for u, m in zip(user_ids, prior_means)), dtype=np.int64
+            )
+            items = np.fromiter((self._item_row(f) for f in fingerprints), dtype=np.int64)
+            y = np.asarray(correct, dtype=float)
+            S, s = np.unique(students, return_inverse=True)
+            I, i = np.unique(items, return_inverse=True)
+
+            # Lois a priori du lot: l'état courant des paramètres concernés
+            theta0 = self._students.ability[S]
+            theta_prec = self._students.precision[S]
+            b0 = self._items.difficulty[I]
+            b_prec = self._items.difficulty_precision[I]
+            a0 = self._items.discrimination[I]
+            a_prec = self._items.discrimination_precision[I]
+            theta, b, a = theta0.copy(), b0.copy(), a0.copy()
+
+            def gradient(group, size, slope):
+                p = _probability(a[i], theta[s], b[i])
+                residual = y - p
+                weight = p * (1 - p)
+                return (np.bincount(group, slope * residual, minlength=size),
+                        np.bincount(group, slope ** 2 * weight, minlength=size))
+
+            # Pas de Newton par blocs: niveaux, puis difficultés, puis discriminations
+            for _ in range(NEWTON_STEPS):
+                g, h = gradient(s, len(S), a[i])
+                theta += (g - theta_prec * (theta - theta0)) / (theta_prec + h)
+                g, h = gradient(i, len(I), -a[i])
+                b += (g - b_prec * (b - b0)) / (b_prec + h)
+                g, h = gradient(i, len(I), theta[s] - b[i])
+                a = np.clip(a + (g - a_prec * (a - a0)) / (a_prec + h), *DISCRIMINATION_RANGE)
+
+            # Nouvelles précisions: information de Fisher apportée par le lot
+            _, h_theta = gradient(s, len(S), a[i])
+            _, h_b = gradient(i, len(I), -a[i])
+            _, h_a = gradient(i, len(I), theta[s] - b[i])
+            self._students.ability[S] = theta
+            self._students.precision[S] = np.minimum(theta_prec + h_theta, MAX_ABILITY_PRECISION)
+            self._students.answers[S] += np.bincount(s, minlength=len(S))
+            self._items.difficulty[I] = b
+            self._items.difficulty_precision[I] = b_prec + h_b
+            self._items.discrimination[I] = a
+            self._items.discrimination_precision[I] = a_prec + h_a
+            self._items.answers[I] += np.bincount(i, minlength=len(I))
+
+            items = self._items
+            students = self._students
+            return (
+                [(items.keys[r], items.difficulty[r], items.difficulty_precision[r],
+                  items.discrimination[r], items.discrimination_precision[r], int(items.answers[r]))
+                 for r in I],
+                [(students.keys[r], students.ability[r], students.precision[r],
+                  None if np.isnan(students.prior_mean[r]) else float(students.prior_mean[r]),
+                  int(students.answers[r]))
+                 for r in S]
+            )
+
+    def ability(self, user_id, prior_mean=0.0):
+        """(niveau θ, écart type, nombre de réponses) d'un élève; la loi a priori s'il est inconnu
+
+        Le niveau tient compte de prior_mean même s'il a changé depuis le
+        dernier lot de réponses.
+        """
+        with self._lock:
+            row = self._students.index.get(user_id)
+            if row is None:
+                return prior_mean, ABILITY_PRIOR_PRECISION ** -0.5, 0
+            return (float(self._students.ability[row] + self._prior_shift(row, prior_mean)),
+                    float(self._students.precision[row]) ** -0.5, int(self._students.answers[row]))
+
+    def information(self, fingerprints, theta):
+        """Information de Fisher de chaque question au niveau θ (a²·p·(1−p))
+
+        Une question jamais répondue a les paramètres a priori.
+        """
+        with self._lock:
+            rows = np.array([self._items.index.get(f, -1) for f in fingerprints], dtype=np.int64)
+            known = rows >= 0
+            b = np.full(len(rows), DIFFICULTY_PRIOR[0])
+            a = np.full(len(rows), DISCRIMINATION_PRIOR[0])
+            b[known] = self._items.difficulty[rows[known]]
+            a[known] = self._items.discrimination[rows[known]]
+        p = _probability(a, theta, b)
+        return a ** 2 * p * (1 - p)
+
+    def stats(self):
+        with self._lock:
+            return {'questions': len(self._items), 'students': len(self._students)}
+
+
+class IRTCalibrator:
+    """Calibration incrémentale en arrière-plan, à partir du journal des réponses
+
+    Un thread lit les réponses enregistrées depuis le dernier lot traité,
+    par lots de batch_size, toutes les interval secondes ou dès qu'un quiz
+    est terminé (notify). Les paramètres modifiés et la position dans le
+    journal sont enregistrés ensemble: un redémarrage reprend où il s'était
+    arrêté.
+    """
+
+    def __init__(self, storage, batch_size=5000, interval=60.0):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.interval = interval
+        self._reload()
+        self._wakeup = threading.Event()
+        self._calibrating = threading.Lock()
+        self._thread = None
+        self.processed = 0
+        self.failed = 0
+        self.last_batch_s = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="irt-calibration", daemon=True)
+            self._thread.start()
+
+    def _reload(self):
+        """Reprend le modèle et la position dans le journal tels qu'enregistrés"""
+        model = IRTModel()
+        items, abilities, last_answer_id = self.storage.load_irt()
+        model.load(items, abilities)
+        self.model = model
+        self.last_answer_id = last_answer_id
+        self._stale = False
+
+    def notify(self):
+        """De nouvelles réponses sont disponibles"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.calibrate()
+            except Exception:
+                self.failed += 1
+
+    def calibrate(self):
+        """Traite toutes les réponses en attente; retourne leur nombre"""
+        with self._calibrating:
+            if self._stale:
+                self._reload()
+            total = 0
+            while True:
+                answers = self.storage.list_answers_since(self.last_answer_id, self.batch_size)
+                if not answers:
+                    return total
+                start = time.perf_counter()
+                ids, user_ids, fingerprints, correct, difficulties = zip(*answers)
+                priors = [DIFFICULTY_PRIORS.get(d, 0.0) for d in difficulties]
+                items, abilities = self.model.update(user_ids, fingerprints, correct, priors)
+                try:
+                    self.storage.save_irt(items, abilities, ids[-1])
+                except Exception:
+                    # Lot appliqué en mémoire mais pas enregistré: sans relecture du modèle
+                    # enregistré, la prochaine tentative l'intégrerait une seconde fois
+                    self._stale = True
+                    self._reload()
+                    raise
+                self.last_answer_id = ids[-1]
+                self.last_batch_s = time.perf_counter() - start
+                self.processed += len(answers)
+                total += len(answers)
+
+    def metrics(self):
+        return dict(self.model.stats(), processed=self.processed, failed=self.failed,
+                    last_batch_s=self.last_batch_s)
@@ -0,0 +1,165 @@
+"""Pool de clés API Gemini côté serveur, avec répartition selon les quotas"""
+import hashlib
+import threading
+import time
+from collections import deque
+
+# Fenêtre glissante des quotas Gemini (requêtes et tokens par minute)
+WINDOW_SECONDS = 60.0
+
+
+class KeyPoolExhausted(Exception):
+    """Aucune clé du pool n'a de quota disponible"""
+
+
+class Reservation:
+    """Requête réservée sur une clé par acquire(), à corriger avec release()"""
+    __slots__ = ('key', 'timestamp', 'tokens', 'in_window')
+
+    def __init__(self, key, timestamp, tokens):
+        self.key = key
+        self.timestamp = timestamp
+        self.tokens = tokens
+        self.in_window = True
+
+
+class _KeyState:
+    def __init__(self, key):
+        self.key = key
+        self.label = "…" + key[-4:] if len(key) > 4 else "…"
+        # Réservations des requêtes de la fenêtre courante, de la plus ancienne à la plus récente
+        self.window = deque()
+        self.window_tokens = 0
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.requests = 0
+        self.throttles = 0
+
+    def prune(self, now):
+        while self.window and now - self.window[0].timestamp >= WINDOW_SECONDS:
+            reservation = self.window.popleft()
+            reservation.in_window = False
+            self.window_tokens -= reservation.tokens
+
+
+class KeyPool:
+    """Répartit les requêtes entre plusieurs clés selon leur quota restant
+
+    Chaque clé suit ses requêtes et tokens sur une fenêtre glissante d'une
+    minute; la clé choisie est celle qui a le plus de marge. Une clé qui
+    reçoit un 429 est mise en pause avec un délai exponentiel.
+    """
+
+    def __init__(self, keys, rpm_limit=15, tpm_limit=1000000, cooldown_base=5.0, cooldown_max=120.0):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.cooldown_base = cooldown_base
+        self.cooldown_max = cooldown_max
+        self._states = {key: _KeyState(key) for key in dict.fromkeys(k.strip() for k in keys) if key}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _headroom(self, state, estimated_tokens, now):
+        """Marge restante (0 à 1) d'une clé, ou None si elle ne peut pas servir"""
+        if state.cooldown_until > now:
+            return None
+        state.prune(now)
+        if len(state.window) >= self.rpm_limit:
+            return None
+        if state.window_tokens + estimated_tokens > self.tpm_limit:
+            return None
+        return min(
+            1 - len(state.window) / self.rpm_limit,
+            1 - state.window_tokens / self.tpm_limit
+        )
+
+    def _next_available(self, state, now):
+        """Instant à partir duquel la clé peut retrouver du quota"""
+        if state.cooldown_until > now:
+            return state.cooldown_until
+        if state.window:
+            return state.window[0].timestamp + WINDOW_SECONDS
+        return now
+
+    def acquire(self, estimated_tokens=0, timeout=30.0):
+        """Réserve une requête sur la clé la moins chargée et retourne la réservation
+
+        Attend au plus timeout secondes qu'une clé se libère, puis lève
+        KeyPoolExhausted.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                best = None
+                best_headroom = -1.0
+                for state in self._states.values():
+                    headroom = self._headroom(state, estimated_tokens, now)
+                    if headroom is not None and headroom > best_headroom:
+                        best, best_headroom = state, headroom
+                if best is not None:
+                    reservation = Reservation(best.key, now, estimated_tokens)
+                    best.window.append(reservation)
+                    best.window_tokens += estimated_tokens
+                    best.requests += 1
+                    return reservation
+                wake_at = min(
+                    (self._next_available(state, now) for state in self._states.values()),
+                    default=deadline
+                )
+            if now >= deadline or not self._states:
+                raise KeyPoolExhausted("Quota épuisé sur toutes les clés du pool")
+            time.sleep(max(0.05, min(wake_at, deadline) - now))
+
+    def release(self, reservation, tokens, succeeded=True):
+        """Corrige une réservation avec le nombre réel de tokens consommés
+
+        succeeded=False pour une requête sans réponse exploitable (429,
+        erreur réseau): le délai de pause de la clé n'est pas remis à zéro.
+        """
+        with self._lock:
+            state = self._states.get(reservation.key)
+            if state is None:
+                return
+            if succeeded:
+                state.consecutive_throttles = 0
+            # Réservation sortie de la fenêtre: ses tokens ne comptent déjà plus
+            if reservation.in_window:
+                state.window_tokens += tokens - reservation.tokens
+            reservation.tokens = tokens
+
+    def report_rate_limited(self, key):
+        """Met la clé en pause après un 429 (délai exponentiel)"""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            state.throttles += 1
+            state.consecutive_throttles += 1
+            delay = min(
+                self.cooldown_base * (2 ** (state.consecutive_throttles - 1)),
+                self.cooldown_max
+            )
+            state.cooldown_until = time.monotonic() + delay
+
+    def metrics(self):
+        """Utilisation de chaque clé (la clé elle-même n'est jamais exposée)"""
+        now = time.monotonic()
+        with self._lock:
+            keys = []
+            for state in self._states.values():
+                state.prune(now)
+                keys.append({
+                    'key': state.label,
+                    'key_hash': hashlib.sha256(state.key.encode()).hexdigest()[:8],
+                    'rpm_used': len(state.window),
+                    'tpm_used': state.window_tokens,
+                    'rpm_utilization': len(state.window) / self.rpm_limit,
+                    'tpm_utilization': state.window_tokens / self.tpm_limit,
+                    'cooldown_s': max(0.0, state.cooldown_until - now),
+                    'requests': state.requests,
+                    'throttles': state.throttles,
+                })
+            return keys
@@ -0,0 +1,67 @@
+"""Validation des clés API avec cache et regroupement des vérifications concurrentes"""
+import hashlib
+import threading
+import time
+
+from singleflight import SingleFlight
+
+# Résultats d'une vérification: l'état inconnu (erreur réseau, quota, panne) n'est pas mis en cache
+KEY_VALID = 'valid'
+KEY_INVALID = 'invalid'
+KEY_UNKNOWN = 'unknown'
+
+
+class KeyValidator:
+    """Vérifie les clés API une seule fois par période de validité
+
+    Le résultat est mis en cache sous l'empreinte SHA-256 de la clé (la clé
+    elle-même n'est pas conservée). Les vérifications simultanées d'une même
+    clé, depuis plusieurs sessions, partagent une seule requête.
+    """
+
+    def __init__(self, check, ttl_valid=3600.0, ttl_invalid=300.0):
+        self._check = check
+        self.ttl_valid = ttl_valid
+        self.ttl_invalid = ttl_invalid
+        self._results = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def status(self, api_key):
+        """KEY_VALID, KEY_INVALID, ou KEY_UNKNOWN si la vérification a échoué"""
+        key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key_hash)
+            if cached is not None and cached[1] > now:
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        return self._flight.do(key_hash, self._validate, key_hash, api_key)
+
+    def _validate(self, key_hash, api_key):
+        try:
+            valid = self._check(api_key)
+        except Exception:
+            # Erreur réseau ou quota: résultat inconnu, rien n'est mis en cache
+            return KEY_UNKNOWN
+        status = KEY_VALID if valid else KEY_INVALID
+        ttl = self.ttl_valid if valid else self.ttl_invalid
+        now = time.monotonic()
+        with self._lock:
+            # Les résultats expirés sont retirés à chaque vérification réelle (un appel réseau,
+            # bien plus coûteux que ce parcours): le cache ne garde que les clés récentes
+            for expired in [h for h, (_, expires) in self._results.items() if expires <= now]:
+                del self._results[expired]
+            self._results[key_hash] = (status, now + ttl)
+        return status
+
+    def metrics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'checks': self._flight.executions,
+            'coalesced': self._flight.coalesced,
+        }
@@ -0,0 +1,192 @@
+"""Base de connaissance commune: synchronisation incrémentale d'un répertoire et recherche plein texte (FTS5)"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Extensions des documents indexés (texte brut ou Markdown)
+DOCUMENT_EXTENSIONS = ('.txt', '.md')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kb_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS kb_chapters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_kb_chapters_path ON kb_chapters (path);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS kb_fts USING fts5(
+    title, content,
+    content='kb_chapters', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_HEADING = re.compile(r'^(#{1,3})\s+(.+?)\s*#*\s*$', re.MULTILINE)
+
+
+def split_chapters(text, default_title):
+    """Découpe un document en chapitres selon ses titres Markdown (#, ##, ###)"""
+    headings = list(_HEADING.finditer(text))
+    if not headings:
+        return [(default_title, text.strip())] if text.strip() else []
+    chapters = []
+    preamble = text[:headings[0].start()].strip()
+    if preamble:
+        chapters.append((default_title, preamble))
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        content = text[heading.end():end].strip()
+        if content:
+            chapters.append((heading.group(2), content))
+    return chapters
+
+
+def _fts_query(query):
+    """Requête FTS5 sûre: chaque mot entre guillemets, le dernier en préfixe"""
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+
+class KnowledgeBase:
+    """Index des documents d'un répertoire partagé
+
+    La synchronisation ne relit que les fichiers dont la date de
+    modification ou la taille a changé, et ne réindexe que ceux dont le
+    contenu (empreinte SHA-256) a réellement changé.
+    """
+
+    def __init__(self, root, index_path, min_sync_interval=60.0):
+        self.root = root
+        self.min_sync_interval = min_sync_interval
+        self._last_sync = None
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _documents(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                    path = os.path.join(directory, name)
+                    yield os.path.relpath(path, self.root), path
+
+    def _remove_chapters(self, path):
+        rows = self._conn.execute(
+            "SELECT id, title, content FROM kb_chapters WHERE path = ?", (path,)
+        ).fetchall()
+        self._conn.executemany(
+            "INSERT INTO kb_fts (kb_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)",
+            [(row['id'], row['title'], row['content']) for row in rows]
+        )
+        self._conn.execute("DELETE FROM kb_chapters WHERE path = ?", (path,))
+
+    def _index_chapters(self, path, text):
+        default_title = os.path.splitext(os.path.basename(path))[0].replace('_', ' ')
+        for position, (title, content) in enumerate(split_chapters(text, default_title)):
+            cursor = self._conn.execute(
+                "INSERT INTO kb_chapters (path, position, title, content) VALUES (?, ?, ?, ?)",
+                (path, position, title, content)
+            )
+            self._conn.execute(
+                "INSERT INTO kb_fts (rowid, title, content) VALUES (?, ?, ?)",
+                (cursor.lastrowid, title, content)
+            )
+
+    def sync(self):
+        """Met l'index à jour avec le répertoire; retourne le nombre de fichiers par type de changement"""
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        # Une seule transaction: une erreur en cours de route annule toutes les écritures de la passe
+        with self._lock, self._conn:
+            known = {
+                row['path']: row for row in self._conn.execute("SELECT path, mtime, size, hash FROM kb_files")
+            }
+            present = set()
+            for relative_path, path in self._documents():
+                try:
+                    stat = os.stat(path)
+                    previous = known.get(relative_path)
+                    if previous is not None and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+                        present.add(relative_path)
+                        counts['unchanged'] += 1
+                        continue
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    # Supprimé depuis le parcours du répertoire: traité comme absent
+                    continue
+                present.add(relative_path)
+                content_hash = hashlib.sha256(data).hexdigest()
+                if previous is not None and previous['hash'] == content_hash:
+                    # Fichier touché mais contenu identique: pas de réindexation
+                    counts['unchanged'] += 1
+                else:
+                    if previous is not None:
+                        self._remove_chapters(relative_path)
+                    self._index_chapters(relative_path, data.decode('utf-8', errors='replace'))
+                    counts['updated' if previous is not None else 'added'] += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kb_files (path, mtime, size, hash) VALUES (?, ?, ?, ?)",
+                    (relative_path, stat.st_mtime, stat.st_size, content_hash)
+                )
+            for relative_path in set(known) - present:
+                self._remove_chapters(relative_path)
+                self._conn.execute("DELETE FROM kb_files WHERE path = ?", (relative_path,))
+                counts['removed'] += 1
+            self._last_sync = time.monotonic()
+        return counts
+
+    def sync_if_stale(self):
+        """Synchronise au plus une fois par min_sync_interval secondes"""
+        if self._last_sync is not None and time.monotonic() - self._last_sync < self.min_sync_interval:
+            return None
+        return self.sync()
+
+    def search(self, query, limit=20):
+        """Chapitres correspondant à la recherche, les plus pertinents d'abord (BM25)"""
+        match = _fts_query(query)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, c.path, c.title, "
+                "snippet(kb_fts, 1, '**', '**', '…', 16) AS snippet "
+                "FROM kb_fts JOIN kb_chapters c ON c.id = kb_fts.rowid "
+                "WHERE kb_fts MATCH ? ORDER BY bm25(kb_fts, 5.0, 1.0) LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_chapter(self, chapter_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, path, title, content FROM kb_chapters WHERE id = ?", (chapter_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self):
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM kb_files").fetchone()[0]
+            chapters = self._conn.execute("SELECT COUNT(*) FROM kb_chapters").fetchone()[0]
+        return {'documents': documents, 'chapters': chapters}
@@ -0,0 +1,229 @@
+"""Classement des élèves maintenu de façon incrémentale (skip-list indexable)"""
+import random
+import threading
+
+# Portées de classement disponibles, en plus du classement national
+SCOPE_FIELDS = ('level', 'school', 'region')
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, height):
+        self.key = key
+        self.next = [None] * height
+        # width[i]: nombre de positions franchies en suivant next[i]
+        self.width = [1] * height
+
+
+class RankedSkipList:
+    """Skip-list ordonnée avec largeurs de liens (statistiques d'ordre)
+
+    Insertion, suppression et calcul du rang d'une clé en O(log n);
+    lecture des n premiers en O(log n + n).
+    """
+
+    MAX_LEVEL = 24
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """Construit la liste en O(n) à partir de clés déjà triées"""
+        skiplist = cls()
+        last = [skiplist._head] * cls.MAX_LEVEL
+        last_position = [0] * cls.MAX_LEVEL
+        position = 0
+        for position, key in enumerate(keys, start=1):
+            node = _Node(key, skiplist._random_height())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(cls.MAX_LEVEL):
+            last[level].width[level] = position + 1 - last_position[level]
+        skiplist.size = position
+        return skiplist
+
+    def _random_height(self):
+        height = 1
+        while height < self.MAX_LEVEL and random.random() < 0.5:
+            height += 1
+        return height
+
+    def insert(self, key):
+        chain = [None] * self.MAX_LEVEL
+        steps_at_level = [0] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = self._random_height()
+        new_node = _Node(key, height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """Position (0 = premier) d'une clé présente dans la liste"""
+        position = 0
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return position
+
+    def head(self, count):
+        """Les count premières clés, dans l'ordre"""
+        keys = []
+        node = self._head.next[0]
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """Classements national, par classe, par établissement et par région
+
+    Chaque élève est présent dans une skip-list par portée; une mise à jour
+    de points déplace uniquement ses entrées, sans retrier tout le monde.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._indexes = {}
+
+    @staticmethod
+    def _sort_key(entry):
+        # Points décroissants, puis identifiant pour départager les ex aequo
+        return (-entry['points'], entry['user_id'])
+
+    @staticmethod
+    def _scopes(entry):
+        scopes = [('all', '')]
+        for field in SCOPE_FIELDS:
+            if entry.get(field):
+                scopes.append((field, entry[field]))
+        return scopes
+
+    def _remove_locked(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        key = self._sort_key(entry)
+        for scope in self._scopes(entry):
+            index = self._indexes[scope]
+            index.remove(key)
+            if not len(index):
+                del self._indexes[scope]
+
+    def update(self, user_id, name, points, level='', school='', region=''):
+        """Ajoute ou met à jour un élève dans tous ses classements"""
+        entry = {
+            'user_id': user_id,
+            'name': name,
+            'points': points,
+            'level': level,
+            'school': school,
+            'region': region,
+        }
+        key = self._sort_key(entry)
+        with self._lock:
+            self._remove_locked(user_id)
+            self._entries[user_id] = entry
+            for scope in self._scopes(entry):
+                self._indexes.setdefault(scope, RankedSkipList()).insert(key)
+
+    def load(self, entries):
+        """Remplace tout le classement (chargement initial depuis la base)"""
+        by_scope = {}
+        with self._lock:
+            self._entries = {}
+            for entry in entries:
+                entry = {
+                    'user_id': entry['user_id'],
+                    'name': entry['name'],
+                    'points': entry['points'],
+                    'level': entry.get('level', ''),
+                    'school': entry.get('school', ''),
+                    'region': entry.get('region', ''),
+                }
+                self._entries[entry['user_id']] = entry
+                key = self._sort_key(entry)
+                for scope in self._scopes(entry):
+                    by_scope.setdefault(scope, []).append(key)
+            self._indexes = {
+                scope: RankedSkipList.from_sorted(sorted(keys))
+                for scope, keys in by_scope.items()
+            }
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def top(self, count=10, scope=('all', '')):
+        """Les count meilleurs élèves de la portée, avec leur rang"""
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                return []
+            return [
+                dict(self._entries[user_id], rank=position + 1)
+                for position, (_, user_id) in enumerate(index.head(count))
+            ]
+
+    def rank(self, user_id, scope=('all', '')):
+        """Rang (1 = premier) d'un élève dans la portée, ou None s'il n'y figure pas"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            index = self._indexes.get(scope)
+            if entry is None or index is None or scope not in self._scopes(entry):
+                return None
+            return index.index(self._sort_key(entry)) + 1
+
+    def size(self, scope=('all', '')):
+        with self._lock:
+            index = self._indexes.get(scope)
+            return len(index) if index is not None else 0
@@ -0,0 +1,160 @@
+"""Reconnaissance de texte (OCR) locale avec Tesseract, dans un pool de processus"""
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, ImageOps
+
+try:
+    import pytesseract
+except ImportError:  # moteur OCR optionnel
+    pytesseract = None
+
+# Plus grand côté des images envoyées à Tesseract (suffisant pour une page de cahier)
+MAX_SIDE = 2000
+# Langues Tesseract: français, puis anglais pour les termes techniques
+DEFAULT_LANG = "fra+eng"
+
+
+def ocr_available():
+    """Indique si pytesseract et le binaire tesseract sont installés"""
+    if pytesseract is None:
+        return False
+    return shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+
+def image_hash(data, lang=DEFAULT_LANG):
+    return hashlib.sha256(lang.encode('utf-8') + b'\0' + data).hexdigest()
+
+
+def _otsu_threshold(histogram):
+    """Seuil de binarisation qui sépare au mieux l'encre du papier (méthode d'Otsu)"""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = weighted_background = 0
+    best_threshold, best_variance = 128, 0.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def prepare_image(data, max_side=MAX_SIDE):
+    """Décode, réduit et binarise une image pour l'OCR
+
+    Pour les JPEG (photos de téléphone), draft() fait décoder directement à
+    une échelle réduite: l'image pleine résolution n'est jamais en mémoire.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft('L', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('L')
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = ImageOps.autocontrast(image, cutoff=1)
+    threshold = _otsu_threshold(image.histogram())
+    return image.point(lambda value: 255 if value > threshold else 0, mode='1')
+
+
+def recognize(data, lang=DEFAULT_LANG):
+    """Texte d'une image (exécuté dans un processus du pool)"""
+    text = pytesseract.image_to_string(prepare_image(data), lang=lang)
+    return '\n'.join(line.rstrip() for line in text.splitlines()).strip()
+
+
+class OCRService:
+    """Pool de processus OCR avec cache des textes par empreinte d'image"""
+
+    def __init__(self, cache_path, workers=None, lang=DEFAULT_LANG):
+        self.lang = lang
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache (hash TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: le serveur Streamlit est multithreadé, fork n'y est pas sûr
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _cached(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_cache WHERE hash = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def _store(self, key, text):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (hash, text, created_at) VALUES (?, ?, ?)",
+                (key, text, time.time())
+            )
+            self._conn.commit()
+
+    def recognize_many(self, images):
+        """Reconnaît plusieurs pages en parallèle et produit (index, texte) au fil de l'eau
+
+        Les pages déjà reconnues sont servies depuis le cache sans passer par
+        le pool; une page en échec produit (index, None).
+        """
+        pending = {}
+        for index, data in enumerate(images):
+            key = image_hash(data, self.lang)
+            text = self._cached(key)
+            if text is not None:
+                yield index, text
+            else:
+                pending[self._pool().submit(recognize, data, self.lang)] = (index, key)
+        for future in as_completed(pending):
+            index, key = pending[future]
+            try:
+                text = future.result()
+            except Exception:
+                # Image illisible: la page est ignorée, les autres continuent
+                yield index, None
+                continue
+            self._store(key, text)
+            yield index, text
+
+
+def thumbnail(data, size=300):
+    """Miniature d'une image pour l'aperçu (décodée à échelle réduite)"""
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', (size, size))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size))
+    return image.convert('RGB')
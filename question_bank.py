@@ -0,0 +1,244 @@
+"""Banque de questions pré-générées par cours et par niveau, alimentée en arrière-plan"""
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from chunking import normalize_question
+from question_index import QuestionIndex, question_text
+
+
+# Index de quasi-doublons gardés en mémoire (cours et niveaux alimentés le plus récemment)
+MAX_INDEXES = 256
+
+
+def content_hash(text):
+    """Empreinte du contenu d'un cours (identique pour un même cours importé par plusieurs élèves)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class QuestionBank:
+    """Questions validées stockées par (contenu, niveau), servies sans appel au modèle
+
+    Chaque question garde le nombre de fois où elle a été servie: le tirage
+    privilégie les moins servies, et la banque est considérée comme épuisée
+    quand il reste peu de questions servies moins de max_serves fois.
+    Les quasi-doublons d'une question déjà en banque ne sont pas ajoutés.
+    """
+
+    def __init__(self, path, max_serves=3):
+        self.max_serves = max_serves
+        self._lock = threading.Lock()
+        # Index de quasi-doublons par (contenu, niveau), chargé à la première insertion
+        # et évincé après MAX_INDEXES autres (LRU)
+        self._indexes = OrderedDict()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS bank_questions (
+                content_hash TEXT NOT NULL,
+                level TEXT NOT NULL,
+                question_key TEXT NOT NULL,
+                question TEXT NOT NULL,
+                served_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, level, question_key)
+            );
+            CREATE TABLE IF NOT EXISTS bank_rounds (
+                content_hash TEXT NOT NULL,
+                level TEXT NOT NULL,
+                rounds INTEGER NOT NULL,
+                PRIMARY KEY (content_hash, level)
+            );
+        """)
+        self._conn.commit()
+
+    def _index(self, content_hash, level):
+        index = self._indexes.get((content_hash, level))
+        if index is not None:
+            self._indexes.move_to_end((content_hash, level))
+        else:
+            index = QuestionIndex()
+            rows = self._conn.execute(
+                "SELECT question_key, question FROM bank_questions WHERE content_hash = ? AND level = ?",
+                (content_hash, level)
+            )
+            for key, question in rows:
+                index.add(key, question_text(json.loads(question)))
+            self._indexes[(content_hash, level)] = index
+            if len(self._indexes) > MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        return index
+
+    def add(self, content_hash, level, questions):
+        """Ajoute des questions (les doublons sont ignorés); retourne le nombre ajouté"""
+        now = time.time()
+        added = 0
+        with self._lock:
+            index = self._index(content_hash, level)
+            for q in questions:
+                key = normalize_question(q['question'])
+                if key in index or index.add(key, question_text(q)) is not None:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO bank_questions "
+                    "(content_hash, level, question_key, question, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (content_hash, level, key, json.dumps(q, ensure_ascii=False), now)
+                )
+                added += cursor.rowcount
+            self._conn.commit()
+        return added
+
+    def candidates(self, content_hash, level, limit):
+        """Jusqu'à limit questions, les moins servies d'abord (ordre aléatoire à égalité)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM bank_questions "
+                "WHERE content_hash = ? AND level = ? "
+                "ORDER BY served_count ASC, RANDOM() LIMIT ?",
+                (content_hash, level, limit)
+            ).fetchall()
+        return [json.loads(question) for question, in rows]
+
+    def mark_served(self, content_hash, level, questions):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE bank_questions SET served_count = served_count + 1 "
+                "WHERE content_hash = ? AND level = ? AND question_key = ?",
+                [(content_hash, level, normalize_question(q['question'])) for q in questions]
+            )
+            self._conn.commit()
+
+    def fresh_count(self, content_hash, level):
+        """Nombre de questions encore peu servies pour ce cours et ce niveau"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM bank_questions "
+                "WHERE content_hash = ? AND level = ? AND served_count < ?",
+                (content_hash, level, self.max_serves)
+            ).fetchone()[0]
+
+    def next_round(self, content_hash, level):
+        """Numéro de la prochaine série de génération (pour varier les questions)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO bank_rounds (content_hash, level, rounds) VALUES (?, ?, 1) "
+                "ON CONFLICT (content_hash, level) DO UPDATE SET rounds = rounds + 1",
+                (content_hash, level)
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT rounds FROM bank_rounds WHERE content_hash = ? AND level = ?",
+                (content_hash, level)
+            ).fetchone()[0] - 1
+
+    def stats(self):
+        with self._lock:
+            questions, courses = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT content_hash || '|' || level) FROM bank_questions"
+            ).fetchone()
+        return {'questions': questions, 'courses': courses}
+
+
+class BankFiller:
+    """File de pré-génération traitée par un pool de threads en arrière-plan
+
+    generate(text, count, level, api_key, round_number) doit retourner des
+    questions validées. Un même (contenu, niveau) n'est jamais en file deux
+    fois; chaque tâche génère des séries jusqu'à atteindre target questions
+    fraîches, ou jusqu'à ce qu'une série n'apporte plus rien de nouveau.
+    """
+
+    def __init__(self, bank, generate, workers=2, batch_size=10, target=20, max_rounds=4):
+        self.bank = bank
+        self.generate = generate
+        self.workers = workers
+        self.batch_size = batch_size
+        self.target = target
+        self.max_rounds = max_rounds
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # (contenu, niveau) -> instant de mise en file, pour les tâches non terminées
+        self._pending = {}
+        self._started = set()
+        self._threads = []
+        self.completed = 0
+        self.failed = 0
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+
+    def needs_refill(self, content_hash, level):
+        return self.bank.fresh_count(content_hash, level) < self.target // 2
+
+    def submit(self, text, level, api_key=None):
+        """Met le cours en file de pré-génération; False s'il y est déjà"""
+        key = (content_hash(text), level)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = time.monotonic()
+            self._ensure_workers()
+        self._queue.put((key, text, api_key))
+        return True
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name="bank-filler", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            key, text, api_key = self._queue.get()
+            with self._lock:
+                lag = time.monotonic() - self._pending[key]
+                self._started.add(key)
+                self._total_lag += lag
+                self._max_lag = max(self._max_lag, lag)
+            try:
+                self._fill(key, text, api_key)
+                succeeded = True
+            except Exception:
+                succeeded = False
+            with self._lock:
+                del self._pending[key]
+                self._started.discard(key)
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._queue.task_done()
+
+    def _fill(self, key, text, api_key):
+        hash_, level = key
+        for _ in range(self.max_rounds):
+            if self.bank.fresh_count(hash_, level) >= self.target:
+                return
+            round_number = self.bank.next_round(hash_, level)
+            questions = self.generate(text, self.batch_size, level, api_key, round_number)
+            if not self.bank.add(hash_, level, questions):
+                return
+
+    def metrics(self):
+        """Profondeur de la file et retard de traitement"""
+        now = time.monotonic()
+        with self._lock:
+            waiting = [t for key, t in self._pending.items() if key not in self._started]
+            processed = self.completed + self.failed + len(self._started)
+            return {
+                'depth': len(waiting),
+                'active': len(self._started),
+                'completed': self.completed,
+                'failed': self.failed,
+                'lag_s': (now - min(waiting)) if waiting else 0.0,
+                'avg_lag_s': (self._total_lag / processed) if processed else 0.0,
+                'max_lag_s': self._max_lag,
+            }
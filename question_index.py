@@ -0,0 +1,150 @@
+"""Détection des questions quasi identiques (MinHash + LSH sur des shingles de caractères)"""
+import hashlib
+import zlib
+
+import numpy as np
+
+from chunking import normalize_question
+
+# Signature MinHash de NUM_PERM valeurs, découpée en BANDS bandes pour le LSH:
+# deux questions partagent un seau dès qu'une bande est identique
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(1337)
+_A = _rng.randint(1, (1 << 31) - 1, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, NUM_PERM).astype(np.uint64)
+
+
+def question_text(q):
+    """Texte comparé: l'énoncé et les options (deux calculs qui ne diffèrent que par un nombre restent distincts)"""
+    return ' '.join([q['question']] + sorted(q.get('options', [])))
+
+
+def question_fingerprint(text):
+    """Identifiant stable d'un texte de question, aux espaces, accents et ponctuation près"""
+    return hashlib.sha1(normalize_question(text).encode('utf-8')).hexdigest()[:16]
+
+
+def shingles(text):
+    text = normalize_question(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """Signature MinHash d'un texte (NUM_PERM entiers)"""
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)),
+        dtype=np.uint64
+    )
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def minhash_from_bytes(data):
+    """Signature MinHash enregistrée avec signature.tobytes()"""
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+class QuestionIndex:
+    """Index LSH de questions: recherche d'un quasi-doublon sans comparer à toutes les questions
+
+    Une recherche coûte BANDS accès à un dictionnaire plus la comparaison des
+    quelques candidats trouvés, quel que soit le nombre de questions indexées.
+    """
+
+    def __init__(self, threshold=0.7):
+        self.threshold = threshold
+        self._keys = []
+        self._rows = {}
+        # Signatures stockées ligne par ligne pour comparer les candidats en un seul calcul
+        self._matrix = np.empty((64, NUM_PERM), dtype=np.uint32)
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    @staticmethod
+    def _bands(signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def find_duplicate(self, text, signature=None):
+        """Clé de la question indexée la plus proche au-delà du seuil, ou None"""
+        if signature is None:
+            signature = minhash(text)
+        candidates = set()
+        for band in self._bands(signature):
+            candidates.update(self._buckets.get(band, ()))
+        if not candidates:
+            return None
+        rows = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+        matches = np.count_nonzero(self._matrix[rows] == signature, axis=1)
+        best = int(np.argmax(matches))
+        if matches[best] < self.threshold * NUM_PERM:
+            return None
+        return self._keys[rows[best]]
+
+    def add(self, key, text, signature=None):
+        """Indexe une question, sauf si un quasi-doublon existe déjà
+
+        Retourne la clé du quasi-doublon trouvé, ou None si la question a été ajoutée.
+        """
+        if signature is None:
+            signature = minhash(text)
+        duplicate = self.find_duplicate(text, signature)
+        if duplicate is not None:
+            return duplicate
+        self._insert(key, signature)
+        return None
+
+    def load(self, entries):
+        """Indexe des (clé, texte, signature ou None) déjà dédupliqués, sans rechercher de quasi-doublon
+
+        Sert à recharger un historique de questions vues: seules les
+        signatures absentes sont calculées.
+        """
+        for key, text, signature in entries:
+            if key not in self._rows:
+                self._insert(key, minhash(text) if signature is None else signature)
+
+    def _insert(self, key, signature):
+        row = len(self._keys)
+        if row == len(self._matrix):
+            self._matrix = np.concatenate([self._matrix, np.empty_like(self._matrix)])
+        self._matrix[row] = signature
+        self._keys.append(key)
+        self._rows[key] = row
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(row)
+
+
+def select_questions(questions, count, seen_index=None, priorities=None):
+    """Retire les quasi-doublons et garde count questions, celles jamais vues en premier
+
+    priorities: score de chaque question (information apportée...): les plus
+    hauts passent en premier parmi les questions vues et parmi les autres.
+    """
+    batch = QuestionIndex()
+    unseen = []
+    seen = []
+    for position, q in enumerate(questions):
+        text = question_text(q)
+        signature = minhash(text)
+        if batch.add(position, text, signature) is not None:
+            continue
+        if seen_index is not None and seen_index.find_duplicate(text, signature) is not None:
+            seen.append(position)
+        else:
+            unseen.append(position)
+    if priorities is not None:
+        unseen.sort(key=lambda position: -priorities[position])
+        seen.sort(key=lambda position: -priorities[position])
+    return [questions[position] for position in unseen + seen][:count]
@@ -0,0 +1,124 @@
+"""Cache persistant des quiz validés, adressé par le contenu (SQLite)"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_cache_key(text, level, num_questions, prompt_version):
+    """Calcule la clé de cache à partir du contenu, du niveau et du prompt"""
+    payload = json.dumps(
+        [text, level, num_questions, prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QuizCache:
+    """Cache de questions validées avec expiration (TTL) et éviction LRU"""
+
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS quiz_cache (
+                key TEXT PRIMARY KEY,
+                questions TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_quiz_cache_last_access ON quiz_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Retourne les questions en cache, ou None si absentes ou expirées"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT questions, created_at FROM quiz_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            questions, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM quiz_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE quiz_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(questions)
+
+    def peek(self, key):
+        """Comme get, sans compter de hit ou de miss ni rafraîchir l'entrée (seconde vérification)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT questions, created_at FROM quiz_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, questions):
+        """Enregistre un jeu de questions validées"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quiz_cache (key, questions, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(questions, ensure_ascii=False), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées"""
+        cursor = self._conn.execute(
+            "DELETE FROM quiz_cache WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        self.evictions += cursor.rowcount
+
+        size = self._conn.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM quiz_cache WHERE key IN ("
+                "SELECT key FROM quiz_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += cursor.rowcount
+
+    def stats(self):
+        """Compteurs de hits/misses et taille actuelle du cache"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': size,
+            'hit_rate': (self.hits / total) if total else 0.0,
+        }
@@ -0,0 +1,134 @@
+"""Analyse et validation des questions produites par le modèle"""
+import json
+import re
+
+
+# Schéma imposé au modèle via la sortie structurée de Gemini (responseSchema);
+# validate_question applique les mêmes règles côté application
+QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "question": {"type": "STRING"},
+        "options": {
+            "type": "ARRAY",
+            "items": {"type": "STRING"},
+            "minItems": 4,
+            "maxItems": 4
+        },
+        "correct": {"type": "INTEGER"},
+        "explanation": {"type": "STRING"}
+    },
+    "required": ["question", "options", "correct", "explanation"],
+    "propertyOrdering": ["question", "options", "correct", "explanation"]
+}
+
+QUIZ_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "questions": {"type": "ARRAY", "items": QUESTION_SCHEMA}
+    },
+    "required": ["questions"]
+}
+
+# Caractères qui changent l'état du parseur; tout le reste est sauté d'un bloc
+_STRUCTURAL_CHARS = re.compile(r'[\\"{}\[\]]')
+
+# Profondeurs où se trouvent les questions: {"questions": [{...}]} ou [{...}]
+_QUESTION_PARENTS = (['{', '['], ['['])
+
+
+def validate_question(q):
+    """Vérifie qu'une question a la structure attendue (QCM à 4 options)"""
+    return (isinstance(q, dict) and
+            isinstance(q.get('question'), str) and
+            q['question'].strip() != '' and
+            isinstance(q.get('options'), list) and
+            len(q.get('options', [])) == 4 and
+            all(isinstance(option, str) for option in q['options']) and
+            isinstance(q.get('correct'), int) and
+            not isinstance(q.get('correct'), bool) and
+            0 <= q.get('correct', -1) < 4 and
+            isinstance(q.get('explanation'), str))
+
+
+class IncrementalQuestionParser:
+    """Parseur JSON incrémental et tolérant pour une réponse contenant des questions
+
+    Chaque objet question est décodé dès que son accolade fermante arrive,
+    sans attendre la fin de la réponse: une réponse tronquée garde donc ses
+    questions complètes. Le texte qui précède ou suit le JSON (prose, balises
+    markdown) est ignoré, et seul le texte de l'objet en cours est conservé.
+    """
+
+    def __init__(self):
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._partial = []
+        self._capturing = False
+        self._done = False
+        self.objects_seen = 0
+
+    def feed(self, chunk):
+        """Ajoute un morceau de texte et retourne les questions complètes trouvées"""
+        completed = []
+        if self._done:
+            return completed
+        # Caractère échappé à cheval entre deux morceaux
+        skip_until = 1 if self._escaped else 0
+        self._escaped = False
+        start = 0
+
+        for match in _STRUCTURAL_CHARS.finditer(chunk):
+            position = match.start()
+            if position < skip_until:
+                continue
+            char = match.group()
+
+            if self._in_string:
+                if char == '\\':
+                    skip_until = position + 2
+                    self._escaped = skip_until > len(chunk)
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                # Les guillemets de la prose qui précède le JSON sont ignorés
+                if self._stack:
+                    self._in_string = True
+            elif char in '{[':
+                if char == '{' and self._stack in _QUESTION_PARENTS:
+                    self._capturing = True
+                    self._partial = []
+                    start = position
+                self._stack.append(char)
+            elif char in '}]' and self._stack:
+                self._stack.pop()
+                if char == '}' and self._capturing and self._stack in _QUESTION_PARENTS:
+                    self._capturing = False
+                    self.objects_seen += 1
+                    self._partial.append(chunk[start:position + 1])
+                    try:
+                        completed.append(json.loads(''.join(self._partial)))
+                    except json.JSONDecodeError:
+                        pass
+                    self._partial = []
+                if not self._stack and self.objects_seen:
+                    # Fin du JSON: le texte qui suit est ignoré
+                    self._done = True
+                    break
+
+        if self._capturing:
+            self._partial.append(chunk[start:])
+        return completed
+
+
+def extract_questions(text):
+    """Questions complètes d'une réponse entière, même entourée de texte ou tronquée
+
+    Retourne (questions, nombre d'objets question rencontrés).
+    """
+    parser = IncrementalQuestionParser()
+    questions = parser.feed(text)
+    return questions, parser.objects_seen
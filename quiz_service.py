@@ -0,0 +1,589 @@
+"""Logique des quiz indépendante de Streamlit: génération, correction et progression des élèves
+
+Utilisée par l'interface Streamlit (app.py) et par l'API JSON (api.py).
+"""
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from batch_generation import run_concurrently
+from chunking import select_balanced, split_into_chunks
+from extractive_generator import generate_extractive_quiz
+from gemini_client import GeminiAPIError
+from quiz_cache import make_cache_key
+from question_index import minhash, question_fingerprint, question_text
+from quiz_parsing import QUIZ_RESPONSE_SCHEMA, IncrementalQuestionParser, extract_questions, validate_question
+from singleflight import SingleFlight
+from spaced_repetition import sm2_update
+from tracing import Tracer
+
+# Version du prompt de génération: à incrémenter à chaque modification du prompt
+# pour invalider les quiz mis en cache
+PROMPT_VERSION = 1
+
+# Taille maximale du contenu de cours envoyé au modèle en un seul appel;
+# au-delà, le cours est découpé en morceaux traités en parallèle
+MAX_PROMPT_CONTENT = 2500
+CHUNK_OVERLAP = 200
+MAX_CHUNKS = 8
+
+# Attente maximale (secondes) d'une session qui reçoit le flux d'une génération
+# identique lancée par une autre session
+FLIGHT_WAIT_TIMEOUT = 120
+
+# Termes clés des derniers cours de chaque élève, proposés comme mauvaises réponses
+# par le générateur local quand un cours n'en fournit pas assez; corpus gardés
+# pour les CORPUS_USERS élèves les plus récents
+CORPUS_TERMS = 2000
+CORPUS_USERS = 1000
+
+# Points gagnés par bonne réponse, et rangs par seuil de points (du plus haut au plus bas)
+POINTS_PER_CORRECT_ANSWER = 10
+RANKS = ((1000, '🏆 Expert'), (500, '⭐ Avancé'), (200, '📚 Intermédiaire'), (0, '🌱 Débutant'))
+
+
+class QuizGenerationError(Exception):
+    """La réponse du modèle ne contient pas de questions exploitables"""
+
+
+def build_generation_request(prompt):
+    """Corps de requête generateContent pour un prompt de quiz"""
+    return {
+        "contents": [{
+            "parts": [{
+                "text": prompt
+            }]
+        }],
+        "generationConfig": {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 2048,
+            # Sortie structurée: JSON conforme au schéma des questions
+            "responseMimeType": "application/json",
+            "responseSchema": QUIZ_RESPONSE_SCHEMA,
+        }
+    }
+
+
+def build_quiz_prompt(content, num_questions, level, variant=0):
+    """Construit le prompt de génération de quiz
+
+    variant > 0 demande une nouvelle série de questions sur le même cours
+    (réapprovisionnement de la banque de questions).
+    """
+    variation = ""
+    if variant:
+        variation = (
+            f"\nSÉRIE N°{variant + 1}: d'autres séries existent déjà pour ce cours; "
+            "varie les notions abordées et les formulations.\n"
+        )
+    # Prompt optimisé pour générer des quiz
+    return f"""
+Tu es un expert pédagogique sénégalais spécialisé dans la création de quiz pour lycéens.
+
+CONSIGNE: À partir du contenu de cours suivant, génère exactement {num_questions} questions de type QCM adaptées au niveau {level}.
+{variation}
+CONTENU DU COURS:
+{content}
+
+FORMAT DE RÉPONSE REQUIS (JSON strict):
+{{
+    "questions": [
+        {{
+            "question": "Question claire et précise basée sur le contenu",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correct": 0,
+            "explanation": "Explication détaillée de pourquoi cette réponse est correcte"
+        }}
+    ]
+}}
+
+CRITÈRES IMPORTANTS:
+- Questions adaptées au programme sénégalais niveau {level}
+- 4 options par question (A, B, C, D)
+- Une seule bonne réponse par question (index 0-3)
+- Explications pédagogiques claires
+- Vocabulaire approprié au niveau scolaire
+- Questions basées UNIQUEMENT sur le contenu fourni
+- Éviter les questions trop évidentes ou trop difficiles
+
+Réponds UNIQUEMENT avec le JSON valide, sans texte supplémentaire, sans balises markdown.
+        """
+
+
+def parse_quiz_response(response_text, num_questions):
+    """Extrait et valide les questions de la réponse du modèle
+
+    Le texte autour du JSON est ignoré et les questions complètes d'une
+    réponse tronquée sont conservées.
+    """
+    questions, objects_seen = extract_questions(response_text)
+    if objects_seen == 0:
+        raise QuizGenerationError("Format de réponse invalide")
+
+    # Validation des questions
+    valid_questions = [q for q in questions if validate_question(q)][:num_questions]
+
+    if not valid_questions:
+        raise QuizGenerationError("Questions générées invalides")
+    return valid_questions
+
+
+def quiz_cache_key(text, num_questions, level, variant=0):
+    """Clé de cache d'un quiz pour ce contenu, ce niveau et ce nombre de questions"""
+    prompt_version = PROMPT_VERSION if not variant else f"{PROMPT_VERSION}-{variant}"
+    return make_cache_key(text, level, num_questions, prompt_version)
+
+
+def generation_flight_key(prompt, api_key=None):
+    """Clé d'une génération: empreinte du prompt aux espaces près et de la clé utilisée
+
+    Seules les générations faites avec la même clé (la même clé personnelle,
+    ou le pool du serveur) sont partagées: une session ne reçoit jamais
+    l'erreur d'une clé qui n'est pas la sienne, ni des questions facturées à
+    un autre élève.
+    """
+    key_identity = hashlib.sha256(api_key.encode('utf-8')).hexdigest() if api_key else "pool"
+    return hashlib.sha256(f"{key_identity}\n{' '.join(prompt.split())}".encode('utf-8')).hexdigest()
+
+
+def generate_quiz_simulation(text, num_questions=5):
+    """Questions génériques, pour un texte trop court pour le générateur local"""
+    sample_questions = [
+        {
+            "question": "Quelle est l'idée principale développée dans ce cours ?",
+            "options": [
+                "Concept fondamental A",
+                "Théorie principale B",
+                "Principe central C",
+                "Notion essentielle D"
+            ],
+            "correct": 0,
+            "explanation": "Cette réponse correspond au thème central développé dans le contenu du cours."
+        },
+        {
+            "question": "Comment peut-on appliquer cette connaissance en pratique ?",
+            "options": [
+                "Application dans le domaine X",
+                "Utilisation en contexte Y",
+                "Mise en œuvre selon Z",
+                "Implementation via W"
+            ],
+            "correct": 1,
+            "explanation": "Cette application pratique découle directement des principes théoriques énoncés."
+        },
+        {
+            "question": "Quels sont les éléments clés à retenir de cette leçon ?",
+            "options": [
+                "Points secondaires",
+                "Éléments principaux",
+                "Détails complémentaires",
+                "Aspects périphériques"
+            ],
+            "correct": 1,
+            "explanation": "Les éléments principaux constituent le cœur de la compréhension du sujet."
+        },
+        {
+            "question": "Dans quel contexte cette notion est-elle particulièrement importante ?",
+            "options": [
+                "Contexte général",
+                "Situation spécifique",
+                "Cadre d'application précis",
+                "Environnement particulier"
+            ],
+            "correct": 2,
+            "explanation": "Le cadre d'application précis permet une meilleure compréhension et utilisation."
+        },
+        {
+            "question": "Quelle conclusion peut-on tirer de cette étude ?",
+            "options": [
+                "Conclusion partielle",
+                "Synthèse globale",
+                "Résumé incomplet",
+                "Vue d'ensemble limitée"
+            ],
+            "correct": 1,
+            "explanation": "La synthèse globale offre la perspective la plus complète du sujet traité."
+        }
+    ]
+
+    return random.sample(sample_questions, min(num_questions, len(sample_questions)))
+
+
+def new_quiz(course_id, course_title, questions):
+    """Quiz prêt à commencer
+
+    Le quiz est une machine à états:
+    'question' (réponse attendue) → 'feedback' (correction affichée jusqu'à ce
+    que l'élève passe à la suite) → 'question' suivante ou 'finished'.
+    """
+    return {
+        'course_id': course_id,
+        'course_title': course_title,
+        'questions': questions,
+        'current_question': 0,
+        'answers': [],
+        'score': 0,
+        'state': 'question'
+    }
+
+
+def check_answer(question, selected_answer):
+    return selected_answer == question['correct']
+
+
+def answer_question(quiz, selected_answer):
+    """Enregistre la réponse à la question courante et passe à l'état 'feedback'"""
+    question = quiz['questions'][quiz['current_question']]
+    quiz['answers'].append(selected_answer)
+    correct = check_answer(question, selected_answer)
+    if correct:
+        quiz['score'] += 1
+    quiz['state'] = 'feedback'
+    return correct
+
+
+def advance_quiz(quiz):
+    """Passe de la correction à la question suivante"""
+    quiz['current_question'] += 1
+    quiz['state'] = 'question'
+
+
+class QuizService:
+    """Génération des quiz et progression des élèves, sans interface
+
+    Les ressources partagées (base, cache, client HTTP, pool de clés...)
+    sont fournies par l'appelant: app.py les crée une fois par processus
+    avec st.cache_resource, api.py au démarrage du serveur.
+    """
+
+    def __init__(self, storage, quiz_cache, client, key_pool=None, rate_limiter=None,
+                 flight=None, leaderboard=None, stats_engine=None, batch_concurrency=4, tracer=None,
+                 review_queue=None, irt_calibrator=None):
+        self.storage = storage
+        self.quiz_cache = quiz_cache
+        self.client = client
+        self.key_pool = key_pool
+        self.rate_limiter = rate_limiter
+        self.flight = flight or SingleFlight()
+        self.leaderboard = leaderboard
+        self.stats_engine = stats_engine
+        self.review_queue = review_queue
+        self.irt_calibrator = irt_calibrator
+        self.batch_concurrency = batch_concurrency
+        self.tracer = tracer or Tracer()
+        # Corpus de chaque élève: ses propres cours seulement (jamais ceux des autres)
+        self._corpora = OrderedDict()
+        self._corpora_lock = threading.Lock()
+        self._data_version = storage.data_version()
+        self._reload_lock = threading.Lock()
+
+    def call_gemini_api(self, prompt, api_key):
+        """Appelle l'API Gemini via REST (lève GeminiAPIError en cas d'erreur HTTP)
+
+        Sans clé personnelle (api_key=None), une clé du pool serveur est utilisée.
+        """
+        with self.tracer.span("call_gemini_api"):
+            data = build_generation_request(prompt)
+            response = self.client.generate_content(api_key, data, timeout=30, key_pool=self.key_pool)
+
+            if response.status_code != 200:
+                raise GeminiAPIError(response.status_code, response.text)
+
+            result = response.json()
+            if 'candidates' in result and len(result['candidates']) > 0:
+                return result['candidates'][0]['content']['parts'][0]['text']
+            return None
+
+    def call_gemini_api_stream(self, prompt, api_key):
+        """Appelle l'API Gemini en streaming et produit le texte au fil de l'eau"""
+        data = build_generation_request(prompt)
+        return self.client.stream_generate_content(api_key, data, timeout=30, key_pool=self.key_pool)
+
+    def generate_chunk_questions(self, chunk, num_questions, level, api_key, variant=0):
+        """Génère les questions d'un seul morceau de cours (un appel API, mis en cache)"""
+        cache = self.quiz_cache
+        cache_key = quiz_cache_key(chunk, num_questions, level, variant)
+
+        cached_questions = cache.get(cache_key)
+        if cached_questions:
+            return cached_questions
+
+        prompt = build_quiz_prompt(chunk, num_questions, level, variant)
+
+        def generate():
+            # Une génération identique vient peut-être de se terminer (déjà compté comme miss)
+            cached_questions = cache.peek(cache_key)
+            if cached_questions:
+                return cached_questions
+            response_text = self.call_gemini_api(prompt, api_key)
+            if response_text is None:
+                raise QuizGenerationError("Réponse vide")
+            with self.tracer.span("parse_quiz_response"):
+                valid_questions = parse_quiz_response(response_text, num_questions)
+            cache.set(cache_key, valid_questions)
+            return valid_questions
+
+        # Même prompt déjà en cours dans une autre session: on attend son résultat
+        return self.flight.do(generation_flight_key(prompt, api_key), generate)
+
+    def generate_validated_questions(self, text, num_questions, level, api_key, variant=0):
+        """Génère des questions validées via Gemini
+
+        Utilisable depuis des threads de travail: les erreurs sont levées
+        (GeminiAPIError, QuizGenerationError). Les cours longs sont découpés
+        en morceaux générés en parallèle, puis les questions sont
+        dédupliquées et réparties entre les morceaux.
+        """
+        if len(text) <= MAX_PROMPT_CONTENT:
+            return self.generate_chunk_questions(text, num_questions, level, api_key, variant)
+
+        cache = self.quiz_cache
+        cache_key = quiz_cache_key(text, num_questions, level, variant)
+
+        # Quiz déjà assemblé pour ce contenu: réponse immédiate
+        cached_questions = cache.get(cache_key)
+        if cached_questions:
+            return cached_questions
+
+        # Map: questions candidates par morceau (chacun mis en cache séparément)
+        chunk_size = max(MAX_PROMPT_CONTENT, -(-len(text) // MAX_CHUNKS))
+        chunks = split_into_chunks(text, chunk_size, CHUNK_OVERLAP)
+        while len(chunks) > MAX_CHUNKS:
+            chunk_size = chunk_size * 5 // 4
+            chunks = split_into_chunks(text, chunk_size, CHUNK_OVERLAP)
+        per_chunk = min(num_questions, -(-num_questions // len(chunks)) + 1)
+
+        candidates = [None] * len(chunks)
+        first_error = None
+        results = run_concurrently(
+            list(range(len(chunks))),
+            lambda i: self.generate_chunk_questions(chunks[i], per_chunk, level, api_key, variant),
+            max_concurrency=self.batch_concurrency,
+            # Le pool de clés serveur gère lui-même les quotas
+            rate_limiter=self.rate_limiter if api_key else None,
+            rate_key=api_key
+        )
+        for index, questions, error in results:
+            if error is None:
+                candidates[index] = questions
+            elif first_error is None:
+                first_error = error
+
+        # Reduce: sélection équilibrée et sans doublon
+        valid_questions = select_balanced([c for c in candidates if c], num_questions)
+        if not valid_questions:
+            raise first_error or QuizGenerationError("Questions générées invalides")
+
+        # Quiz incomplet (morceaux en échec): on ne le fige pas en cache
+        if first_error is None:
+            cache.set(cache_key, valid_questions)
+        return valid_questions
+
+    def stream_validated_questions(self, text, num_questions, level, api_key):
+        """Produit les questions validées une par une, dès qu'elles sont reçues
+
+        Variante en streaming de generate_validated_questions: le quiz complet
+        n'est mis en cache qu'une fois le flux terminé.
+        """
+        # Cours long: génération par morceaux, sans streaming
+        if len(text) > MAX_PROMPT_CONTENT:
+            yield from self.generate_validated_questions(text, num_questions, level, api_key)
+            return
+
+        cache = self.quiz_cache
+        cache_key = quiz_cache_key(text, num_questions, level)
+
+        cached_questions = cache.get(cache_key)
+        if cached_questions:
+            yield from cached_questions
+            return
+
+        prompt = build_quiz_prompt(text, num_questions, level)
+        call, leader = self.flight.begin(generation_flight_key(prompt, api_key))
+        if not leader:
+            # Même quiz déjà en cours de génération dans une autre session
+            yield from self.flight.wait(call, timeout=FLIGHT_WAIT_TIMEOUT)
+            return
+
+        valid_questions = []
+        error = QuizGenerationError("Génération interrompue")
+        try:
+            parser = IncrementalQuestionParser()
+            for chunk in self.call_gemini_api_stream(prompt, api_key):
+                for q in parser.feed(chunk):
+                    if validate_question(q) and len(valid_questions) < num_questions:
+                        valid_questions.append(q)
+                        yield q
+
+            if not valid_questions:
+                if parser.objects_seen == 0:
+                    raise QuizGenerationError("Format de réponse invalide")
+                raise QuizGenerationError("Questions générées invalides")
+            cache.set(cache_key, valid_questions)
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.flight.finish(call, result=valid_questions, error=error)
+
+    def corpus_terms(self, user_id):
+        """Termes clés des cours déjà traités pour cet élève (aucun sans élève)"""
+        with self._corpora_lock:
+            terms = self._corpora.get(user_id)
+            if terms is None:
+                return []
+            self._corpora.move_to_end(user_id)
+            return list(terms)
+
+    def _add_corpus_terms(self, user_id, new_terms):
+        """Ajoute les termes d'un cours au corpus de l'élève, sans doublon (les plus récents en dernier)"""
+        with self._corpora_lock:
+            terms = self._corpora.get(user_id)
+            if terms is None:
+                terms = self._corpora[user_id] = OrderedDict()
+                if len(self._corpora) > CORPUS_USERS:
+                    self._corpora.popitem(last=False)
+            self._corpora.move_to_end(user_id)
+            for term in new_terms:
+                terms.pop(term, None)
+                terms[term] = None
+            while len(terms) > CORPUS_TERMS:
+                terms.popitem(last=False)
+
+    def generate_local_questions(self, text, num_questions, user_id=None):
+        """Questions à trous tirées du cours lui-même, sans appel à l'API (quelques millisecondes)"""
+        with self.tracer.span("generate_extractive_quiz"):
+            questions, terms = generate_extractive_quiz(text, num_questions, corpus_terms=self.corpus_terms(user_id))
+            if user_id is not None:
+                self._add_corpus_terms(user_id, terms)
+        return questions or generate_quiz_simulation(text, num_questions)
+
+    def generate_quiz(self, text, num_questions=5, level="Terminale", api_key=None,
+                      use_api=True, on_question=None, user_id=None):
+        """Quiz pour ce cours, avec repli sur les questions générées localement
+
+        Retourne (questions, erreur): erreur est l'exception qui a interrompu
+        la génération (None si tout s'est bien passé). Si on_question est
+        fourni, la réponse est reçue en streaming et on_question(index,
+        question) est appelé pour chaque question validée. user_id: élève
+        dont les autres cours fournissent des mauvaises réponses locales.
+        """
+        with self.tracer.span("generate_quiz_with_gemini"):
+            if not use_api:
+                # Un quiz déjà en cache reste disponible sans clé API
+                cached_questions = self.quiz_cache.get(quiz_cache_key(text, num_questions, level))
+                if cached_questions:
+                    return cached_questions, None
+                return self.generate_local_questions(text, num_questions, user_id), None
+
+            questions = []
+            try:
+                if on_question is None:
+                    return self.generate_validated_questions(text, num_questions, level, api_key), None
+                for q in self.stream_validated_questions(text, num_questions, level, api_key):
+                    on_question(len(questions), q)
+                    questions.append(q)
+                return questions, None
+            except Exception as e:
+                error = e
+
+            # Flux interrompu: les questions déjà reçues restent utilisables
+            if questions:
+                return questions, error
+            return self.generate_local_questions(text, num_questions, user_id), error
+
+    def reload_if_changed(self):
+        """Recharge le classement et oublie les statistiques et révisions chargées
+        si un autre processus (l'API, une autre instance) a écrit dans la base
+
+        Retourne True si un rechargement a eu lieu. Coût sans écriture extérieure: une requête PRAGMA.
+        """
+        with self._reload_lock:
+            version = self.storage.data_version()
+            if version == self._data_version:
+                return False
+            # Version lue avant le rechargement: une écriture pendant celui-ci en déclenchera un autre
+            self._data_version = version
+            if self.leaderboard is not None:
+                self.leaderboard.load(self.storage.iter_leaderboard_entries())
+            if self.stats_engine is not None:
+                self.stats_engine.clear()
+            if self.review_queue is not None:
+                self.review_queue.clear()
+            return True
+
+    def sync_leaderboard(self, user_id):
+        """Répercute le profil d'un utilisateur dans le classement"""
+        if self.leaderboard is None:
+            return
+        user = self.storage.get_user(user_id)
+        if user and user['name']:
+            self.leaderboard.update(
+                user_id, user['name'], user['points'], user['level'], user['school'], user['region']
+            )
+        else:
+            self.leaderboard.remove(user_id)
+
+    def update_user_stats(self, user_id, correct_answers, total_questions):
+        """Met à jour les points, le rang et la série d'un élève; retourne son profil"""
+        with self.tracer.span("update_user_stats"):
+            # Incréments faits par SQLite: l'app Streamlit et l'API peuvent terminer un quiz en même temps
+            self.storage.add_quiz_progress(
+                user_id, correct_answers, correct_answers * POINTS_PER_CORRECT_ANSWER, RANKS,
+                datetime.now().date()
+            )
+            self.sync_leaderboard(user_id)
+            return self.storage.get_user(user_id)
+
+    def mark_questions_seen(self, user_id, questions, seen_index=None):
+        """Mémorise les questions d'un quiz terminé pour ne pas les reproposer en priorité"""
+        seen = [(question_fingerprint(text), text, minhash(text)) for text in map(question_text, questions)]
+        self.storage.mark_questions_seen(
+            user_id, [(fingerprint, text, signature.tobytes()) for fingerprint, text, signature in seen]
+        )
+        if seen_index is not None:
+            for fingerprint, text, signature in seen:
+                seen_index.add(fingerprint, text, signature)
+
+    def record_question_outcomes(self, user_id, quiz):
+        """Enregistre le résultat de chaque question et reprogramme sa révision (SM-2)"""
+        now = datetime.now()
+        answered = list(zip(quiz['questions'], quiz['answers']))
+        fingerprints = [question_fingerprint(question_text(q)) for q, _ in answered]
+        states = self.storage.get_review_states(user_id, fingerprints)
+        outcomes = []
+        for fingerprint, (question, answer) in zip(fingerprints, answered):
+            correct = check_answer(question, answer)
+            outcomes.append((fingerprint, question, correct, sm2_update(states.get(fingerprint), correct, now)))
+        self.storage.record_answers(user_id, quiz['course_id'], outcomes)
+        if self.irt_calibrator is not None:
+            self.irt_calibrator.notify()
+        if self.review_queue is not None:
+            for fingerprint, _, _, state in outcomes:
+                self.review_queue.schedule(user_id, fingerprint, state['due_at'])
+
+    def finish_quiz(self, user_id, quiz, seen_index=None):
+        """Clôt un quiz répondu et retourne le profil de l'élève
+
+        Progression, résultat, questions vues et réponses (révisions SM-2,
+        calibration IRT) sont enregistrés. seen_index: index des questions
+        vues de la session, mis à jour avec celles du quiz.
+        """
+        total_questions = len(quiz['questions'])
+        user = self.update_user_stats(user_id, quiz['score'], total_questions)
+        self.storage.add_quiz_result(
+            user_id, quiz['course_id'], quiz['course_title'], quiz['score'], total_questions
+        )
+        if self.stats_engine is not None:
+            self.stats_engine.record(
+                user_id, quiz['course_id'], quiz['course_title'], quiz['score'], total_questions, datetime.now()
+            )
+        self.mark_questions_seen(user_id, quiz['questions'], seen_index)
+        self.record_question_outcomes(user_id, quiz)
+        quiz['state'] = 'finished'
+        return user
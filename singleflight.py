@@ -0,0 +1,76 @@
+"""Regroupement des appels identiques concurrents (single-flight)"""
+import threading
+
+
+class _Call:
+    __slots__ = ('key', 'done', 'result', 'error', 'waiters')
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Exécute une seule fois une fonction pour tous les appelants simultanés d'une même clé
+
+    Le premier appelant exécute la fonction; ceux qui arrivent pendant
+    l'exécution attendent et reçoivent le même résultat (ou la même
+    exception). Rien n'est conservé une fois l'appel terminé: ce n'est pas
+    un cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def begin(self, key):
+        """Rejoint ou démarre l'appel de cette clé; retourne (appel, leader)
+
+        Le leader doit appeler finish(); les autres appellent wait().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call(key)
+                self._calls[key] = call
+                self.executions += 1
+                return call, True
+            call.waiters += 1
+            self.coalesced += 1
+            return call, False
+
+    def finish(self, call, result=None, error=None):
+        """Publie le résultat du leader et libère les appelants en attente"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(call.key) is call:
+                del self._calls[call.key]
+        call.done.set()
+
+    def wait(self, call, timeout=None):
+        if not call.done.wait(timeout):
+            raise TimeoutError("Appel en cours trop long")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.finish(call, error=e)
+            raise
+        except BaseException:
+            self.finish(call, error=RuntimeError("Appel interrompu"))
+            raise
+        self.finish(call, result=result)
+        return result
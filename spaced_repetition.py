@@ -0,0 +1,153 @@
+"""Répétition espacée (SM-2) et file des questions à revoir par élève"""
+import heapq
+import threading
+from datetime import timedelta
+
+# État d'une question jamais révisée
+NEW_CARD = {'repetitions': 0, 'ease': 2.5, 'interval_days': 0.0, 'lapses': 0}
+
+MIN_EASE = 1.3
+
+# Jours de la semaine où un rappel est envoyé, selon la fréquence choisie (0 = lundi)
+REMINDER_DAYS = {
+    "Quotidien": range(7),
+    "3 fois par semaine": (0, 2, 4),
+    "Hebdomadaire": (0,),
+}
+
+
+def sm2_update(state, correct, now):
+    """Nouvel état d'une question après une réponse (algorithme SM-2)
+
+    Une bonne réponse vaut la note 4, une mauvaise la note 1: la question
+    ratée repart de zéro et redevient à revoir immédiatement.
+    """
+    state = dict(state or NEW_CARD)
+    quality = 4 if correct else 1
+    if correct:
+        if state['repetitions'] == 0:
+            interval = 1.0
+        elif state['repetitions'] == 1:
+            interval = 6.0
+        else:
+            interval = round(state['interval_days'] * state['ease'])
+        state['repetitions'] += 1
+    else:
+        interval = 0.0
+        state['repetitions'] = 0
+        state['lapses'] += 1
+    state['ease'] = max(
+        MIN_EASE,
+        state['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    )
+    state['interval_days'] = interval
+    state['due_at'] = now + timedelta(days=interval)
+    return state
+
+
+def reminder_due(settings, now, last_reminder=None):
+    """Indique si le rappel de révision doit être affiché maintenant"""
+    if not settings.get('reminder_enabled'):
+        return False
+    if now.weekday() not in REMINDER_DAYS.get(settings.get('reminder_frequency'), ()):
+        return False
+    if now.time() < settings['reminder_time']:
+        return False
+    return last_reminder is None or last_reminder.date() < now.date()
+
+
+class ReviewQueue:
+    """Tas des échéances de révision de chaque élève
+
+    Les k prochaines questions à revoir s'obtiennent en O(k log n). Une
+    question reprogrammée est simplement ajoutée à nouveau: l'ancienne
+    entrée, devenue obsolète, est ignorée quand elle remonte en tête.
+    Le nombre de questions échues est tenu à jour au fil du temps, sans
+    parcourir toutes les échéances.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heaps = {}
+        self._due = {}
+        # Échéances pas encore comptées (tas) et questions déjà comptées comme échues
+        self._pending = {}
+        self._counted = {}
+
+    def is_loaded(self, user_id):
+        with self._lock:
+            return user_id in self._heaps
+
+    def clear(self):
+        """Oublie les échéances chargées: elles seront relues depuis la base"""
+        with self._lock:
+            self._heaps = {}
+            self._due = {}
+            self._pending = {}
+            self._counted = {}
+
+    def load(self, user_id, schedule):
+        """Charge les échéances (empreinte, datetime) d'un élève depuis la base"""
+        due = {fingerprint: due_at.timestamp() for fingerprint, due_at in schedule}
+        heap = [(timestamp, fingerprint) for fingerprint, timestamp in due.items()]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heaps[user_id] = heap
+            self._due[user_id] = due
+            self._pending[user_id] = list(heap)
+            self._counted[user_id] = set()
+
+    def schedule(self, user_id, fingerprint, due_at):
+        with self._lock:
+            if user_id not in self._heaps:
+                return
+            timestamp = due_at.timestamp()
+            self._due[user_id][fingerprint] = timestamp
+            heap = self._heaps[user_id]
+            heapq.heappush(heap, (timestamp, fingerprint))
+            pending = self._pending[user_id]
+            counted = self._counted[user_id]
+            counted.discard(fingerprint)
+            heapq.heappush(pending, (timestamp, fingerprint))
+            # Trop d'entrées obsolètes: les tas sont reconstruits
+            if len(heap) > 2 * len(self._due[user_id]) + 64:
+                heap[:] = [(t, f) for f, t in self._due[user_id].items()]
+                heapq.heapify(heap)
+            if len(pending) > 2 * len(self._due[user_id]) + 64:
+                pending[:] = [(t, f) for f, t in self._due[user_id].items() if f not in counted]
+                heapq.heapify(pending)
+
+    def due(self, user_id, count, now):
+        """Empreintes des count questions les plus en retard, échues à l'instant now"""
+        limit = now.timestamp()
+        selected = []
+        with self._lock:
+            heap = self._heaps.get(user_id, [])
+            due = self._due.get(user_id, {})
+            while heap and len(selected) < count and heap[0][0] <= limit:
+                timestamp, fingerprint = heapq.heappop(heap)
+                if due.get(fingerprint) == timestamp and fingerprint not in selected:
+                    selected.append(fingerprint)
+            # Les questions restent à revoir tant qu'elles n'ont pas été répondues
+            for fingerprint in selected:
+                heapq.heappush(heap, (due[fingerprint], fingerprint))
+        return selected
+
+    def count_due(self, user_id, now):
+        """Nombre de questions échues à l'instant now (qui ne recule pas d'un appel à l'autre)
+
+        Seules les échéances passées depuis l'appel précédent sont dépilées:
+        O(log n) amorti par question devenue échue.
+        """
+        limit = now.timestamp()
+        with self._lock:
+            if user_id not in self._heaps:
+                return 0
+            pending = self._pending[user_id]
+            counted = self._counted[user_id]
+            due = self._due[user_id]
+            while pending and pending[0][0] <= limit:
+                timestamp, fingerprint = heapq.heappop(pending)
+                if due.get(fingerprint) == timestamp:
+                    counted.add(fingerprint)
+            return len(counted)
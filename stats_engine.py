@@ -0,0 +1,249 @@
+"""Statistiques de quiz en colonnes typées, avec agrégats mis à jour à chaque résultat"""
+import threading
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Poids du dernier quiz dans la moyenne mobile exponentielle (maîtrise)
+EMA_ALPHA = 0.3
+# Nombre de quiz de la moyenne glissante courte
+SHORT_WINDOW = 5
+
+# Tranches horaires: nom et heure de début
+DAY_PERIODS = (('🌙 Nuit', 0), ('🌅 Matin', 6), ('☀️ Après-midi', 12), ('🌆 Soirée', 18))
+_PERIOD_OF_HOUR = np.searchsorted([start for _, start in DAY_PERIODS], np.arange(24), side='right') - 1
+
+
+class _StudentStats:
+    """Résultats d'un élève en colonnes numpy, et agrégats incrémentaux"""
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype='datetime64[s]')
+        self.courses = np.empty(capacity, dtype=np.int32)
+        self.scores = np.empty(capacity, dtype=np.int16)
+        self.totals = np.empty(capacity, dtype=np.int16)
+        self.percentages = np.empty(capacity, dtype=np.float32)
+        self.ema = np.empty(capacity, dtype=np.float32)
+        # code du cours -> [bonnes réponses, questions, quiz, maîtrise (moyenne exponentielle)]
+        self.mastery = {}
+        self.period_correct = np.zeros(len(DAY_PERIODS), dtype=np.int64)
+        self.period_total = np.zeros(len(DAY_PERIODS), dtype=np.int64)
+        self.window = deque(maxlen=SHORT_WINDOW)
+        self.correct = 0
+        self.questions = 0
+        self.last_day = None
+        self.current_streak = 0
+        self.best_streak = 0
+        self.version = 0
+
+    def _grow(self):
+        for name in ('timestamps', 'courses', 'scores', 'totals', 'percentages', 'ema'):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.empty_like(column)]))
+
+    def append(self, when, course, score, total):
+        if self.size == len(self.timestamps):
+            self._grow()
+        i = self.size
+        percentage = (score / total) * 100 if total else 0.0
+        self.timestamps[i] = np.datetime64(when.replace(microsecond=0, tzinfo=None), 's')
+        self.courses[i] = course
+        self.scores[i] = score
+        self.totals[i] = total
+        self.percentages[i] = percentage
+        self.ema[i] = percentage if i == 0 else EMA_ALPHA * percentage + (1 - EMA_ALPHA) * self.ema[i - 1]
+        self.size += 1
+
+        mastery = self.mastery.get(course)
+        if mastery is None:
+            self.mastery[course] = [score, total, 1, percentage]
+        else:
+            mastery[0] += score
+            mastery[1] += total
+            mastery[2] += 1
+            mastery[3] = EMA_ALPHA * percentage + (1 - EMA_ALPHA) * mastery[3]
+
+        period = _PERIOD_OF_HOUR[when.hour]
+        self.period_correct[period] += score
+        self.period_total[period] += total
+        self.window.append(percentage)
+        self.correct += score
+        self.questions += total
+
+        day = when.date()
+        if self.last_day is None or day > self.last_day:
+            if self.last_day is not None and day - self.last_day == timedelta(days=1):
+                self.current_streak += 1
+            else:
+                self.current_streak = 1
+            self.last_day = day
+            self.best_streak = max(self.best_streak, self.current_streak)
+        self.version += 1
+
+    def streak(self, today):
+        """Série en cours: interrompue si l'élève n'a pas étudié hier ni aujourd'hui"""
+        if self.last_day is None or today - self.last_day > timedelta(days=1):
+            return 0
+        return self.current_streak
+
+
+class StatsEngine:
+    """Statistiques de tous les élèves chargés, partagées entre les sessions
+
+    L'historique d'un élève est lu une seule fois depuis la base; chaque
+    quiz terminé met ensuite à jour ses colonnes et ses agrégats en O(1).
+    Les cours sont stockés comme codes entiers (catégories).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students = {}
+        self._course_codes = {}
+        self._course_labels = []
+        self._class_views = {}
+
+    def _course_code(self, course_id, course_title):
+        # Un cours enregistré est identifié par son id: deux cours de même titre restent distincts.
+        # Les quiz sans cours (défi, révision du jour, texte envoyé à l'API) sont regroupés par titre.
+        key = course_id if isinstance(course_id, int) else course_title
+        code = self._course_codes.get(key)
+        if code is None:
+            code = len(self._course_labels)
+            self._course_codes[key] = code
+            # Les catégories doivent être uniques: un titre déjà pris est complété par l'id
+            label = course_title if course_title not in self._course_labels else f"{course_title} (n°{course_id})"
+            self._course_labels.append(label)
+        return code
+
+    def is_loaded(self, user_id):
+        with self._lock:
+            return user_id in self._students
+
+    def clear(self):
+        """Oublie les historiques chargés: ils seront relus depuis la base"""
+        with self._lock:
+            self._students = {}
+            self._class_views = {}
+
+    def load(self, user_id, results):
+        """Charge l'historique d'un élève: dicts (course_id, course_title, score, total, created_at), du plus ancien au plus récent"""
+        stats = _StudentStats()
+        with self._lock:
+            for result in results:
+                code = self._course_code(result['course_id'], result['course_title'])
+                stats.append(result['created_at'], code, result['score'], result['total'])
+            self._students[user_id] = stats
+
+    def record(self, user_id, course_id, course_title, score, total, when):
+        """Ajoute un résultat à un élève déjà chargé"""
+        with self._lock:
+            stats = self._students.get(user_id)
+            if stats is not None:
+                stats.append(when, self._course_code(course_id, course_title), score, total)
+
+    def _categories(self, codes):
+        return pd.Categorical.from_codes(codes, categories=self._course_labels)
+
+    def summary(self, user_id, today):
+        with self._lock:
+            stats = self._students.get(user_id)
+            if stats is None or not stats.size:
+                return None
+            return {
+                'quizzes': stats.size,
+                'success_rate': 100 * stats.correct / stats.questions if stats.questions else 0.0,
+                'moving_average': float(stats.ema[stats.size - 1]),
+                'recent_average': sum(stats.window) / len(stats.window),
+                'current_streak': stats.streak(today),
+                'best_streak': stats.best_streak,
+            }
+
+    def history(self, user_id, limit=100):
+        """Derniers résultats, du plus ancien au plus récent, avec la moyenne mobile"""
+        with self._lock:
+            stats = self._students.get(user_id)
+            if stats is None or not stats.size:
+                return pd.DataFrame()
+            window = slice(max(0, stats.size - limit), stats.size)
+            return pd.DataFrame({
+                'date': stats.timestamps[window].copy(),
+                'cours': self._categories(stats.courses[window]),
+                'score': stats.scores[window].copy(),
+                'total': stats.totals[window].copy(),
+                'pourcentage': stats.percentages[window].copy(),
+                'moyenne mobile': stats.ema[window].copy(),
+            })
+
+    def mastery(self, user_id):
+        """Maîtrise de chaque cours (moyenne exponentielle des derniers quiz)"""
+        with self._lock:
+            stats = self._students.get(user_id)
+            if stats is None:
+                return pd.DataFrame()
+            rows = [
+                (self._course_labels[code], quizzes, 100 * correct / total if total else 0.0, ema)
+                for code, (correct, total, quizzes, ema) in stats.mastery.items()
+            ]
+        return pd.DataFrame(rows, columns=['cours', 'quiz', 'réussite (%)', 'maîtrise (%)']) \
+            .sort_values('maîtrise (%)', ascending=False, ignore_index=True)
+
+    def time_of_day(self, user_id):
+        """Taux de réussite par tranche horaire"""
+        with self._lock:
+            stats = self._students.get(user_id)
+            if stats is None:
+                return pd.DataFrame()
+            correct = stats.period_correct.copy()
+            total = stats.period_total.copy()
+        rates = np.divide(100 * correct, total, out=np.zeros(len(total)), where=total > 0)
+        return pd.DataFrame(
+            {'réussite (%)': rates, 'questions': total},
+            index=pd.Index([name for name, _ in DAY_PERIODS], name='moment')
+        )
+
+    def class_view(self, members, today):
+        """Vue d'une classe à partir des agrégats de chaque élève chargé
+
+        members: liste de (user_id, nom). Le résultat est mis en cache tant
+        qu'aucun élève de la classe n'a terminé de nouveau quiz.
+        """
+        with self._lock:
+            loaded = [(user_id, name, self._students[user_id]) for user_id, name in members
+                      if user_id in self._students]
+            signature = tuple((user_id, stats.version) for user_id, _, stats in loaded)
+            cache_key = (tuple(user_id for user_id, _ in members), today)
+            cached = self._class_views.get(cache_key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            students = pd.DataFrame(
+                [(name or "Élève", stats.size,
+                  100 * stats.correct / stats.questions if stats.questions else 0.0,
+                  float(stats.ema[stats.size - 1]) if stats.size else 0.0,
+                  stats.streak(today),
+                  stats.last_day)
+                 for _, name, stats in loaded],
+                columns=['élève', 'quiz', 'réussite (%)', 'moyenne mobile (%)', 'série (jours)', 'dernière activité']
+            )
+            course_totals = {}
+            for _, _, stats in loaded:
+                for code, (correct, total, _, ema) in stats.mastery.items():
+                    entry = course_totals.setdefault(code, [0, 0, 0.0, 0])
+                    entry[0] += correct
+                    entry[1] += total
+                    entry[2] += ema
+                    entry[3] += 1
+            courses = pd.DataFrame(
+                [(self._course_labels[code], students_count,
+                  100 * correct / total if total else 0.0, ema_sum / students_count)
+                 for code, (correct, total, ema_sum, students_count) in course_totals.items()],
+                columns=['cours', 'élèves', 'réussite (%)', 'maîtrise moyenne (%)']
+            )
+            view = {'students': students, 'courses': courses}
+            if len(self._class_views) > 256:
+                self._class_views.clear()
+            self._class_views[cache_key] = (signature, view)
+            return view
@@ -0,0 +1,547 @@
+"""Stockage persistant des utilisateurs, cours et résultats de quiz (SQLite en mode WAL)"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    level TEXT NOT NULL DEFAULT '',
+    school TEXT NOT NULL DEFAULT '',
+    region TEXT NOT NULL DEFAULT '',
+    points INTEGER NOT NULL DEFAULT 0,
+    rank TEXT NOT NULL DEFAULT 'Débutant',
+    courses_uploaded INTEGER NOT NULL DEFAULT 0,
+    quizzes_completed INTEGER NOT NULL DEFAULT 0,
+    correct_answers INTEGER NOT NULL DEFAULT 0,
+    study_streak INTEGER NOT NULL DEFAULT 0,
+    last_study_date TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    type TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    quiz_generated INTEGER NOT NULL DEFAULT 0,
+    quiz_questions TEXT
+);
+
+CREATE TABLE IF NOT EXISTS quiz_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    course_id INTEGER,
+    course_title TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS seen_questions (
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,
+    text TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    signature BLOB,
+    PRIMARY KEY (user_id, fingerprint)
+);
+
+CREATE TABLE IF NOT EXISTS question_answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,
+    course_id INTEGER,
+    correct INTEGER NOT NULL,
+    answered_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS question_reviews (
+    user_id TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,
+    question TEXT NOT NULL,
+    repetitions INTEGER NOT NULL,
+    ease REAL NOT NULL,
+    interval_days REAL NOT NULL,
+    lapses INTEGER NOT NULL,
+    due_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, fingerprint)
+);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    reminder_enabled INTEGER NOT NULL DEFAULT 0,
+    reminder_time TEXT NOT NULL DEFAULT '18:00',
+    reminder_frequency TEXT NOT NULL DEFAULT 'Quotidien',
+    theme TEXT NOT NULL DEFAULT 'Clair',
+    difficulty TEXT NOT NULL DEFAULT 'Moyen',
+    language TEXT NOT NULL DEFAULT 'Français'
+);
+
+CREATE TABLE IF NOT EXISTS irt_items (
+    fingerprint TEXT PRIMARY KEY,
+    difficulty REAL NOT NULL,
+    difficulty_precision REAL NOT NULL,
+    discrimination REAL NOT NULL,
+    discrimination_precision REAL NOT NULL,
+    answers INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS irt_abilities (
+    user_id TEXT PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    ability REAL NOT NULL,
+    precision REAL NOT NULL,
+    prior_mean REAL,
+    answers INTEGER NOT NULL
+);
+
+-- Dernière réponse (question_answers.id) intégrée à la calibration
+CREATE TABLE IF NOT EXISTS irt_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_answer_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_points ON users (points);
+CREATE INDEX IF NOT EXISTS idx_users_school_level ON users (school, level);
+CREATE INDEX IF NOT EXISTS idx_courses_user_date ON courses (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_quiz_results_user_date ON quiz_results (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_quiz_results_course ON quiz_results (course_id);
+CREATE INDEX IF NOT EXISTS idx_seen_questions_user_date ON seen_questions (user_id, seen_at);
+CREATE INDEX IF NOT EXISTS idx_question_answers_user_date ON question_answers (user_id, answered_at);
+"""
+
+# Colonnes ajoutées après la création du schéma initial: (table, colonne, définition)
+MIGRATIONS = (
+    ('users', 'school', "TEXT NOT NULL DEFAULT ''"),
+    ('users', 'region', "TEXT NOT NULL DEFAULT ''"),
+    ('seen_questions', 'signature', "BLOB"),
+    ('irt_abilities', 'prior_mean', "REAL"),
+)
+
+# Champs modifiables via update_user
+USER_FIELDS = (
+    'name', 'level', 'school', 'region', 'points', 'rank', 'courses_uploaded', 'quizzes_completed',
+    'correct_answers', 'study_streak', 'last_study_date'
+)
+
+# Paramètres de l'onglet Paramètres et leurs valeurs par défaut
+DEFAULT_SETTINGS = {
+    'reminder_enabled': 0,
+    'reminder_time': '18:00',
+    'reminder_frequency': 'Quotidien',
+    'theme': 'Clair',
+    'difficulty': 'Moyen',
+    'language': 'Français',
+}
+SETTINGS_FIELDS = tuple(DEFAULT_SETTINGS)
+
+DATE_FORMAT = "%d/%m/%Y %H:%M"
+
+
+def _format_date(value):
+    """Date ISO stockée -> format d'affichage de l'application"""
+    return datetime.fromisoformat(value).strftime(DATE_FORMAT)
+
+
+class Storage:
+    """Dépôt SQLite partagé par toutes les sessions du processus"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _migrate(self):
+        """Ajoute les colonnes manquantes d'une base créée par une version antérieure"""
+        for table, column, definition in MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if columns and column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def data_version(self):
+        """Change à chaque écriture faite par une autre connexion (l'API, un autre processus)
+
+        Les écritures de cette connexion ne le modifient pas.
+        """
+        return self._fetchone("PRAGMA data_version")[0]
+
+    # Utilisateurs
+
+    def create_user(self, name='', level=''):
+        """Crée un utilisateur et retourne son identifiant
+
+        L'identifiant est aléatoire: il sert aussi de jeton dans l'URL.
+        """
+        user_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO users (id, name, level, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, name, level, datetime.now().isoformat())
+        )
+        return user_id
+
+    def get_user(self, user_id):
+        """Retourne le profil d'un utilisateur, ou None s'il n'existe pas"""
+        row = self._fetchone("SELECT * FROM users WHERE id = ?", (user_id,))
+        if row is None:
+            return None
+        user = dict(row)
+        if user['last_study_date']:
+            user['last_study_date'] = date.fromisoformat(user['last_study_date'])
+        return user
+
+    def update_user(self, user_id, **fields):
+        """Met à jour les champs donnés du profil"""
+        unknown = set(fields) - set(USER_FIELDS)
+        if unknown:
+            raise ValueError(f"Champs inconnus: {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        if isinstance(fields.get('last_study_date'), date):
+            fields['last_study_date'] = fields['last_study_date'].isoformat()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._execute(
+            f"UPDATE users SET {assignments} WHERE id = ?",
+            (*fields.values(), user_id)
+        )
+
+    def add_quiz_progress(self, user_id, correct_answers, points, ranks, today):
+        """Ajoute un quiz terminé au profil en une seule requête, sans perte si deux processus l'écrivent
+
+        ranks: (seuil de points, rang) du plus haut au plus bas. La série
+        d'études continue si l'élève a étudié la veille, sinon repart à 1.
+        """
+        rank_case = ' '.join("WHEN points + ? >= ? THEN ?" for _ in ranks)
+        self._execute(
+            "UPDATE users SET quizzes_completed = quizzes_completed + 1, "
+            "correct_answers = correct_answers + ?, points = points + ?, "
+            f"rank = CASE {rank_case} ELSE rank END, "
+            "study_streak = CASE WHEN last_study_date = ? THEN study_streak + 1 "
+            "WHEN last_study_date = ? THEN study_streak ELSE 1 END, "
+            "last_study_date = ? WHERE id = ?",
+            (correct_answers, points,
+             *(value for threshold, rank in ranks for value in (points, threshold, rank)),
+             (today - timedelta(days=1)).isoformat(), today.isoformat(), today.isoformat(), user_id)
+        )
+
+    def reset_user(self, user_id):
+        """Remet le profil à zéro (les cours sont conservés)"""
+        self._execute(
+            "UPDATE users SET name = '', level = '', school = '', region = '', points = 0, rank = 'Débutant', "
+            "courses_uploaded = 0, quizzes_completed = 0, correct_answers = 0, "
+            "study_streak = 0, last_study_date = NULL WHERE id = ?",
+            (user_id,)
+        )
+
+    def iter_leaderboard_entries(self, batch_size=10000):
+        """Parcourt les profils nommés pour construire le classement"""
+        last_id = ''
+        while True:
+            rows = self._fetchall(
+                "SELECT id AS user_id, name, points, level, school, region FROM users "
+                "WHERE name != '' AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]['user_id']
+
+    # Cours
+
+    def add_course(self, user_id, title, content, course_type):
+        """Enregistre un nouveau cours et incrémente le compteur de l'utilisateur"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO courses (user_id, title, content, type, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, title, content, course_type, datetime.now().isoformat())
+            )
+            self._conn.execute(
+                "UPDATE users SET courses_uploaded = courses_uploaded + 1 WHERE id = ?",
+                (user_id,)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def _course_from_row(self, row):
+        course = dict(row)
+        course['date'] = _format_date(course.pop('created_at'))
+        course['quiz_generated'] = bool(course['quiz_generated'])
+        if 'quiz_questions' in course:
+            course['quiz_questions'] = json.loads(course['quiz_questions']) if course['quiz_questions'] else None
+        return course
+
+    def count_courses(self, user_id):
+        return self._fetchone(
+            "SELECT COUNT(*) FROM courses WHERE user_id = ?", (user_id,)
+        )[0]
+
+    def list_courses(self, user_id, limit=20, offset=0, with_content=False):
+        """Liste paginée des cours, du plus récent au plus ancien
+
+        Sans with_content, seul un aperçu (200 caractères) du contenu est chargé.
+        """
+        content_column = "content" if with_content else "substr(content, 1, 200) AS preview"
+        rows = self._fetchall(
+            f"SELECT id, title, {content_column}, type, created_at, quiz_generated, "
+            "quiz_questions IS NOT NULL AS has_quiz "
+            "FROM courses WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (user_id, limit, offset)
+        )
+        return [self._course_from_row(row) for row in rows]
+
+    def get_course(self, course_id):
+        """Retourne un cours complet (contenu et quiz préparé)"""
+        row = self._fetchone("SELECT * FROM courses WHERE id = ?", (course_id,))
+        return self._course_from_row(row) if row is not None else None
+
+    def set_course_quiz(self, course_id, questions=None):
+        """Marque le quiz d'un cours comme généré, en conservant éventuellement les questions"""
+        if questions is None:
+            self._execute("UPDATE courses SET quiz_generated = 1 WHERE id = ?", (course_id,))
+        else:
+            self._execute(
+                "UPDATE courses SET quiz_generated = 1, quiz_questions = ? WHERE id = ?",
+                (json.dumps(questions, ensure_ascii=False), course_id)
+            )
+
+    def delete_course(self, course_id):
+        self._execute("DELETE FROM courses WHERE id = ?", (course_id,))
+
+    # Résultats de quiz
+
+    def add_quiz_result(self, user_id, course_id, course_title, score, total):
+        """Enregistre le résultat d'un quiz terminé"""
+        course_id = course_id if isinstance(course_id, int) else None
+        self._execute(
+            "INSERT INTO quiz_results (user_id, course_id, course_title, score, total, percentage, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, course_id, course_title, score, total,
+             (score / total) * 100 if total else 0.0, datetime.now().isoformat())
+        )
+
+    def count_quiz_results(self, user_id):
+        return self._fetchone(
+            "SELECT COUNT(*) FROM quiz_results WHERE user_id = ?", (user_id,)
+        )[0]
+
+    def list_quiz_results(self, user_id, limit=100, offset=0):
+        """Résultats paginés, du plus récent au plus ancien"""
+        rows = self._fetchall(
+            "SELECT course_title, score, total, percentage, created_at FROM quiz_results "
+            "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (user_id, limit, offset)
+        )
+        results = []
+        for row in rows:
+            result = dict(row)
+            result['date'] = _format_date(result.pop('created_at'))
+            results.append(result)
+        return results
+
+    def iter_quiz_results(self, user_id):
+        """Tous les résultats de l'élève, du plus ancien au plus récent (dates en datetime)"""
+        rows = self._fetchall(
+            "SELECT course_id, course_title, score, total, created_at FROM quiz_results "
+            "WHERE user_id = ? ORDER BY created_at, id",
+            (user_id,)
+        )
+        for row in rows:
+            result = dict(row)
+            result['created_at'] = datetime.fromisoformat(result['created_at'])
+            yield result
+
+    def list_class_members(self, school, level):
+        """(identifiant, nom) des élèves d'une même classe"""
+        rows = self._fetchall(
+            "SELECT id, name FROM users WHERE school = ? AND level = ? ORDER BY name",
+            (school, level)
+        )
+        return [(row['id'], row['name']) for row in rows]
+
+    # Questions déjà vues
+
+    def mark_questions_seen(self, user_id, questions):
+        """Enregistre les questions (empreinte, texte, signature MinHash en octets) vues par l'élève"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO seen_questions (user_id, fingerprint, text, seen_at, signature) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, fingerprint) DO UPDATE SET seen_at = excluded.seen_at, "
+                "signature = excluded.signature",
+                [(user_id, fingerprint, text, now, signature) for fingerprint, text, signature in questions]
+            )
+            self._conn.commit()
+
+    def list_seen_questions(self, user_id, limit=5000):
+        """(empreinte, texte, signature) des questions vues, des plus récentes aux plus anciennes
+
+        La signature est None pour les questions enregistrées avant son stockage.
+        """
+        rows = self._fetchall(
+            "SELECT fingerprint, text, signature FROM seen_questions WHERE user_id = ? "
+            "ORDER BY seen_at DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return [(row['fingerprint'], row['text'], row['signature']) for row in rows]
+
+    # Réponses par question et répétition espacée
+
+    def get_review_states(self, user_id, fingerprints):
+        """États de révision connus, par empreinte de question"""
+        if not fingerprints:
+            return {}
+        placeholders = ','.join('?' * len(fingerprints))
+        rows = self._fetchall(
+            "SELECT fingerprint, repetitions, ease, interval_days, lapses, due_at FROM question_reviews "
+            f"WHERE user_id = ? AND fingerprint IN ({placeholders})",
+            (user_id, *fingerprints)
+        )
+        states = {}
+        for row in rows:
+            state = dict(row)
+            state['due_at'] = datetime.fromisoformat(state['due_at'])
+            states[state.pop('fingerprint')] = state
+        return states
+
+    def record_answers(self, user_id, course_id, outcomes):
+        """Enregistre les réponses d'un quiz et les nouveaux états de révision
+
+        outcomes: liste de (empreinte, question, correct, état).
+        """
+        course_id = course_id if isinstance(course_id, int) else None
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO question_answers (user_id, fingerprint, course_id, correct, answered_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(user_id, fingerprint, course_id, int(correct), now)
+                 for fingerprint, _, correct, _ in outcomes]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO question_reviews "
+                "(user_id, fingerprint, question, repetitions, ease, interval_days, lapses, due_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(user_id, fingerprint, json.dumps(question, ensure_ascii=False),
+                  state['repetitions'], state['ease'], state['interval_days'], state['lapses'],
+                  state['due_at'].isoformat())
+                 for fingerprint, question, _, state in outcomes]
+            )
+            self._conn.commit()
+
+    def list_review_schedule(self, user_id):
+        """(empreinte, échéance) de toutes les questions suivies pour l'élève"""
+        rows = self._fetchall(
+            "SELECT fingerprint, due_at FROM question_reviews WHERE user_id = ?", (user_id,)
+        )
+        return [(row['fingerprint'], datetime.fromisoformat(row['due_at'])) for row in rows]
+
+    def get_review_questions(self, user_id, fingerprints):
+        """Questions à revoir, dans l'ordre des empreintes données"""
+        if not fingerprints:
+            return []
+        placeholders = ','.join('?' * len(fingerprints))
+        rows = self._fetchall(
+            f"SELECT fingerprint, question FROM question_reviews WHERE user_id = ? AND fingerprint IN ({placeholders})",
+            (user_id, *fingerprints)
+        )
+        questions = {row['fingerprint']: json.loads(row['question']) for row in rows}
+        return [questions[f] for f in fingerprints if f in questions]
+
+    # Calibration IRT
+
+    def list_answers_since(self, answer_id, limit=5000):
+        """(id, élève, empreinte, correct, difficulté choisie) des réponses postérieures à answer_id"""
+        rows = self._fetchall(
+            "SELECT a.id, a.user_id, a.fingerprint, a.correct, COALESCE(s.difficulty, 'Moyen') "
+            "FROM question_answers a LEFT JOIN user_settings s ON s.user_id = a.user_id "
+            "WHERE a.id > ? ORDER BY a.id LIMIT ?",
+            (answer_id, limit)
+        )
+        return [tuple(row) for row in rows]
+
+    def load_irt(self):
+        """(paramètres des questions, niveaux des élèves, dernière réponse intégrée)"""
+        items = self._fetchall(
+            "SELECT fingerprint, difficulty, difficulty_precision, discrimination, "
+            "discrimination_precision, answers FROM irt_items"
+        )
+        abilities = self._fetchall("SELECT user_id, ability, precision, prior_mean, answers FROM irt_abilities")
+        state = self._fetchone("SELECT last_answer_id FROM irt_state WHERE id = 1")
+        return [tuple(row) for row in items], [tuple(row) for row in abilities], state[0] if state else 0
+
+    def save_irt(self, items, abilities, last_answer_id):
+        """Enregistre un lot de calibration et sa position dans le journal des réponses (tout ou rien)"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO irt_items (fingerprint, difficulty, difficulty_precision, "
+                "discrimination, discrimination_precision, answers) VALUES (?, ?, ?, ?, ?, ?)",
+                [(f, float(b), float(bp), float(a), float(ap), n) for f, b, bp, a, ap, n in items]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO irt_abilities (user_id, ability, precision, prior_mean, answers) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(u, float(theta), float(precision), prior, n) for u, theta, precision, prior, n in abilities]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO irt_state (id, last_answer_id) VALUES (1, ?)", (last_answer_id,)
+            )
+
+    # Paramètres
+
+    def get_settings(self, user_id):
+        """Paramètres de l'élève (valeurs par défaut s'il ne les a jamais enregistrés)"""
+        row = self._fetchone(
+            f"SELECT {', '.join(SETTINGS_FIELDS)} FROM user_settings WHERE user_id = ?", (user_id,)
+        )
+        settings = dict(row) if row is not None else dict(DEFAULT_SETTINGS)
+        settings['reminder_enabled'] = bool(settings['reminder_enabled'])
+        settings['reminder_time'] = time.fromisoformat(settings['reminder_time'])
+        return settings
+
+    def save_settings(self, user_id, **fields):
+        unknown = set(fields) - set(SETTINGS_FIELDS)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus: {', '.join(sorted(unknown))}")
+        settings = dict(DEFAULT_SETTINGS, **fields)
+        if isinstance(settings['reminder_time'], time):
+            settings['reminder_time'] = settings['reminder_time'].strftime('%H:%M')
+        settings['reminder_enabled'] = int(settings['reminder_enabled'])
+        assignments = ', '.join(f"{field} = excluded.{field}" for field in fields)
+        self._execute(
+            f"INSERT INTO user_settings (user_id, {', '.join(SETTINGS_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' * len(SETTINGS_FIELDS))}) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {assignments}",
+            (user_id, *(settings[field] for field in SETTINGS_FIELDS))
+        )
@@ -0,0 +1,33 @@
+from chunking import normalize_question, select_balanced, split_into_chunks
+
+
+def test_short_text_is_a_single_chunk():
+    assert split_into_chunks("Un paragraphe.\n\nUn autre.", max_chars=100) == ["Un paragraphe.\nUn autre."]
+
+
+def test_chunks_respect_max_size_and_overlap():
+    text = "\n\n".join(f"Phrase numéro {i} du cours de sciences." for i in range(60))
+    chunks = split_into_chunks(text, max_chars=300, overlap=80)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Chaque morceau reprend la fin du précédent
+        assert chunk.split('\n')[0] in previous
+
+
+def test_sentence_without_punctuation_is_cut_on_spaces():
+    chunks = split_into_chunks("mot " * 500, max_chars=100, overlap=0)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == ["mot"] * 500
+
+
+def test_normalize_question():
+    assert normalize_question("  Qu'est-ce   qu'une CELLULE ? ") == "qu est ce qu une cellule"
+    assert normalize_question("Élève") == normalize_question("eleve")
+
+
+def test_select_balanced_alternates_chunks_and_dedupes():
+    def q(text):
+        return {'question': text}
+    selected = select_balanced([[q("A1"), q("A2"), q("A3")], [q("a1 !"), q("B2")]], 4)
+    assert [s['question'] for s in selected] == ["A1", "B2", "A2", "A3"]
@@ -0,0 +1,32 @@
+import random
+
+from extractive_generator import BLANK, generate_extractive_quiz, split_sentences
+from quiz_parsing import validate_question
+
+COURSE = """La photosynthèse est le processus par lequel les plantes vertes produisent leur matière organique.
+La chlorophylle, présente dans les chloroplastes, absorbe surtout la lumière rouge et la lumière bleue.
+Les stomates des feuilles laissent entrer le dioxyde de carbone nécessaire à la synthèse du glucose.
+L'eau puisée par les racines est transportée jusqu'aux feuilles par la sève brute.
+Le glucose produit est ensuite transformé en amidon et stocké dans les organes de réserve.
+L'oxygène libéré par la photosynthèse provient de la décomposition des molécules d'eau.
+En 1779, Jan Ingenhousz montre que les plantes ont besoin de lumière pour produire de l'oxygène."""
+
+
+def test_split_sentences():
+    assert split_sentences("Première phrase. Deuxième!\n\nTroisième") == ["Première phrase.", "Deuxième!", "Troisième"]
+
+
+def test_generates_valid_fill_in_the_blank_questions():
+    questions, terms = generate_extractive_quiz(COURSE, 4, rng=random.Random(1))
+    assert len(questions) == 4
+    for q in questions:
+        assert validate_question(q)
+        assert BLANK in q['question']
+        assert len(set(q['options'])) == 4
+        # La bonne réponse est le mot masqué de la phrase citée
+        assert q['options'][q['correct']].lower() in q['explanation'].lower()
+    assert terms and all(isinstance(term, str) for term in terms)
+
+
+def test_empty_course():
+    assert generate_extractive_quiz("", 5) == ([], [])
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from irt import ABILITY_PRIOR_PRECISION, IRTCalibrator, IRTModel, difficulty_for_ability
+
+
+def simulate(seed=0, students=60, items=40, answers=3000):
+    rng = np.random.RandomState(seed)
+    theta = rng.normal(0, 1, students)
+    b = rng.normal(0, 1, items)
+    s = rng.randint(0, students, answers)
+    i = rng.randint(0, items, answers)
+    correct = rng.rand(answers) < 1 / (1 + np.exp(-(theta[s] - b[i])))
+    return theta, b, [f"u{k}" for k in s], [f"q{k}" for k in i], correct
+
+
+def test_calibration_recovers_ordering():
+    theta, b, user_ids, fingerprints, correct = simulate()
+    model = IRTModel()
+    for start in range(0, len(correct), 500):
+        batch = slice(start, start + 500)
+        model.update(user_ids[batch], fingerprints[batch], correct[batch], [0.0] * len(correct[batch]))
+    estimated = np.array([model.ability(f"u{k}")[0] for k in range(len(theta))])
+    assert np.corrcoef(estimated, theta)[0, 1] > 0.7
+
+
+def test_unknown_student_and_information():
+    model = IRTModel()
+    assert model.ability('x', 1.0) == (1.0, ABILITY_PRIOR_PRECISION ** -0.5, 0)
+    information = model.information(['q1', 'q2'], 0.0)
+    assert information.shape == (2,) and np.all(information > 0)
+    assert difficulty_for_ability(0.8) == 'Difficile'
+
+
+def test_prior_change_recentres_less_after_many_answers():
+    model = IRTModel()
+    model.update(['a'], ['q1'], [True], [0.0])
+    few = model.ability('a', 1.0)[0] - model.ability('a', 0.0)[0]
+    model.update(['a'] * 50, [f"q{k}" for k in range(50)], [k % 2 == 0 for k in range(50)], [0.0] * 50)
+    many = model.ability('a', 1.0)[0] - model.ability('a', 0.0)[0]
+    assert 0 < many < few <= 1.0
+
+
+class FailingStorage:
+    def __init__(self, answers):
+        self.answers = answers
+        self.fail = True
+        self.saved = []
+
+    def load_irt(self):
+        return [], [], 0
+
+    def list_answers_since(self, answer_id, limit):
+        return [a for a in self.answers if a[0] > answer_id][:limit]
+
+    def save_irt(self, items, abilities, last_answer_id):
+        if self.fail:
+            raise OSError("disque plein")
+        self.saved.append(last_answer_id)
+
+
+def test_failed_save_does_not_apply_batch_twice():
+    answers = [(k + 1, 'a', f"q{k % 5}", k % 3 != 0, 'Moyen') for k in range(30)]
+    storage = FailingStorage(answers)
+    calibrator = IRTCalibrator(storage)
+    with pytest.raises(OSError):
+        calibrator.calibrate()
+    storage.fail = False
+    calibrator.calibrate()
+
+    reference = IRTModel()
+    reference.update(*zip(*[(u, f, c, 0.0) for _, u, f, c, _ in answers]))
+    assert calibrator.model.ability('a') == pytest.approx(reference.ability('a'))
+    assert storage.saved == [30]
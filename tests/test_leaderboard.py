@@ -0,0 +1,38 @@
+import random
+
+from leaderboard import Leaderboard, RankedSkipList
+
+
+def test_skiplist_ranks_match_sorted_order():
+    rng = random.Random(7)
+    keys = rng.sample(range(10000), 500)
+    skiplist = RankedSkipList()
+    for key in keys:
+        skiplist.insert(key)
+    for key in keys[:100]:
+        skiplist.remove(key)
+    expected = sorted(keys[100:])
+    assert len(skiplist) == len(expected)
+    assert skiplist.head(20) == expected[:20]
+    assert all(skiplist.index(key) == position for position, key in enumerate(expected))
+    assert RankedSkipList.from_sorted(expected).head(len(expected)) == expected
+
+
+def test_leaderboard_scopes_and_updates():
+    board = Leaderboard()
+    board.load([
+        {'user_id': 'a', 'name': 'Awa', 'points': 50, 'level': 'Terminale', 'school': 'Lycée A'},
+        {'user_id': 'b', 'name': 'Bineta', 'points': 80, 'level': 'Seconde', 'school': 'Lycée A'},
+        {'user_id': 'c', 'name': 'Cheikh', 'points': 80, 'level': 'Terminale', 'school': 'Lycée B'},
+    ])
+    assert [e['user_id'] for e in board.top(3)] == ['b', 'c', 'a']
+    assert board.rank('a', ('level', 'Terminale')) == 2
+    assert board.rank('b', ('level', 'Terminale')) is None
+    assert board.size(('school', 'Lycée A')) == 2
+
+    board.update('a', 'Awa', 120, 'Terminale', 'Lycée A')
+    assert board.rank('a') == 1
+    assert board.top(1, ('school', 'Lycée A'))[0]['rank'] == 1
+    board.remove('b')
+    assert board.size() == 2
+    assert board.top(5, ('level', 'Seconde')) == []
@@ -0,0 +1,49 @@
+import numpy as np
+
+from question_index import (
+    QuestionIndex, minhash, minhash_from_bytes, question_fingerprint, question_text, select_questions
+)
+
+
+def q(text, options=("A", "B", "C", "D")):
+    return {'question': text, 'options': list(options), 'correct': 0, 'explanation': ''}
+
+
+def test_fingerprint_ignores_case_accents_and_punctuation():
+    assert question_fingerprint("Qu'est-ce qu'une cellule ?") == question_fingerprint("qu est ce qu une CELLULE")
+    assert question_fingerprint("Combien font 2 + 2 ?") != question_fingerprint("Combien font 2 + 3 ?")
+
+
+def test_minhash_round_trip_and_similarity():
+    signature = minhash("La chlorophylle absorbe la lumière rouge")
+    assert np.array_equal(minhash_from_bytes(signature.tobytes()), signature)
+    close = minhash("La chlorophylle absorbe la lumière rouge.")
+    other = minhash("Napoléon devient empereur en 1804")
+    assert np.mean(signature == close) > np.mean(signature == other)
+
+
+def test_index_finds_near_duplicates():
+    index = QuestionIndex()
+    text = question_text(q("Quel pigment absorbe la lumière dans les feuilles ?"))
+    assert index.add('k1', text) is None
+    assert index.add('k2', question_text(q("Quel pigment absorbe la lumière dans les feuilles?"))) == 'k1'
+    assert index.find_duplicate(question_text(q("En quelle année a eu lieu la prise de la Bastille ?"))) is None
+    assert len(index) == 1 and 'k1' in index
+
+
+def test_load_matches_add():
+    texts = [question_text(q(f"Question numéro {i} sur le chapitre {i * 7}")) for i in range(50)]
+    loaded = QuestionIndex()
+    loaded.load((f"k{i}", text, minhash(text) if i % 2 else None) for i, text in enumerate(texts))
+    assert len(loaded) == 50
+    assert loaded.find_duplicate(texts[10]) == 'k10'
+
+
+def test_select_questions_prefers_unseen_then_priority():
+    seen = QuestionIndex()
+    seen_question = q("Quelle est la formule chimique de l'eau ?")
+    seen.add('s', question_text(seen_question))
+    questions = [seen_question, q("Quelle est la capitale du Mali ?"), q("Quelle est la capitale du Mali ?"),
+                 q("Qui a écrit Une si longue lettre ?")]
+    selected = select_questions(questions, 3, seen, priorities=[9, 1, 1, 5])
+    assert selected == [questions[3], questions[1], questions[0]]
@@ -0,0 +1,44 @@
+import json
+
+from quiz_parsing import IncrementalQuestionParser, extract_questions, validate_question
+
+QUESTION = {
+    "question": "Quelle est la capitale du Sénégal ?",
+    "options": ["Dakar", "Thiès", "Saint-Louis", "Kaolack"],
+    "correct": 0,
+    "explanation": "Dakar est la capitale depuis 1960.",
+}
+
+
+def test_validate_question():
+    assert validate_question(QUESTION)
+    assert not validate_question(dict(QUESTION, options=QUESTION['options'][:3]))
+    assert not validate_question(dict(QUESTION, correct=4))
+    assert not validate_question(dict(QUESTION, correct=True))
+    assert not validate_question(dict(QUESTION, question="  "))
+    assert not validate_question(dict(QUESTION, explanation=None))
+
+
+def test_extract_questions_ignores_surrounding_prose():
+    text = 'Voici le quiz "demandé":\n```json\n' + json.dumps({"questions": [QUESTION, QUESTION]}) + '\n```\nBonne révision {!}'
+    questions, seen = extract_questions(text)
+    assert questions == [QUESTION, QUESTION]
+    assert seen == 2
+
+
+def test_truncated_response_keeps_complete_questions():
+    text = json.dumps([QUESTION, QUESTION])
+    questions, seen = extract_questions(text[:len(text) - 20])
+    assert questions == [QUESTION]
+    assert seen == 1
+
+
+def test_incremental_parser_across_chunk_boundaries():
+    escaped = dict(QUESTION, explanation='Un \\"piège\\" classique: {crochets} [et] accolades')
+    text = json.dumps({"questions": [escaped, QUESTION]})
+    parser = IncrementalQuestionParser()
+    questions = []
+    for i in range(len(text)):
+        # Un caractère à la fois: les échappements tombent entre deux morceaux
+        questions.extend(parser.feed(text[i]))
+    assert questions == [escaped, QUESTION]
@@ -0,0 +1,49 @@
+import random
+from datetime import datetime, time, timedelta
+
+from spaced_repetition import MIN_EASE, ReviewQueue, reminder_due, sm2_update
+
+NOW = datetime(2026, 10, 19, 18, 0)  # un lundi
+
+
+def test_sm2_intervals_and_lapse():
+    state = sm2_update(None, True, NOW)
+    assert state['interval_days'] == 1.0
+    state = sm2_update(state, True, NOW)
+    assert state['interval_days'] == 6.0
+    ease = state['ease']
+    state = sm2_update(state, True, NOW)
+    assert state['interval_days'] == round(6.0 * ease)
+    assert state['due_at'] == NOW + timedelta(days=state['interval_days'])
+    failed = sm2_update(state, False, NOW)
+    assert failed['repetitions'] == 0 and failed['lapses'] == 1
+    assert failed['due_at'] == NOW
+    for _ in range(20):
+        failed = sm2_update(failed, False, NOW)
+    assert failed['ease'] == MIN_EASE
+
+
+def test_reminder_due():
+    settings = {'reminder_enabled': True, 'reminder_frequency': 'Hebdomadaire', 'reminder_time': time(17, 0)}
+    assert reminder_due(settings, NOW)
+    assert not reminder_due(settings, NOW.replace(hour=16))
+    assert not reminder_due(settings, NOW + timedelta(days=1))
+    assert not reminder_due(settings, NOW, last_reminder=NOW - timedelta(hours=1))
+    assert not reminder_due(dict(settings, reminder_enabled=False), NOW)
+
+
+def test_review_queue_due_and_count():
+    rng = random.Random(3)
+    queue = ReviewQueue()
+    schedule = {f"q{i}": NOW + timedelta(hours=rng.randint(-48, 48)) for i in range(200)}
+    queue.load('u', list(schedule.items()))
+    now = NOW
+    for _ in range(100):
+        now += timedelta(minutes=rng.randint(0, 90))
+        fingerprint = f"q{rng.randint(0, 199)}"
+        schedule[fingerprint] = now + timedelta(hours=rng.randint(-3, 30))
+        queue.schedule('u', fingerprint, schedule[fingerprint])
+        due = sorted((at, f) for f, at in schedule.items() if at <= now)
+        assert queue.count_due('u', now) == len(due)
+        assert queue.due('u', 5, now) == [f for _, f in due[:5]]
+    assert queue.count_due('inconnu', now) == 0
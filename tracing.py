@@ -0,0 +1,235 @@
+"""Mesure des temps d'exécution par échantillonnage: spans, reruns les plus lents, export Prometheus"""
+import bisect
+import contextvars
+import heapq
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes (secondes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Rerun échantillonné en cours dans ce thread (celui du script Streamlit)
+_current_trace = contextvars.ContextVar('revizia_trace', default=None)
+
+
+class _NoopSpan:
+    """Span non échantillonné: ne mesure rien"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, trace):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    def end(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if self.trace is not None:
+            self.trace.spans.append((self.name, self.start - self.trace.start, self.duration))
+        self.tracer._observe(self.name, self.duration)
+
+
+class Trace:
+    """Un rerun échantillonné et ses spans"""
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.label = None
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.duration = None
+        _current_trace.set(self)
+
+    def end(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        _current_trace.set(None)
+        self.tracer._finish(self)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Tracer:
+    """Spans échantillonnés partagés par toutes les sessions
+
+    Avec sample_rate=0, span() et begin_rerun() retournent un objet
+    inerte sans lire l'horloge: le coût se limite à un test.
+    Un rerun est échantillonné en entier (tous ses spans) ou pas du tout;
+    les spans exécutés hors d'un rerun (threads d'arrière-plan) sont
+    échantillonnés un par un.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_reruns=20):
+        self.sample_rate = sample_rate
+        self.slow_reruns = slow_reruns
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._reruns = _Histogram()
+        self._slowest = []
+        self._sequence = 0
+        self.metrics_error = None
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def begin_rerun(self):
+        """Début d'une exécution du script; terminer avec .end()"""
+        if not self.sample_rate:
+            return NOOP_SPAN
+        if not self._sampled():
+            _current_trace.set(None)
+            return NOOP_SPAN
+        return Trace(self)
+
+    def label_rerun(self, label):
+        """Nomme le rerun échantillonné en cours (par exemple l'onglet affiché)"""
+        trace = _current_trace.get() if self.sample_rate else None
+        if trace is not None:
+            trace.label = label
+
+    def span(self, name):
+        """Span à utiliser avec `with`, ou à terminer avec .end()"""
+        if not self.sample_rate:
+            return NOOP_SPAN
+        trace = _current_trace.get()
+        if trace is None and not self._sampled():
+            return NOOP_SPAN
+        return Span(self, name, trace)
+
+    def _observe(self, name, duration):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.observe(duration)
+
+    def _finish(self, trace):
+        with self._lock:
+            self._reruns.observe(trace.duration)
+            self._sequence += 1
+            entry = (trace.duration, self._sequence, trace)
+            if len(self._slowest) < self.slow_reruns:
+                heapq.heappush(self._slowest, entry)
+            elif trace.duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest_reruns(self):
+        """Reruns échantillonnés les plus lents, du plus lent au plus rapide"""
+        with self._lock:
+            traces = [trace for _, _, trace in sorted(self._slowest, reverse=True)]
+        return [
+            {
+                'rerun': trace.label,
+                'date': trace.started_at,
+                'durée (s)': trace.duration,
+                'spans': sorted(trace.spans, key=lambda span: -span[2]),
+            }
+            for trace in traces
+        ]
+
+    def span_summary(self):
+        """Nombre et durée moyenne des spans échantillonnés, par nom"""
+        with self._lock:
+            return {
+                name: {'count': sum(h.counts), 'avg_s': h.sum / sum(h.counts)}
+                for name, h in self._histograms.items()
+            }
+
+    def prometheus_text(self):
+        """Histogrammes au format d'exposition texte de Prometheus"""
+        lines = [
+            "# HELP revizia_trace_sample_rate Proportion des exécutions mesurées",
+            "# TYPE revizia_trace_sample_rate gauge",
+            f"revizia_trace_sample_rate {self.sample_rate}",
+        ]
+        with self._lock:
+            lines += [
+                "# HELP revizia_rerun_duration_seconds Durée des exécutions complètes du script",
+                "# TYPE revizia_rerun_duration_seconds histogram",
+            ]
+            lines += _histogram_lines("revizia_rerun_duration_seconds", "", self._reruns)
+            lines += [
+                "# HELP revizia_span_duration_seconds Durée des sections instrumentées",
+                "# TYPE revizia_span_duration_seconds histogram",
+            ]
+            for name in sorted(self._histograms):
+                label = 'span="%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+                lines += _histogram_lines("revizia_span_duration_seconds", label, self._histograms[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(metric, label, histogram):
+    prefix = label + ',' if label else ''
+    suffix = '{%s}' % label if label else ''
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{metric}_bucket{{{prefix}le="{le}"}} {cumulative}')
+    lines.append(f'{metric}_sum{suffix} {histogram.sum}')
+    lines.append(f'{metric}_count{suffix} {cumulative}')
+    return lines
+
+
+def start_metrics_server(tracer, port, host="0.0.0.0"):
+    """Sert tracer.prometheus_text() sur http://host:port/metrics dans un thread"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
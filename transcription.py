@@ -0,0 +1,246 @@
+"""Transcription locale des enregistrements de cours (faster-whisper, décodage ffmpeg en flux)"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # moteur de transcription optionnel
+    WhisperModel = None
+
+SAMPLE_RATE = 16000
+# Audio décodé par morceau: seul ce morceau est en mémoire (60 s = 3,8 Mo en float32)
+CHUNK_SECONDS = 60
+# Le morceau est coupé dans le passage le plus silencieux de ses dernières secondes,
+# pour ne pas couper un mot en deux
+SPLIT_SEARCH_SECONDS = 3
+FRAME_SECONDS = 0.05
+# Durée pendant laquelle une tâche terminée reste consultable (secondes)
+FINISHED_JOB_TTL = 600
+
+
+class TranscriptionError(Exception):
+    """Enregistrement illisible (fichier corrompu, format inconnu) ou sans parole reconnue"""
+
+
+def transcription_available():
+    """Indique si faster-whisper et ffmpeg sont installés"""
+    return WhisperModel is not None and shutil.which("ffmpeg") is not None
+
+
+def hash_and_save(uploaded_file, directory, block_size=1 << 20):
+    """Copie un fichier envoyé sur disque par blocs et retourne (empreinte SHA-256, chemin)"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, uuid.uuid4().hex + os.path.splitext(uploaded_file.name)[1])
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    with open(path, 'wb') as output:
+        for block in iter(lambda: uploaded_file.read(block_size), b''):
+            digest.update(block)
+            output.write(block)
+    return digest.hexdigest(), path
+
+
+def audio_duration(path):
+    """Durée en secondes (ffprobe), ou None si elle est inconnue"""
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+            capture_output=True, text=True, timeout=30, check=True
+        ).stdout
+        return float(output.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def _quietest_split(samples):
+    """Indice de coupure: la trame la moins énergique des dernières secondes du morceau"""
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    search = min(len(samples), SPLIT_SEARCH_SECONDS * SAMPLE_RATE) // frame * frame
+    if search < frame:
+        return len(samples)
+    tail = samples[len(samples) - search:].reshape(-1, frame)
+    energy = np.einsum('ij,ij->i', tail, tail)
+    return len(samples) - search + int(np.argmin(energy)) * frame + frame // 2
+
+
+def stream_chunks(path):
+    """Décode le fichier avec ffmpeg et produit (début en secondes, échantillons float32) par morceaux
+
+    Lève TranscriptionError si ffmpeg échoue, même après avoir produit une partie de l'audio.
+    """
+    # Messages d'erreur dans un fichier: un tube plein bloquerait ffmpeg
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", path,
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        stdout=subprocess.PIPE, stderr=errors
+    )
+    chunk_bytes = CHUNK_SECONDS * SAMPLE_RATE * 2
+    carry = np.zeros(0, dtype=np.float32)
+    offset = 0
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            samples = np.concatenate([
+                carry,
+                np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            ])
+            split = _quietest_split(samples) if len(data) == chunk_bytes else len(samples)
+            yield offset / SAMPLE_RATE, samples[:split]
+            offset += split
+            carry = samples[split:]
+        if process.wait() != 0:
+            errors.seek(0)
+            lines = errors.read().decode('utf-8', 'replace').strip().splitlines()
+            raise TranscriptionError(lines[-1] if lines else f"ffmpeg a échoué (code {process.returncode})")
+        if len(carry):
+            yield offset / SAMPLE_RATE, carry
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        errors.close()
+
+
+class TranscriptionJob:
+    def __init__(self, audio_hash, duration=None):
+        self.audio_hash = audio_hash
+        self.duration = duration
+        self.status = 'pending'
+        self.position = 0.0
+        self.segments = []
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def text(self):
+        return ' '.join(self.segments)
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 1.0
+        if not self.duration:
+            return 0.0
+        return min(self.position / self.duration, 0.99)
+
+
+class TranscriptionService:
+    """Transcriptions en arrière-plan, avec cache des textes par empreinte audio
+
+    Le modèle est chargé une seule fois et partagé par les threads du pool
+    (CTranslate2 libère le GIL pendant le calcul). Chaque tâche publie son
+    texte segment par segment pour l'affichage de la progression.
+    """
+
+    def __init__(self, cache_path, model_size="small", workers=1, language="fr"):
+        self.model_size = model_size
+        self.language = language
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcription")
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (hash TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = WhisperModel(self.model_size, device="cpu", compute_type="int8")
+            return self._model
+
+    def _cached_job(self, audio_hash):
+        """Tâche terminée reconstituée depuis le cache des textes, ou None"""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM transcripts WHERE hash = ?", (audio_hash,)).fetchone()
+        if row is None:
+            return None
+        job = TranscriptionJob(audio_hash)
+        job.segments = [row[0]]
+        job.status = 'done'
+        return job
+
+    def submit(self, audio_hash, path):
+        """Lance la transcription du fichier (supprimé une fois traité); retourne la tâche
+
+        Un audio déjà transcrit, ou en cours de transcription, n'est pas retraité.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Tâches terminées depuis longtemps: leur texte reste dans le cache
+            for key in [k for k, j in self._jobs.items()
+                        if j.finished_at is not None and now - j.finished_at > FINISHED_JOB_TTL]:
+                del self._jobs[key]
+            job = self._jobs.get(audio_hash)
+            if job is not None and job.status != 'failed':
+                os.remove(path)
+                return job
+        job = self._cached_job(audio_hash)
+        if job is not None:
+            os.remove(path)
+            return job
+        job = TranscriptionJob(audio_hash, audio_duration(path))
+        with self._lock:
+            self._jobs[audio_hash] = job
+        self._executor.submit(self._run, job, path)
+        return job
+
+    def get(self, audio_hash):
+        """Tâche de cet audio (en cours, terminée ou en échec), ou None si elle est inconnue"""
+        with self._lock:
+            job = self._jobs.get(audio_hash)
+        return job if job is not None else self._cached_job(audio_hash)
+
+    def _run(self, job, path):
+        job.status = 'running'
+        job.started_at = time.monotonic()
+        try:
+            model = self._get_model()
+            for start, samples in stream_chunks(path):
+                segments, _ = model.transcribe(
+                    samples, language=self.language, vad_filter=True, beam_size=1
+                )
+                for segment in segments:
+                    text = segment.text.strip()
+                    if text:
+                        job.segments.append(text)
+                    job.position = start + segment.end
+                job.position = start + len(samples) / SAMPLE_RATE
+            # Rien de reconnu: l'échec n'est pas mis en cache, l'audio pourra être renvoyé
+            if not job.segments:
+                raise TranscriptionError("aucune parole reconnue dans l'enregistrement")
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transcripts (hash, text, created_at) VALUES (?, ?, ?)",
+                    (job.audio_hash, job.text, time.time())
+                )
+                self._conn.commit()
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.monotonic()
+            os.remove(path)